@@ -3,6 +3,7 @@ import logging
 import requests
 import streamlit as st
 
+from fleet import fleet_summary
 from llm import call_ai_analysis
 
 logging.basicConfig(level=logging.INFO)
@@ -52,12 +53,20 @@ def detect_statistical_anomalies(df, server_name=None):
     return anomalies
 
 
-def get_server_context(df, server_name=None):
+def get_server_context(df, server_name=None, fleet=None):
     """
     Получение контекста для анализа
+
+    Args:
+        df: DataFrame с метриками
+        server_name: Сервер для анализа (по умолчанию первые 10 серверов)
+        fleet: Сводка по серверам (fleet_summary); если не передана, считается по df
     """
+    if fleet is None:
+        fleet = fleet_summary(df)
+
     context = {
-        'total_servers': df['vm'].nunique(),
+        'total_servers': len(fleet),
         'period': {
             'start': df['date'].min().strftime('%Y-%m-%d'),
             'end': df['date'].max().strftime('%Y-%m-%d')
@@ -66,38 +75,24 @@ def get_server_context(df, server_name=None):
         'statistical_anomalies': []
     }
 
-    servers_to_analyze = [server_name] if server_name else df['vm'].unique()[:10]  # Ограничиваем для производительности
+    servers_to_analyze = [server_name] if server_name else fleet.index[:10]  # Ограничиваем для производительности
 
     for server in servers_to_analyze:
-        server_data = df[df['vm'] == server]
-
-        if server_data.empty:
+        if server not in fleet.index:
             continue
 
-        # CPU метрики
-        cpu_data = server_data[server_data['metric'].str.contains('cpu.usage', case=False, na=False)]
-        cpu_avg = cpu_data['avg_value'].mean() if not cpu_data.empty else 0
-        cpu_max = cpu_data['avg_value'].max() if not cpu_data.empty else 0
-
-        # Memory метрики
-        mem_data = server_data[server_data['metric'].str.contains('mem.usage', case=False, na=False)]
-        mem_avg = mem_data['avg_value'].mean() if not mem_data.empty else 0
-        mem_max = mem_data['avg_value'].max() if not mem_data.empty else 0
-
-        # Диск метрики (если есть)
-        disk_data = server_data[server_data['metric'].str.contains('disk', case=False, na=False)]
-        disk_avg = disk_data['avg_value'].mean() if not disk_data.empty else None
-
+        row = fleet.loc[server]
         context['servers'][server] = {
-            'cpu_avg': round(cpu_avg, 2),
-            'cpu_max': round(cpu_max, 2),
-            'mem_avg': round(mem_avg, 2),
-            'mem_max': round(mem_max, 2),
+            'cpu_avg': round(row['cpu_avg'], 2) if row['cpu_count'] else 0,
+            'cpu_max': round(row['cpu_max'], 2) if row['cpu_count'] else 0,
+            'mem_avg': round(row['mem_avg'], 2) if row['mem_count'] else 0,
+            'mem_max': round(row['mem_max'], 2) if row['mem_count'] else 0,
             'has_anomalies': False
         }
 
-        if disk_avg is not None:
-            context['servers'][server]['disk_avg'] = round(disk_avg, 2)
+        # Диск метрики (если есть)
+        if row['disk_count']:
+            context['servers'][server]['disk_avg'] = round(row['disk_avg'], 2)
 
     # Детекция статистических аномалий
     statistical_anomalies = detect_statistical_anomalies(df, server_name)
@@ -111,7 +106,7 @@ def get_server_context(df, server_name=None):
     return context
 
 
-def create_anomaly_detection_section(df):
+def create_anomaly_detection_section(df, fleet=None):
     """
     Создание секции для обнаружения аномалий
     """
@@ -119,7 +114,7 @@ def create_anomaly_detection_section(df):
 
     with col1:
         # Выбор сервера для анализа
-        servers = sorted(df['vm'].unique())
+        servers = list(fleet.index) if fleet is not None else sorted(df['vm'].unique())
         selected_server = st.selectbox(
             "Выберите сервер для детального анализа:",
             servers,
@@ -150,7 +145,7 @@ def create_anomaly_detection_section(df):
 
         with st.spinner("Анализируем метрики..."):
             # Получаем контекст для анализа
-            context = get_server_context(df, st.session_state.anomaly_server)
+            context = get_server_context(df, st.session_state.anomaly_server, fleet)
 
             # Отображаем статистические аномалии
             anomalies = context['statistical_anomalies']
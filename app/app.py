@@ -9,10 +9,13 @@ from dotenv import load_dotenv
 from anomalies import (create_anomaly_detection_section,
                        detect_statistical_anomalies)
 from auth import get_current_user, has_role, require_auth
+from classification import classify_metrics
 from cpu import create_cpu_heatmap, create_cpu_load_chart
+from data_cache import DataCache, VersionToken
+from fleet import fleet_summary
 from mem import create_memory_heatmap, create_memory_load_chart
-from table import (create_load_timeline, create_server_classification_table,
-                   create_summary_metrics)
+from table import (CATEGORY_BADGES, create_load_timeline,
+                   create_server_classification_table, create_summary_metrics)
 
 # Загружаем переменные окружения (для API ключей)
 load_dotenv()
@@ -67,17 +70,119 @@ if 'anomaly_response' not in st.session_state:
     st.session_state.anomaly_response = None
 
 
-@st.cache_data(ttl=300)  # Кэш на 5 минут
-def load_and_prepare_data(data_source='db', vm=None, start_date=None, end_date=None):
+EXCEL_SOURCE = "../data/metrics.xlsx"
+
+
+@st.cache_resource
+def get_data_cache():
+    """Кэш данных, общий для всех сессий процесса, и версии источников"""
+    from database.repository import get_data_version
+
+    versions = {
+        'db': VersionToken(get_data_version),
+        'xlsx': VersionToken(lambda: os.stat(EXCEL_SOURCE).st_mtime_ns),
+    }
+    return DataCache(), versions
+
+
+def load_and_prepare_data(data_source='db', vm=None, start_date=None, end_date=None, version=None):
     """
-    Загрузка и подготовка данных
+    Загрузка и подготовка данных через общий кэш (app/data_cache.py)
+
+    Данные перечитываются, только когда меняется версия источника: для БД - после коммита
+    загрузчика (import_batches, rollup_watermarks), для Excel - mtime файла.
+    Результат общий для всех сессий, изменять его значения на месте нельзя
 
     Args:
         data_source: Источник данных ('db' или 'xlsx')
         vm: Фильтр по серверу (опционально)
         start_date: Начальная дата (опционально)
         end_date: Конечная дата (опционально)
+        version: Версия источника из data_version (по умолчанию читается здесь); main передает
+            ту же версию, что и в load_fleet_summary, чтобы кадр и сводка были из одной версии
+    """
+    cache, _ = get_data_cache()
+    if version is None:
+        version = data_version(data_source)
+    if data_source != 'db':
+        # Файл читается целиком: в кэше один кадр, фильтры применяются к нему
+        df = cache.get_or_load((data_source, None, None, None), version,
+                               lambda: _load_and_prepare_data(data_source))
+        return filter_frame(df, vm, start_date, end_date)
+
+    return cache.get_or_load(
+        (data_source, vm, str(start_date), str(end_date)),
+        version,
+        lambda: _load_and_prepare_data(data_source, vm, start_date, end_date)
+    )
+
+
+def load_fleet_summary(df, version, data_source='db', vm=None, start_date=None, end_date=None):
+    """
+    Сводка по серверам (fleet_summary) для кадра load_and_prepare_data с теми же фильтрами
+
+    Считается один раз на версию данных и фильтры и хранится в общем кэше рядом с кадром:
+    карточки, таблица классификации, графики и контекст анализа читают ее, а не пересчитывают groupby.
+    version - та же версия, под которой получен df: повторное чтение data_version после истечения
+    TTL токена сохранило бы сводку старого кадра под новой версией
+    """
+    cache, _ = get_data_cache()
+    return cache.get_or_load(
+        ('fleet', data_source, vm, str(start_date), str(end_date)),
+        version,
+        lambda: fleet_summary(df)
+    )
+
+
+def data_version(data_source='db'):
+    """Текущая версия источника данных (None, если неизвестна)"""
+    _, versions = get_data_cache()
+    return versions[data_source]() if data_source in versions else None
+
+
+def filter_frame(df, vm=None, start_date=None, end_date=None):
+    """Фильтр кадра по серверам и периоду (дата окончания включительно)"""
+    if df.empty:
+        return df
+    mask = pd.Series(True, index=df.index)
+    if vm:
+        mask &= df['vm'].isin([vm] if isinstance(vm, str) else list(vm))
+    if start_date:
+        mask &= df['date'] >= pd.Timestamp(start_date)
+    if end_date:
+        mask &= df['date'] < pd.Timestamp(end_date) + pd.Timedelta(days=1)
+    return df[mask]
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_filter_options(data_source='db', version=None):
     """
+    Границы периода и список серверов для фильтров боковой панели
+
+    Для БД берутся из get_date_range() и списка серверов, не из загруженных данных;
+    version входит в ключ кэша, поэтому после загрузки новых данных границы обновляются
+
+    Returns:
+        Кортеж (min_date, max_date, servers); даты None, если данных нет
+    """
+    if data_source == 'db':
+        from database.repository import get_date_range_from_db, get_servers_from_db
+
+        date_range = get_date_range_from_db()
+        if date_range['min_date'] is not None:
+            return (pd.Timestamp(date_range['min_date']).date(),
+                    pd.Timestamp(date_range['max_date']).date(),
+                    get_servers_from_db())
+
+    # Excel или пустая БД (данные из резервного файла): границы по загруженному кадру
+    df = load_and_prepare_data(data_source=data_source, version=version)
+    if df.empty:
+        return None, None, []
+    return df['date'].min().date(), df['date'].max().date(), sorted(df['vm'].unique())
+
+
+def _load_and_prepare_data(data_source='db', vm=None, start_date=None, end_date=None):
+    """Загрузка и подготовка данных без кэша"""
     try:
         if data_source == 'db':
             # Чтение данных из базы данных
@@ -91,24 +196,28 @@ def load_and_prepare_data(data_source='db', vm=None, start_date=None, end_date=N
             if end_date and isinstance(end_date, str):
                 end_date = pd.to_datetime(end_date).date()
 
+            # Дневной агрегат читается, если он покрывает запрошенный период
             df = get_metrics_from_db(
                 vm=vm,
                 start_date=start_date,
-                end_date=end_date
+                end_date=end_date,
+                prefer_daily=True
             )
 
             if df.empty:
                 st.warning("База данных пуста. Используйте импорт данных из Excel.")
                 # Пробуем загрузить из Excel как fallback
                 try:
-                    df = pd.read_excel("../data/metrics.xlsx")
+                    from database.source_cache import read_source
+                    df = read_source(EXCEL_SOURCE)
                     st.info("Загружены данные из Excel файла (fallback)")
                 except:
                     return pd.DataFrame()
 
         elif data_source == 'xlsx':
-            # Чтение данных из файла (legacy)
-            df = pd.read_excel("../data/metrics.xlsx")
+            # Чтение данных из файла (legacy) через кэш Feather
+            from database.source_cache import read_source
+            df = read_source(EXCEL_SOURCE)
         else:
             st.error(f"Неизвестный источник данных: {data_source}")
             return pd.DataFrame()
@@ -126,55 +235,8 @@ def load_and_prepare_data(data_source='db', vm=None, start_date=None, end_date=N
         # Удаление строк с некорректными датами
         df = df.dropna(subset=['date'])
 
-        # Создание классификации нагрузки
-        def classify_load(value, metric_type):
-            if pd.isna(value):
-                return 'Нет данных', 'secondary', '#6c757d'
-
-            if metric_type == 'cpu':
-                if value < 20:
-                    return 'Низкая', 'success', '#28a745'
-                elif value < 70:
-                    return 'Нормальная', 'warning', '#ffc107'
-                else:
-                    return 'Высокая', 'danger', '#dc3545'
-            elif metric_type == 'mem':
-                if value < 30:
-                    return 'Низкая', 'success', '#28a745'
-                elif value < 80:
-                    return 'Нормальная', 'warning', '#ffc107'
-                else:
-                    return 'Высокая', 'danger', '#dc3545'
-            else:
-                return 'Нормальная', 'info', '#17a2b8'
-
-        # Добавляем классификацию
-        load_categories = []
-        metric_groups = []
-
-        for _, row in df.iterrows():
-            metric_name = str(row['metric']).lower()
-
-            if 'cpu' in metric_name and 'usage' in metric_name:
-                category, _, _ = classify_load(row['avg_value'], 'cpu')
-                load_categories.append(category)
-                metric_groups.append('CPU')
-            elif 'mem' in metric_name and 'usage' in metric_name:
-                category, _, _ = classify_load(row['avg_value'], 'mem')
-                load_categories.append(category)
-                metric_groups.append('Память')
-            elif 'disk' in metric_name and 'usage' in metric_name:
-                load_categories.append('Нормальная')
-                metric_groups.append('Диск')
-            elif 'net' in metric_name and 'usage' in metric_name:
-                load_categories.append('Нормальная')
-                metric_groups.append('Сеть')
-            else:
-                load_categories.append('Нормальная')
-                metric_groups.append('Другое')
-
-        df['load_category'] = load_categories
-        df['metric_group'] = metric_groups
+        # Классификация нагрузки по всей колонке сразу (app/classification.py)
+        df = classify_metrics(df)
 
         return df
 
@@ -242,19 +304,61 @@ def main():
             )
             st.markdown("---")
 
-    # Загрузка данных
+    # Границы фильтров берутся из БД, а не из загруженного кадра
+    # Версия читается один раз за перезапуск скрипта: границы, кадр и сводка берутся из одной версии
+    version = data_version(data_source)
+    min_date, max_date, all_servers = get_filter_options(data_source, version)
+    if min_date is None:
+        if data_source == 'db':
+            st.error("База данных пуста или недоступна.")
+            st.info("Используйте импорт данных из Excel или проверьте подключение к БД.")
+        else:
+            st.error("Не удалось загрузить данные. Пожалуйста, проверьте файл data/metrics.xlsx")
+        return
+
+    with st.sidebar:
+        # Информация о пользователе
+        if user:
+            st.markdown(f"### {user.get('full_name', 'Пользователь')}")
+            st.markdown(f"**Роль:** {user.get('role', 'Не определена')}")
+            st.markdown(f"**Email:** {user.get('email', 'Не указан')}")
+            st.markdown("---")
+
+        # Место для выбора сервера: список известен только после загрузки
+        server_slot = st.container()
+
+        # Фильтры по дате и серверам передаются в запрос к БД
+        st.markdown("---")
+        date_range = st.date_input(
+            "Выберите период:",
+            value=(min_date, max_date),
+            min_value=min_date,
+            max_value=max_date
+        )
+        start_date, end_date = date_range if len(date_range) == 2 else (min_date, max_date)
+
+        server_filter = st.multiselect(
+            "Серверы:",
+            all_servers,
+            placeholder="Все серверы"
+        )
+
+    # Загрузка данных за выбранный период; границы, совпадающие с диапазоном в БД, не передаются,
+    # чтобы полный период не добавлял условий в запрос и делил запись кэша с прочими сессиями
     with st.spinner('Загрузка и анализ данных...'):
-        df = load_and_prepare_data(data_source=data_source)
+        filters = {
+            'vm': tuple(sorted(server_filter)) or None,
+            'start_date': None if start_date == min_date else start_date,
+            'end_date': None if end_date == max_date else end_date,
+        }
+        df = load_and_prepare_data(data_source=data_source, version=version, **filters)
 
         if df.empty:
-            if data_source == 'db':
-                st.error("База данных пуста или недоступна.")
-                st.info("Используйте импорт данных из Excel или проверьте подключение к БД.")
-            else:
-                st.error("Не удалось загрузить данные. Пожалуйста, проверьте файл data/metrics.xlsx")
+            st.warning("Нет данных за выбранный период и серверы.")
             return
 
-        metrics = create_summary_metrics(df)
+        fleet = load_fleet_summary(df, version, data_source=data_source, **filters)
+        metrics = create_summary_metrics(df, fleet)
 
     # Если режим анализа аномалий активен, показываем только секцию аномалий
     if st.session_state.anomaly_mode:
@@ -264,45 +368,22 @@ def main():
             st.session_state.anomaly_mode = False
             st.rerun()
         else:
-            create_anomaly_detection_section(df)
+            create_anomaly_detection_section(df, fleet)
             return
 
     # Боковая панель с учетом ролей
     with st.sidebar:
-        # Информация о пользователе
-        if user:
-            st.markdown(f"### {user.get('full_name', 'Пользователь')}")
-            st.markdown(f"**Роль:** {user.get('role', 'Не определена')}")
-            st.markdown(f"**Email:** {user.get('email', 'Не указан')}")
-            st.markdown("---")
-
         # Разрешенные действия в зависимости от роли
         user_role = st.session_state.get("role", "viewer")
 
         # Выбор сервера для детального анализа
-        servers = sorted(df['vm'].unique())
-        selected_server = st.selectbox(
+        servers = list(fleet.index)
+        selected_server = server_slot.selectbox(
             "Выберите сервер для детального анализа:",
             servers,
             index=0
         )
 
-        # Фильтр по дате
-        st.markdown("---")
-        min_date = df['date'].min().date()
-        max_date = df['date'].max().date()
-
-        date_range = st.date_input(
-            "Выберите период:",
-            value=(min_date, max_date),
-            min_value=min_date,
-            max_value=max_date
-        )
-
-        if len(date_range) == 2:
-            start_date, end_date = date_range
-            df = df[(df['date'].dt.date >= start_date) & (df['date'].dt.date <= end_date)]
-
         # Дополнительные опции для админов
         if has_role("admin"):
             st.markdown("---")
@@ -310,15 +391,51 @@ def main():
             if st.button("Управление пользователями", use_container_width=True):
                 st.info("Функция управления пользователями в разработке")
 
+            cache_stats = get_data_cache()[0].stats()
+            st.caption(
+                f"Кэш данных: {cache_stats['entries']} наборов, {cache_stats['mb']} МБ; "
+                f"попаданий: {cache_stats['hits']}, промахов: {cache_stats['misses']}, "
+                f"вытеснено: {cache_stats['evictions']}"
+            )
+
+            if data_source == 'db':
+                from database.connection import pool_stats
+                with st.expander("Пулы соединений БД"):
+                    for profile, stats in pool_stats().items():
+                        st.markdown(
+                            f"**{profile}**: занято {stats['checked_out']} из {stats['max_size']}, "
+                            f"свободно: {stats['idle']}  \n"
+                            f"Выдач: {stats['checkouts']}, ожиданий: {stats['waits']} ({stats['wait_seconds']:.2f} с)"
+                        )
+
             if st.button("Экспорт данных", use_container_width=True):
-                csv = df.to_csv(index=False)
-                st.download_button(
-                    label="📥 Скачать CSV",
-                    data=csv,
-                    file_name="server_metrics.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
+                if data_source == 'db':
+                    # Выгрузка за выбранный период и серверы потоком из БД (COPY TO STDOUT в gzip),
+                    # без df.to_csv в памяти
+                    from database.export import export_metrics
+                    export_filters = {'vm': server_filter or None, 'start_date': start_date, 'end_date': end_date}
+                    try:
+                        result = export_metrics(export_filters, fmt='csv.gz')
+                    except Exception as e:
+                        st.error(f"Ошибка при экспорте данных: {e}")
+                    else:
+                        with result['file'] as f:
+                            st.download_button(
+                                label="📥 Скачать CSV",
+                                data=f,
+                                file_name=result['file_name'],
+                                mime=result['mime'],
+                                use_container_width=True
+                            )
+                else:
+                    csv = df.to_csv(index=False)
+                    st.download_button(
+                        label="📥 Скачать CSV",
+                        data=csv,
+                        file_name="server_metrics.csv",
+                        mime="text/csv",
+                        use_container_width=True
+                    )
 
     # Основной контент
     col1, col2, col3 = st.columns(3)
@@ -374,7 +491,7 @@ def main():
     st.markdown("---")
     st.header("Классификация всех серверов")
 
-    classification_table = create_server_classification_table(df)
+    classification_table = create_server_classification_table(df, fleet)
     st.dataframe(
         classification_table,
         use_container_width=True,
@@ -391,7 +508,7 @@ def main():
         st.plotly_chart(fig_heatmap, use_container_width=True)
 
         st.subheader("Использование CPU")
-        fig_chart = create_cpu_load_chart(df)
+        fig_chart = create_cpu_load_chart(df, fleet)
         st.plotly_chart(fig_chart, use_container_width=True)
 
     with st.expander("Память"):
@@ -400,7 +517,7 @@ def main():
         st.plotly_chart(fig_heatmap, use_container_width=True)
 
         st.subheader("Использование памяти")
-        fig_chart = create_memory_load_chart(df)
+        fig_chart = create_memory_load_chart(df, fleet)
         st.plotly_chart(fig_chart, use_container_width=True)
 
     # Детальный анализ выбранного сервера
@@ -410,15 +527,15 @@ def main():
     col4, col5 = st.columns(2)
 
     with col4:
-        # Основные метрики сервера
-        server_data = df[df['vm'] == selected_server]
+        # Основные метрики сервера из сводки
+        server_row = fleet.loc[selected_server]
 
-        avg_cpu = server_data[server_data['metric'] == 'cpu.usage.average']['avg_value'].mean()
-        avg_mem = server_data[server_data['metric'] == 'mem.usage.average']['avg_value'].mean()
+        avg_cpu = server_row['cpu_avg']
+        avg_mem = server_row['mem_avg']
 
         # Определяем статус
-        cpu_status = "🟢 Низкая" if avg_cpu < 20 else ("🔴 Высокая" if avg_cpu > 70 else "🟡 Нормальная")
-        mem_status = "🟢 Низкая" if avg_mem < 30 else ("🔴 Высокая" if avg_mem > 80 else "🟡 Нормальная")
+        cpu_status = CATEGORY_BADGES[server_row['cpu_category']]
+        mem_status = CATEGORY_BADGES[server_row['mem_category']]
 
         st.markdown(f"""
         <div class="metric-card", style="color: black;">
@@ -0,0 +1,81 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from base_logger import logger
+from config.config import Config
+
+# Группы метрик: (подстрока в имени метрики, группа); метрика должна содержать и 'usage'
+METRIC_GROUP_RULES = [
+    ('cpu', 'CPU'),
+    ('mem', 'Память'),
+    ('disk', 'Диск'),
+    ('net', 'Сеть'),
+]
+OTHER_GROUP = 'Другое'
+METRIC_GROUPS = [group for _, group in METRIC_GROUP_RULES] + [OTHER_GROUP]
+
+LOAD_CATEGORIES = ['Нет данных', 'Низкая', 'Нормальная', 'Высокая']
+
+# Группы, для которых категория считается по порогам Config
+THRESHOLD_GROUPS = {
+    'CPU': Config.CPU_THRESHOLDS,
+    'Память': Config.MEM_THRESHOLDS,
+}
+
+
+def metric_group(metric_name) -> str:
+    """Группа одной метрики по имени"""
+    name = str(metric_name).lower()
+    if 'usage' in name:
+        for token, group in METRIC_GROUP_RULES:
+            if token in name:
+                return group
+    return OTHER_GROUP
+
+
+def load_category_codes(values: np.ndarray, thresholds: dict) -> np.ndarray:
+    """
+    Коды LOAD_CATEGORIES для массива значений по порогам low/high
+
+    Ниже low - 'Низкая', ниже high - 'Нормальная', иначе 'Высокая', NaN - 'Нет данных'
+    """
+    return np.select(
+        [np.isnan(values), values < thresholds['low'], values < thresholds['high']],
+        [LOAD_CATEGORIES.index(category) for category in ('Нет данных', 'Низкая', 'Нормальная')],
+        default=LOAD_CATEGORIES.index('Высокая')
+    ).astype(np.int8)
+
+
+def classify_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Классификация нагрузки: колонки metric_group и load_category
+
+    Группа определяется один раз на уникальное имя метрики (pd.factorize), категория -
+    load_category_codes по всей колонке avg_value с порогами Config.CPU_THRESHOLDS/MEM_THRESHOLDS.
+    Для дисков, сети и прочих метрик категория всегда 'Нормальная'
+
+    Args:
+        df: DataFrame с колонками metric и avg_value
+
+    Returns:
+        Тот же DataFrame с добавленными колонками (Categorical)
+    """
+    codes, uniques = pd.factorize(df['metric'])
+    # Группа по уникальным именам; код -1 (пустое имя метрики) указывает на последний элемент: 'Другое'
+    unique_groups = [METRIC_GROUPS.index(metric_group(name)) for name in uniques]
+    group_codes = np.array(unique_groups + [METRIC_GROUPS.index(OTHER_GROUP)], dtype=np.int8)[codes]
+
+    values = pd.to_numeric(df['avg_value'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    category_codes = np.full(len(df), LOAD_CATEGORIES.index('Нормальная'), dtype=np.int8)
+    for group, thresholds in THRESHOLD_GROUPS.items():
+        in_group = group_codes == METRIC_GROUPS.index(group)
+        category_codes[in_group] = load_category_codes(values[in_group], thresholds)
+
+    df['metric_group'] = pd.Categorical.from_codes(group_codes, categories=METRIC_GROUPS)
+    df['load_category'] = pd.Categorical.from_codes(category_codes, categories=LOAD_CATEGORIES)
+    logger.debug(f'Классифицировано строк: {len(df)}, уникальных метрик: {len(uniques)}')
+    return df
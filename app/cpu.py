@@ -5,6 +5,7 @@ import plotly.express as px
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from base_logger import logger
+from fleet import fleet_summary
 
 
 def create_cpu_heatmap(df):
@@ -48,7 +49,8 @@ def create_cpu_heatmap(df):
             values='avg_value',
             index='vm',
             columns='date',
-            aggfunc='mean'
+            aggfunc='mean',
+            observed=True
         )
 
         logger.debug(f"Размер pivot таблицы: {pivot_data.shape}")
@@ -118,9 +120,13 @@ def create_cpu_heatmap(df):
         return create_error_plot(f"Ошибка создания тепловой карты CPU: {str(e)}")
 
 
-def create_cpu_load_chart(df):
+def create_cpu_load_chart(df, fleet=None):
     """
     Создание графика использования CPU
+
+    Args:
+        df: DataFrame с метриками
+        fleet: Сводка по серверам (fleet_summary); если не передана, считается по df
     """
     try:
         logger.info("Начинаем создание графика использования CPU")
@@ -139,19 +145,21 @@ def create_cpu_load_chart(df):
 
         logger.debug(f"Размер входного DataFrame: {df.shape}")
 
-        # Фильтрация данных
-        cpu_data = df[df['metric'] == 'cpu.usage.average']
+        # Средние по серверам из общей сводки
+        if fleet is None:
+            fleet = fleet_summary(df)
+        avg_cpu = (
+            fleet.loc[fleet['cpu_count'] > 0, 'cpu_avg']
+            .sort_values(ascending=False)
+            .rename('avg_value')
+            .reset_index()
+        )
 
-        if cpu_data.empty:
+        if avg_cpu.empty:
             logger.warning("Нет данных с метрикой 'cpu.usage.average' для графика")
             return create_empty_plot("Нет данных об использовании CPU")
 
-        logger.info(f"Найдено {len(cpu_data)} записей для графика использования CPU")
-        logger.debug(f"Уникальных серверов: {cpu_data['vm'].nunique()}")
-
-        # Группируем по серверам
-        logger.debug("Группировка данных по серверам для CPU")
-        avg_cpu = cpu_data.groupby('vm')['avg_value'].mean().sort_values(ascending=False).reset_index()
+        logger.info(f"Серверов с данными для графика использования CPU: {len(avg_cpu)}")
 
         # Логируем статистику
         cpu_stats = avg_cpu['avg_value'].describe()
@@ -350,7 +358,7 @@ def log_cpu_statistics(df):
         logger.info(f"    🟢 Низкая (<20%): {len(low_cpu):,} записей ({len(low_cpu) / len(cpu_data) * 100:.1f}%)")
 
         # Статистика по серверам
-        server_stats = cpu_data.groupby('vm')['avg_value'].agg(['mean', 'max', 'min', 'std', 'count'])
+        server_stats = cpu_data.groupby('vm', observed=True)['avg_value'].agg(['mean', 'max', 'min', 'std', 'count'])
 
         # Критические серверы
         critical_servers = server_stats[server_stats['max'] > 80]
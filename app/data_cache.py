@@ -0,0 +1,158 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from base_logger import logger
+
+# Размер общего кэша: число наборов данных и суммарный объем в памяти
+DATA_CACHE_MAX_ENTRIES = int(os.getenv("DATA_CACHE_MAX_ENTRIES", "8"))
+DATA_CACHE_MAX_MB = int(os.getenv("DATA_CACHE_MAX_MB", "512"))
+
+# Как часто (секунд) перечитывать версию данных из БД
+DATA_VERSION_CHECK_SECONDS = float(os.getenv("DATA_VERSION_CHECK_SECONDS", "5"))
+
+
+class DataCache:
+    """
+    Общий для всех сессий процесса LRU кэш подготовленных DataFrame
+
+    Запись хранится по ключу (фильтры) вместе с версией данных, на которой она построена.
+    Запись заменяется только когда версия меняется (загрузчик закоммитил новые данные), а не по TTL.
+    Вытесняются давно не использованные записи при превышении max_entries или max_bytes.
+
+    Возвращаемые DataFrame общие для всех сессий: get_or_load отдает поверхностную копию,
+    поэтому добавление колонок вызывающим кодом не меняет кэш, но изменять значения на месте нельзя
+    """
+
+    def __init__(self, max_entries: int = DATA_CACHE_MAX_ENTRIES, max_bytes: int = DATA_CACHE_MAX_MB * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # ключ -> (версия, DataFrame, размер в байтах)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_load(self, key, version, loader) -> pd.DataFrame:
+        """
+        DataFrame из кэша или результат loader()
+
+        Args:
+            key: Хэшируемый ключ (фильтры запроса)
+            version: Текущая версия данных; None - версия неизвестна, loader вызывается без кэша
+            loader: Функция без аргументов, возвращающая DataFrame
+
+        Returns:
+            Поверхностная копия закэшированного DataFrame
+        """
+        if version is None:
+            return loader()
+
+        cached = self._get(key, version)
+        if cached is not None:
+            return cached.copy(deep=False)
+
+        # Одну и ту же запись загружает одна сессия, остальные ждут ее результата
+        with self._key_lock(key):
+            cached = self._get(key, version, count=False)
+            if cached is not None:
+                return cached.copy(deep=False)
+
+            df = loader()
+            if not df.empty:
+                self._put(key, version, df)
+            return df.copy(deep=False)
+
+    def invalidate(self) -> None:
+        """Очистка кэша (например, после загрузки в этом же процессе)"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Счетчики кэша"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'mb': round(self._bytes / 1024 / 1024, 1),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def _get(self, key, version, count: bool = True):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return entry[1]
+
+            if count:
+                self.misses += 1
+            if entry is not None:
+                # Данные обновились: запись построена на старой версии
+                self._drop(key)
+                self.invalidations += 1
+            return None
+
+    def _put(self, key, version, df: pd.DataFrame) -> None:
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            logger.warning(f"Набор данных {key} ({size / 1024 / 1024:.0f} МБ) больше кэша, не кэшируется")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (version, df, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+        self._key_locks.pop(key, None)
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+
+class VersionToken:
+    """
+    Версия данных с проверкой не чаще раза в ttl секунд
+
+    Ошибка чтения версии возвращает None: кэш тогда не используется
+    """
+
+    def __init__(self, fetch, ttl: float = DATA_VERSION_CHECK_SECONDS):
+        self.fetch = fetch
+        self.ttl = ttl
+        self._value = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            if time.monotonic() - self._checked >= self.ttl:
+                try:
+                    self._value = self.fetch()
+                except Exception as e:
+                    logger.warning(f"Не удалось прочитать версию данных: {e}")
+                    self._value = None
+                self._checked = time.monotonic()
+            return self._value
@@ -0,0 +1,95 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from base_logger import logger
+from classification import LOAD_CATEGORIES, THRESHOLD_GROUPS, classify_metrics, load_category_codes
+
+# Основные метрики сервера: префикс колонок сводки -> имя метрики
+PRIMARY_METRICS = {
+    'cpu': 'cpu.usage.average',
+    'mem': 'mem.usage.average',
+    'disk': 'disk.usage.average',
+}
+
+# Статистики avg_value по основной метрике: агрегат pandas -> суффикс колонки
+STATS = {'mean': 'avg', 'max': 'max', 'min': 'min', 'std': 'std', 'count': 'count'}
+
+# Группы метрик с категориями нагрузки: группа -> префикс колонок
+CATEGORY_PREFIXES = {'CPU': 'cpu', 'Память': 'mem'}
+
+# Счетчики строк по категориям нагрузки: категория -> суффикс колонки
+CATEGORY_ROWS = {'Низкая': 'low_rows', 'Нормальная': 'normal_rows', 'Высокая': 'high_rows'}
+
+RECOMMENDATIONS = {
+    'scale': 'Требуется масштабирование',
+    'consolidate': 'Возможна консолидация',
+    'normal': 'Нормальная работа',
+}
+
+
+def fleet_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Сводка по серверам: одна строка на сервер для всех виджетов дашборда
+
+    Колонки:
+        {cpu,mem,disk}_{avg,max,min,std,count} - статистики avg_value по основной метрике (PRIMARY_METRICS);
+        {cpu,mem}_category - категория нагрузки по среднему (пороги Config);
+        {cpu,mem}_{low,normal,high}_rows - строки каждой категории load_category по группе метрик;
+        recommendation - рекомендация по категориям CPU и памяти
+
+    Args:
+        df: DataFrame с колонками vm, metric, avg_value (и metric_group, load_category из classify_metrics)
+
+    Returns:
+        DataFrame с индексом vm (имена серверов по возрастанию)
+    """
+    if 'load_category' not in df.columns:
+        df = classify_metrics(df.copy())
+
+    vms = df['vm'].dropna().unique()
+    summary = pd.DataFrame(index=pd.Index(sorted(np.asarray(vms, dtype=object)), name='vm'))
+    if not len(summary):
+        return summary
+
+    # Статистики по основным метрикам: один groupby по (сервер, метрика)
+    primary = df.loc[df['metric'].isin(list(PRIMARY_METRICS.values())), ['vm', 'metric', 'avg_value']]
+    stats = primary.groupby(['vm', 'metric'], observed=True)['avg_value'].agg(list(STATS)).unstack('metric')
+    stats.index = stats.index.astype(object)
+    for prefix, metric in PRIMARY_METRICS.items():
+        for stat, suffix in STATS.items():
+            column = stats[(stat, metric)] if (stat, metric) in stats.columns else None
+            summary[f'{prefix}_{suffix}'] = (
+                column.reindex(summary.index) if column is not None else np.nan
+            )
+        summary[f'{prefix}_count'] = summary[f'{prefix}_count'].fillna(0).astype(np.int64)
+
+    # Строки по категориям нагрузки: один groupby по (сервер, группа, категория)
+    grouped = df[df['metric_group'].isin(list(CATEGORY_PREFIXES))]
+    counts = grouped.groupby(['vm', 'metric_group', 'load_category'], observed=True).size()
+    counts = counts.unstack(['metric_group', 'load_category'], fill_value=0)
+    counts.index = counts.index.astype(object)
+    for group, prefix in CATEGORY_PREFIXES.items():
+        for category, suffix in CATEGORY_ROWS.items():
+            column = counts[(group, category)] if (group, category) in counts.columns else None
+            summary[f'{prefix}_{suffix}'] = (
+                column.reindex(summary.index, fill_value=0).astype(np.int64) if column is not None else 0
+            )
+
+        codes = load_category_codes(summary[f'{prefix}_avg'].to_numpy(dtype=float), THRESHOLD_GROUPS[group])
+        summary[f'{prefix}_category'] = pd.Categorical.from_codes(codes, categories=LOAD_CATEGORIES)
+
+    summary['recommendation'] = np.select(
+        [
+            (summary['cpu_category'] == 'Высокая') | (summary['mem_category'] == 'Высокая'),
+            (summary['cpu_category'] == 'Низкая') & (summary['mem_category'] == 'Низкая'),
+        ],
+        [RECOMMENDATIONS['scale'], RECOMMENDATIONS['consolidate']],
+        default=RECOMMENDATIONS['normal']
+    )
+
+    logger.info(f'Сводка по серверам: {len(summary)} серверов из {len(df)} строк')
+    return summary
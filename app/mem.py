@@ -5,6 +5,7 @@ import plotly.express as px
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from base_logger import logger
+from fleet import fleet_summary
 
 
 def create_memory_heatmap(df):
@@ -45,7 +46,8 @@ def create_memory_heatmap(df):
             values='avg_value',
             index='vm',
             columns='date',
-            aggfunc='mean'
+            aggfunc='mean',
+            observed=True
         )
 
         logger.debug(f"Размер pivot таблицы: {pivot_data.shape}")
@@ -96,9 +98,13 @@ def create_memory_heatmap(df):
         return create_error_plot(f"Ошибка: {str(e)}")
 
 
-def create_memory_load_chart(df):
+def create_memory_load_chart(df, fleet=None):
     """
     Создание графика использования памяти
+
+    Args:
+        df: DataFrame с метриками
+        fleet: Сводка по серверам (fleet_summary); если не передана, считается по df
     """
     try:
         logger.info("Начинаем создание графика использования памяти")
@@ -117,19 +123,21 @@ def create_memory_load_chart(df):
 
         logger.debug(f"Размер входного DataFrame: {df.shape}")
 
-        # Фильтрация данных
-        mem_data = df[df['metric'] == 'mem.usage.average']
+        # Средние по серверам из общей сводки
+        if fleet is None:
+            fleet = fleet_summary(df)
+        avg_memory = (
+            fleet.loc[fleet['mem_count'] > 0, 'mem_avg']
+            .sort_values(ascending=False)
+            .rename('avg_value')
+            .reset_index()
+        )
 
-        if mem_data.empty:
+        if avg_memory.empty:
             logger.warning("Нет данных с метрикой 'mem.usage.average' для графика")
             return create_empty_plot("Нет данных об использовании памяти")
 
-        logger.info(f"Найдено {len(mem_data)} записей для графика использования памяти")
-        logger.debug(f"Уникальных серверов: {mem_data['vm'].nunique()}")
-
-        # Группируем по серверам
-        logger.debug("Группировка данных по серверам")
-        avg_memory = mem_data.groupby('vm')['avg_value'].mean().sort_values(ascending=False).reset_index()
+        logger.info(f"Серверов с данными для графика использования памяти: {len(avg_memory)}")
 
         logger.debug(f"Среднее использование памяти по серверам: {avg_memory['avg_value'].describe().to_dict()}")
 
@@ -282,7 +290,7 @@ def log_memory_statistics(df):
         logger.info(f"  Низкая нагрузка (<30%): {len(low_usage)} записей")
 
         # Статистика по серверам
-        server_stats = mem_data.groupby('vm')['avg_value'].agg(['mean', 'max', 'min'])
+        server_stats = mem_data.groupby('vm', observed=True)['avg_value'].agg(['mean', 'max', 'min'])
         critical_servers = server_stats[server_stats['max'] > 80]
 
         if not critical_servers.empty:
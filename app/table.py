@@ -8,119 +8,49 @@ from plotly.subplots import make_subplots
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from base_logger import logger
+from fleet import fleet_summary
 
 
-def create_server_classification_table(df):
+# Категории нагрузки в таблицах и карточках
+CATEGORY_BADGES = {
+    'Низкая': '🟢 Низкая',
+    'Нормальная': '🟡 Нормальная',
+    'Высокая': '🔴 Высокая',
+    'Нет данных': 'Нет данных',
+}
+
+
+def create_server_classification_table(df, fleet=None):
     """
     Создание таблицы классификации серверов
+
+    Args:
+        df: DataFrame с метриками
+        fleet: Сводка по серверам (fleet_summary); если не передана, считается по df
     """
     try:
         logger.info('Начало создания таблицы классификации серверов')
-        logger.info(f'Размер входных данных: {df.shape[0]} строк, {df.shape[1]} столбцов')
-        logger.info(f'Уникальных серверов: {df["vm"].nunique()}')
-        logger.info(f'Уникальных метрик: {df["metric"].unique().tolist()}')
-
-        # CPU данные
-        cpu_data = df[df['metric'] == 'cpu.usage.average'].groupby('vm')['avg_value'].mean().reset_index()
-        logger.info(f'CPU данные собраны: {len(cpu_data)} серверов')
-        logger.debug(f'Пример CPU данных: {cpu_data.head().to_dict()}')
-
-        # Memory данные
-        mem_data = df[df['metric'] == 'mem.usage.average'].groupby('vm')['avg_value'].mean().reset_index()
-        logger.info(f'Memory данные собраны: {len(mem_data)} серверов')
-        logger.debug(f'Пример Memory данных: {mem_data.head().to_dict()}')
-
-        # Объединяем данные
-        classification = pd.merge(cpu_data, mem_data, on='vm', suffixes=('_cpu', '_mem'))
-        logger.info(f'Данные объединены: {len(classification)} серверов после слияния')
-        logger.debug(f'Структура объединенных данных:\n{classification.head()}')
-
-        # Классифицируем
-        logger.info('Правила классификации CPU:')
-        logger.info('- "🟢 Низкая" если < 20%')
-        logger.info('- "🟡 Нормальная" если 20-70%')
-        logger.info('- "🔴 Высокая" если >= 70%')
-
-        def classify_cpu(x):
-            if x < Config.CPU_THRESHOLDS['low']:
-                logger.debug(f'CPU значение {x}% классифицировано как "🟢 Низкая"')
-                return '🟢 Низкая'
-            elif x < Config.CPU_THRESHOLDS['high']:
-                logger.debug(f'CPU значение {x}% классифицировано как "🟡 Нормальная"')
-                return '🟡 Нормальная'
-            else:
-                logger.warning(f'CPU значение {x}% классифицировано как "🔴 Высокая" - требуется внимание!')
-                return '🔴 Высокая'
-
-        logger.info('Правила классификации Memory:')
-        logger.info('- "🟢 Низкая" если < 30%')
-        logger.info('- "🟡 Нормальная" если 30-80%')
-        logger.info('- "🔴 Высокая" если >= 80%')
-
-        def classify_mem(x):
-            if x < Config.MEM_THRESHOLDS['low']:
-                logger.debug(f'Memory значение {x}% классифицировано как "🟢 Низкая"')
-                return '🟢 Низкая'
-            elif x < Config.MEM_THRESHOLDS['high']:
-                logger.debug(f'Memory значение {x}% классифицировано как "🟡 Нормальная"')
-                return '🟡 Нормальная'
-            else:
-                logger.warning(f'Memory значение {x}% классифицировано как "🔴 Высокая" - требуется внимание!')
-                return '🔴 Высокая'
-
-        logger.info('Правила рекомендаций:')
-        logger.info('- "Требуется масштабирование" если CPU или Memory в красной зоне')
-        logger.info('- "Возможна консолидация" если CPU и Memory в зеленой зоне')
-        logger.info('- "Нормальная работа" в остальных случаях')
-
-        def get_recommendation(cpu_cat, mem_cat):
-            if '🔴' in cpu_cat or '🔴' in mem_cat:
-                logger.info(f'Рекомендация: "Требуется масштабирование" для CPU={cpu_cat}, Memory={mem_cat}')
-                return 'Требуется масштабирование'
-            elif '🟢' in cpu_cat and '🟢' in mem_cat:
-                logger.info(f'Рекомендация: "Возможна консолидация" для CPU={cpu_cat}, Memory={mem_cat}')
-                return 'Возможна консолидация'
-            else:
-                logger.info(f'Рекомендация: "Нормальная работа" для CPU={cpu_cat}, Memory={mem_cat}')
-                return 'Нормальная работа'
-
-        # Применяем классификацию
-        classification['CPU Категория'] = classification['avg_value_cpu'].apply(classify_cpu)
-        classification['Memory Категория'] = classification['avg_value_mem'].apply(classify_mem)
-        classification['Рекомендация'] = classification.apply(
-            lambda x: get_recommendation(x['CPU Категория'], x['Memory Категория']), axis=1
-        )
-        classification['Средний CPU %'] = classification['avg_value_cpu'].round(2)
-        classification['Средняя Memory %'] = classification['avg_value_mem'].round(2)
-
-        # Анализируем результаты
-        cpu_categories = classification['CPU Категория'].value_counts()
-        mem_categories = classification['Memory Категория'].value_counts()
-        recommendations = classification['Рекомендация'].value_counts()
-
-        logger.info('Статистика классификации CPU:')
-        for category, count in cpu_categories.items():
-            logger.info(f'  {category}: {count} серверов')
-
-        logger.info('Статистика классификации Memory:')
-        for category, count in mem_categories.items():
-            logger.info(f'  {category}: {count} серверов')
+        if fleet is None:
+            fleet = fleet_summary(df)
+
+        # Серверы, у которых есть и CPU, и Memory данные
+        classification = fleet[(fleet['cpu_count'] > 0) & (fleet['mem_count'] > 0)]
+        logger.info(f'Серверов с данными CPU и Memory: {len(classification)} из {len(fleet)}')
+
+        result = pd.DataFrame({
+            'Сервер': classification.index,
+            'Средний CPU %': classification['cpu_avg'].round(2).to_numpy(),
+            'CPU Категория': classification['cpu_category'].map(CATEGORY_BADGES).astype(str).to_numpy(),
+            'Средняя Memory %': classification['mem_avg'].round(2).to_numpy(),
+            'Memory Категория': classification['mem_category'].map(CATEGORY_BADGES).astype(str).to_numpy(),
+            'Рекомендация': classification['recommendation'].to_numpy(),
+        })
 
         logger.info('Статистика рекомендаций:')
-        for recommendation, count in recommendations.items():
+        for recommendation, count in result['Рекомендация'].value_counts().items():
             logger.info(f'  {recommendation}: {count} серверов')
 
-        # Удаляем лишние столбцы
-        result = classification[[
-            'vm', 'Средний CPU %', 'CPU Категория',
-            'Средняя Memory %', 'Memory Категория', 'Рекомендация'
-        ]]
-
-        # Переименовываем
-        result = result.rename(columns={'vm': 'Сервер'})
-
         logger.info(f'Таблица классификации создана успешно: {len(result)} серверов')
-        logger.debug(f'Пример результата:\n{result.head().to_string()}')
 
         # Логируем сервера требующие внимания
         critical_servers = result[
@@ -129,11 +59,9 @@ def create_server_classification_table(df):
             ]
         if len(critical_servers) > 0:
             logger.warning(f'Найдено серверов требующих внимания: {len(critical_servers)}')
-            for _, server in critical_servers.iterrows():
+            for server in critical_servers.itertuples(index=False):
                 logger.warning(
-                    f'Сервер {server["Сервер"]}: CPU={server["Средний CPU %"]}% '
-                    f'({server["CPU Категория"]}), Memory={server["Средняя Memory %"]}% '
-                    f'({server["Memory Категория"]})'
+                    f'Сервер {server[0]}: CPU={server[1]}% ({server[2]}), Memory={server[3]}% ({server[4]})'
                 )
 
         return result
@@ -143,8 +71,16 @@ def create_server_classification_table(df):
         raise
 
 
-def create_summary_metrics(df):
-    """Создание карточек с метриками"""
+def create_summary_metrics(df, fleet=None):
+    """
+    Создание карточек с метриками
+
+    Сервер учитывается в категории, если у него есть хотя бы одна строка этой категории
+
+    Args:
+        df: DataFrame с метриками
+        fleet: Сводка по серверам (fleet_summary); если не передана, считается по df
+    """
     if df.empty:
         return {
             'total_servers': 0,
@@ -157,47 +93,21 @@ def create_summary_metrics(df):
             'mem_high': 0
         }
 
-    # Общие метрики
-    total_servers = df['vm'].nunique()
+    if fleet is None:
+        fleet = fleet_summary(df)
+
     start_date = df['date'].min().strftime('%d.%m.%Y')
     end_date = df['date'].max().strftime('%d.%m.%Y')
 
-    # Анализ CPU нагрузки
-    cpu_data = df[df['metric'].str.contains('cpu.usage', case=False, na=False)].copy()
-    if not cpu_data.empty:
-        cpu_data['cpu_category'] = cpu_data['avg_value'].apply(
-            lambda x: 'Низкая' if x < 20 else ('Высокая' if x > 70 else 'Нормальная')
-        )
-    else:
-        cpu_data['cpu_category'] = 'Нет данных'
-
-    # Анализ Memory нагрузки
-    mem_data = df[df['metric'].str.contains('mem.usage', case=False, na=False)].copy()
-    if not mem_data.empty:
-        mem_data['mem_category'] = mem_data['avg_value'].apply(
-            lambda x: 'Низкая' if x < 30 else ('Высокая' if x > 80 else 'Нормальная')
-        )
-    else:
-        mem_data['mem_category'] = 'Нет данных'
-
-    # Подсчет по категориям
-    cpu_low = cpu_data[cpu_data['cpu_category'] == 'Низкая']['vm'].nunique()
-    cpu_normal = cpu_data[cpu_data['cpu_category'] == 'Нормальная']['vm'].nunique()
-    cpu_high = cpu_data[cpu_data['cpu_category'] == 'Высокая']['vm'].nunique()
-
-    mem_low = mem_data[mem_data['mem_category'] == 'Низкая']['vm'].nunique()
-    mem_normal = mem_data[mem_data['mem_category'] == 'Нормальная']['vm'].nunique()
-    mem_high = mem_data[mem_data['mem_category'] == 'Высокая']['vm'].nunique()
-
     return {
-        'total_servers': total_servers,
+        'total_servers': len(fleet),
         'period': f"{start_date} - {end_date}",
-        'cpu_low': cpu_low,
-        'cpu_normal': cpu_normal,
-        'cpu_high': cpu_high,
-        'mem_low': mem_low,
-        'mem_normal': mem_normal,
-        'mem_high': mem_high
+        'cpu_low': int((fleet['cpu_low_rows'] > 0).sum()),
+        'cpu_normal': int((fleet['cpu_normal_rows'] > 0).sum()),
+        'cpu_high': int((fleet['cpu_high_rows'] > 0).sum()),
+        'mem_low': int((fleet['mem_low_rows'] > 0).sum()),
+        'mem_normal': int((fleet['mem_normal_rows'] > 0).sum()),
+        'mem_high': int((fleet['mem_high_rows'] > 0).sum())
     }
 
 
@@ -0,0 +1,113 @@
+"""
+Бенчмарк классификации нагрузки в load_and_prepare_data (app/classification.py)
+
+Синтетический DataFrame (сервер x метрика x день) классифицируется прежним способом
+(df.iterrows() с проверкой подстрок и classify_load на каждую строку) и classify_metrics.
+Прежний способ медленный, поэтому по умолчанию замеряется на первых --legacy-rows строках;
+сравнивается скорость в строках в секунду. База данных не нужна.
+
+Запуск:
+    python benchmarks/bench_classification.py --rows 1000000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from classification import classify_metrics
+
+METRICS = [
+    'cpu.usage.average', 'cpu.usage.max', 'mem.usage.average', 'mem.usage.max',
+    'disk.usage.average', 'net.usage.average', 'cpu.ready.summation', 'mem.active.average',
+]
+
+
+def make_frame(rows: int, vms: int) -> pd.DataFrame:
+    """Синтетические метрики с долей пропусков avg_value"""
+    rng = np.random.default_rng(0)
+    values = rng.random(rows) * 100
+    values[rng.random(rows) < 0.01] = np.nan
+    return pd.DataFrame({
+        'vm': np.array([f'vm-{i}' for i in range(vms)], dtype=object)[rng.integers(0, vms, rows)],
+        'date': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D'),
+        'metric': np.array(METRICS, dtype=object)[rng.integers(0, len(METRICS), rows)],
+        'avg_value': values,
+    })
+
+
+def legacy_classify(df: pd.DataFrame) -> pd.DataFrame:
+    """Прежняя классификация: iterrows и classify_load на каждую строку"""
+    def classify_load(value, metric_type):
+        if pd.isna(value):
+            return 'Нет данных'
+        low, high = (20, 70) if metric_type == 'cpu' else (30, 80)
+        if value < low:
+            return 'Низкая'
+        elif value < high:
+            return 'Нормальная'
+        return 'Высокая'
+
+    load_categories, metric_groups = [], []
+    for _, row in df.iterrows():
+        metric_name = str(row['metric']).lower()
+        if 'cpu' in metric_name and 'usage' in metric_name:
+            load_categories.append(classify_load(row['avg_value'], 'cpu'))
+            metric_groups.append('CPU')
+        elif 'mem' in metric_name and 'usage' in metric_name:
+            load_categories.append(classify_load(row['avg_value'], 'mem'))
+            metric_groups.append('Память')
+        elif 'disk' in metric_name and 'usage' in metric_name:
+            load_categories.append('Нормальная')
+            metric_groups.append('Диск')
+        elif 'net' in metric_name and 'usage' in metric_name:
+            load_categories.append('Нормальная')
+            metric_groups.append('Сеть')
+        else:
+            load_categories.append('Нормальная')
+            metric_groups.append('Другое')
+
+    df['load_category'] = load_categories
+    df['metric_group'] = metric_groups
+    return df
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение классификации через iterrows и classify_metrics')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Количество строк')
+    parser.add_argument('--vms', type=int, default=500, help='Количество серверов')
+    parser.add_argument('--legacy-rows', type=int, default=200_000,
+                        help='Строк для прежнего способа (0 - не замерять)')
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.vms)
+    print(f"Строк: {args.rows:,}, серверов: {args.vms}")
+    print(f"{'Способ':<20}{'Строк':>12}{'Время, с':>10}{'Строк/с':>16}")
+
+    seconds, result = timed(lambda: classify_metrics(df.copy()))
+    print(f"{'classify_metrics':<20}{args.rows:>12,}{seconds:>10.2f}{args.rows / seconds:>16,.0f}")
+
+    if args.legacy_rows:
+        sample = df.head(args.legacy_rows).copy()
+        legacy_seconds, legacy = timed(lambda: legacy_classify(sample))
+        print(f"{'legacy (iterrows)':<20}{len(sample):>12,}{legacy_seconds:>10.2f}{len(sample) / legacy_seconds:>16,.0f}")
+
+        # Результаты совпадают на общей части
+        head = result.head(len(sample))
+        assert (head['load_category'].astype(str).to_numpy() == legacy['load_category'].to_numpy()).all()
+        assert (head['metric_group'].astype(str).to_numpy() == legacy['metric_group'].to_numpy()).all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Бенчмарк скорости загрузки в server_metrics: исходный набор индексов против сокращенного (миграция 004)
+
+Синтетические данные копируются в staging-таблицу и сливаются в копию server_metrics
+тем же INSERT ... ON CONFLICT, что и в database/ingest.py. Все таблицы временные,
+транзакция в конце откатывается.
+
+Запуск:
+    python benchmarks/bench_index_ingest.py --rows 500000
+"""
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from database.connection import engine
+
+TARGET_TABLE = 'bench_server_metrics'
+
+CREATE_TARGET_SQL = f"""
+CREATE TEMP TABLE {TARGET_TABLE} (
+    id UUID NOT NULL,
+    vm VARCHAR(255) NOT NULL,
+    date TIMESTAMP WITH TIME ZONE NOT NULL,
+    metric VARCHAR(100) NOT NULL,
+    max_value DOUBLE PRECISION,
+    min_value DOUBLE PRECISION,
+    avg_value DOUBLE PRECISION,
+    PRIMARY KEY (id, date),
+    CONSTRAINT bench_uq_vm_date_metric UNIQUE (vm, date, metric)
+)
+"""
+
+# Индексы помимо первичного ключа и uq_vm_date_metric
+INDEX_SETS = {
+    'до (001-003)': [
+        '(vm, date, metric)',
+        '(date)',
+        '(metric)',
+        '(id)',
+        '(vm)',
+        '(date)',
+        '(metric)',
+    ],
+    'после (004)': [
+        '(date)',
+        '(metric, date) INCLUDE (vm, avg_value)',
+    ],
+}
+
+MERGE_SQL = f"""
+INSERT INTO {TARGET_TABLE} (id, vm, date, metric, max_value, min_value, avg_value)
+SELECT gen_random_uuid(), vm, date, metric, max_value, min_value, avg_value
+FROM bench_stage
+ON CONFLICT ON CONSTRAINT bench_uq_vm_date_metric DO UPDATE SET
+    max_value = EXCLUDED.max_value,
+    min_value = EXCLUDED.min_value,
+    avg_value = EXCLUDED.avg_value
+"""
+
+
+def make_frame(rows: int, vms: int = 500, metrics: int = 16) -> pd.DataFrame:
+    """Синтетические метрики: уникальные (vm, date, metric), часовой шаг"""
+    keys = np.arange(rows)
+    avg = np.random.default_rng(42).uniform(0, 100, rows).round(5)
+    return pd.DataFrame({
+        'vm': 'vm-' + pd.Series(keys % vms).astype(str),
+        'date': pd.Timestamp('2025-01-01', tz='UTC') + pd.to_timedelta(keys // (vms * metrics), unit='h'),
+        'metric': 'metric.' + pd.Series((keys // vms) % metrics).astype(str),
+        'max_value': avg + 5,
+        'min_value': avg - 5,
+        'avg_value': avg,
+    })
+
+
+def run_case(cursor, indexes, buffer: str) -> float:
+    """Создание целевой таблицы с набором индексов и замер слияния, строк/с"""
+    cursor.execute(f"DROP TABLE IF EXISTS {TARGET_TABLE}")
+    cursor.execute(CREATE_TARGET_SQL)
+    for number, columns in enumerate(indexes):
+        cursor.execute(f"CREATE INDEX bench_idx_{number} ON {TARGET_TABLE} {columns}")
+
+    cursor.execute("TRUNCATE bench_stage")
+    cursor.copy_expert("COPY bench_stage FROM STDIN WITH (FORMAT csv)", io.StringIO(buffer))
+
+    started = time.perf_counter()
+    cursor.execute(MERGE_SQL)
+    return cursor.rowcount / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Скорость загрузки server_metrics при разных наборах индексов')
+    parser.add_argument('--rows', type=int, default=200_000, help='Количество строк')
+    parser.add_argument('--repeat', type=int, default=3, help='Количество повторов каждого варианта')
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    buffer = df.to_csv(index=False, header=False, date_format='%Y-%m-%d %H:%M:%S%z')
+
+    conn = engine.raw_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            CREATE TEMP TABLE bench_stage (
+                vm VARCHAR(255), date TIMESTAMP WITH TIME ZONE, metric VARCHAR(100),
+                max_value DOUBLE PRECISION, min_value DOUBLE PRECISION, avg_value DOUBLE PRECISION
+            )
+        """)
+
+        print(f"Строк: {args.rows}, повторов: {args.repeat}")
+        results = {}
+        for name, indexes in INDEX_SETS.items():
+            rates = [run_case(cursor, indexes, buffer) for _ in range(args.repeat)]
+            results[name] = float(np.median(rates))
+            print(f"{name:<14} индексов: {len(indexes) + 2:>2}  {results[name]:>12,.0f} строк/с")
+
+        before, after = results.values()
+        print(f"Ускорение: x{after / before:.2f}")
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Бенчмарк нормализации метрик перед загрузкой (database/normalize.py)
+
+Синтетический DataFrame в формате CSV выгрузки (vm, metric и date строками,
+с долей некорректных строк) обрабатывается прежним способом
+(строковые проверки по каждой строке, uuid4 на строку, причины отклонения конкатенацией
+по всей колонке) и normalize_metrics. База данных не нужна.
+
+Запуск:
+    python benchmarks/bench_normalize.py --rows 10000000
+"""
+import argparse
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from database.normalize import normalize_metrics, reject_counts
+
+
+def make_frame(rows: int, vms: int, bad_fraction: float) -> pd.DataFrame:
+    """Синтетические метрики: 16 метрик на сервер, часть строк с пустым vm или битой датой"""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'vm': np.array([f'vm-{i}' for i in range(vms)], dtype=object)[rng.integers(0, vms, rows)],
+        'date': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D'),
+        'metric': np.array([f'metric.{i}' for i in range(16)], dtype=object)[rng.integers(0, 16, rows)],
+        'max_value': rng.random(rows) * 100,
+        'min_value': rng.random(rows) * 10,
+        'avg_value': rng.random(rows) * 50,
+    })
+    bad = rng.random(rows) < bad_fraction
+    df.loc[bad, 'vm'] = ''
+    # Даты строками, как в CSV выгрузке
+    df['date'] = df['date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    df.loc[rng.random(rows) < bad_fraction, 'date'] = 'n/a'
+    return df
+
+
+def legacy_normalize(df: pd.DataFrame):
+    """Прежняя подготовка: строковые маски по каждой строке и uuid4 в цикле"""
+    data = pd.DataFrame({
+        'vm': df['vm'],
+        'date': pd.to_datetime(df['date'], errors='coerce'),
+        'metric': df['metric'],
+    }, index=df.index)
+    for col in ('max_value', 'min_value', 'avg_value'):
+        data[col] = pd.to_numeric(df[col], errors='coerce')
+
+    reasons = pd.Series('', index=df.index, dtype=object)
+    reasons[df['vm'].isna() | (df['vm'].astype(str).str.strip() == '')] += 'vm is empty; '
+    reasons[df['metric'].isna() | (df['metric'].astype(str).str.strip() == '')] += 'metric is empty; '
+    reasons[data['date'].isna()] += 'invalid date; '
+    rejected = reasons != ''
+
+    valid = data[~rejected].copy()
+    valid['id'] = [str(uuid.uuid4()) for _ in range(len(valid))]
+    return valid, df[rejected].assign(reject_reason=reasons[rejected].str.rstrip('; '))
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение прежней подготовки метрик и normalize_metrics')
+    parser.add_argument('--rows', type=int, default=10_000_000, help='Количество строк')
+    parser.add_argument('--vms', type=int, default=2000, help='Количество серверов')
+    parser.add_argument('--bad-fraction', type=float, default=0.001, help='Доля некорректных строк')
+    parser.add_argument('--skip-legacy', action='store_true', help='Не замерять прежний способ')
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.vms, args.bad_fraction)
+    print(f"Строк: {args.rows:,}, серверов: {args.vms}")
+    print(f"{'Способ':<20}{'Время, с':>10}{'Строк/с':>16}{'Отклонено':>12}")
+
+    variants = {'normalize_metrics': normalize_metrics}
+    if not args.skip_legacy:
+        variants['legacy'] = legacy_normalize
+
+    for name, func in variants.items():
+        seconds, (valid, rejects) = timed(lambda: func(df))
+        print(f"{name:<20}{seconds:>10.2f}{args.rows / seconds:>16,.0f}{len(rejects):>12}")
+
+    print(f"Причины: {reject_counts(normalize_metrics(df)[1])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Бенчмарк хранения значений метрик: DECIMAL(20,5) против DOUBLE PRECISION (миграция 005)
+
+Одинаковые синтетические данные парка серверов записываются в две временные таблицы.
+Для каждой измеряются размер на диске, время агрегата по серверам и метрикам и время
+полной загрузки в pandas (как в get_all_metrics: строки драйвера -> массивы float64).
+Транзакция в конце откатывается.
+
+Запуск:
+    python benchmarks/bench_value_types.py --vms 500 --days 90
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from database.connection import engine
+
+VALUE_TYPES = {
+    'DECIMAL(20,5)': 'DECIMAL(20, 5)',
+    'DOUBLE PRECISION': 'DOUBLE PRECISION',
+}
+
+# 16 метрик на сервер в сутки, как в выгрузке vCenter
+FILL_SQL = """
+INSERT INTO {table} (vm, date, metric, max_value, min_value, avg_value)
+SELECT 'vm-' || v, TIMESTAMPTZ '2025-01-01' + d * INTERVAL '1 day', 'metric.' || m,
+       round((r + 5)::numeric, 5), round(greatest(r - 5, 0)::numeric, 5), round(r::numeric, 5)
+FROM (
+    SELECT v, d, m, random() * 100 AS r
+    FROM generate_series(1, %(vms)s) v, generate_series(0, %(days)s - 1) d, generate_series(1, 16) m
+) generated
+"""
+
+AGGREGATE_SQL = "SELECT vm, metric, avg(avg_value), max(max_value) FROM {table} GROUP BY vm, metric"
+
+FETCH_SQL = "SELECT vm, date, metric, max_value, min_value, avg_value FROM {table}"
+
+
+def load_frame(cursor, table: str) -> pd.DataFrame:
+    """Полная выборка в DataFrame с приведением значений к float64"""
+    cursor.execute(FETCH_SQL.format(table=table))
+    vm, dates, metric, max_value, min_value, avg_value = zip(*cursor.fetchall())
+    return pd.DataFrame({
+        'vm': vm,
+        'date': dates,
+        'metric': metric,
+        'max_value': np.array(max_value, dtype=np.float64),
+        'min_value': np.array(min_value, dtype=np.float64),
+        'avg_value': np.array(avg_value, dtype=np.float64),
+    })
+
+
+def timed(func, repeat: int) -> float:
+    """Медиана времени выполнения, секунды"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение DECIMAL и DOUBLE PRECISION для значений метрик')
+    parser.add_argument('--vms', type=int, default=500, help='Количество серверов')
+    parser.add_argument('--days', type=int, default=90, help='Количество дней')
+    parser.add_argument('--repeat', type=int, default=3, help='Количество повторов замеров')
+    args = parser.parse_args()
+
+    conn = engine.raw_connection()
+    cursor = conn.cursor()
+    try:
+        print(f"Серверов: {args.vms}, дней: {args.days}, строк: {args.vms * args.days * 16}")
+        print(f"{'Тип':<18}{'Размер, МБ':>12}{'Агрегат, с':>12}{'Загрузка, с':>13}")
+
+        for number, (name, type_sql) in enumerate(VALUE_TYPES.items()):
+            table = f'bench_values_{number}'
+            cursor.execute(f"""
+                CREATE TEMP TABLE {table} (
+                    vm VARCHAR(255), date TIMESTAMP WITH TIME ZONE, metric VARCHAR(100),
+                    max_value {type_sql}, min_value {type_sql}, avg_value {type_sql}
+                )
+            """)
+            cursor.execute(FILL_SQL.format(table=table), {'vms': args.vms, 'days': args.days})
+            cursor.execute(f"ANALYZE {table}")
+
+            cursor.execute("SELECT pg_total_relation_size(%s)", (table,))
+            size_mb = cursor.fetchone()[0] / 1024 ** 2
+            aggregate = timed(lambda: cursor.execute(AGGREGATE_SQL.format(table=table)), args.repeat)
+            fetch = timed(lambda: load_frame(cursor, table), args.repeat)
+
+            print(f"{name:<18}{size_mb:>12.1f}{aggregate:>12.3f}{fetch:>13.3f}")
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
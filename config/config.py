@@ -16,8 +16,8 @@ class Config:
     }
 
     MEM_THRESHOLDS = {
-        'low': int(os.getenv("CPU_LOW_THRESHOLD", "30")),
-        'high': int(os.getenv("CPU_HIGH_THRESHOLD", "80"))
+        'low': int(os.getenv("MEM_LOW_THRESHOLD", "30")),
+        'high': int(os.getenv("MEM_HIGH_THRESHOLD", "80"))
     }
 
     # LLM
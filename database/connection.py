@@ -1,9 +1,14 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
+from base_logger import logger
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -17,25 +22,191 @@ DB_NAME = os.getenv("DB_NAME", "server_metrics")
 # Создаем строку подключения
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-# Создаем движок SQLAlchemy
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,  # Проверка соединения перед использованием
-    pool_recycle=300,  # Переподключение каждые 300 секунд
-    echo=False  # Установите True для отладки SQL запросов
-)
+# Профили движков:
+#   interactive - запросы дашборда и ORM: пул на DB_POOL_MIN..DB_POOL_MAX соединений, короткий statement_timeout
+#   bulk - загрузка, слияние и агрегация: небольшой пул, без ограничения времени запроса,
+#          executemany в psycopg2 пачками через VALUES (values_plus_batch)
+# pool_min - постоянные соединения, pool_max - предел при пиковой нагрузке,
+# pool_timeout - сколько секунд ждать свободного соединения, statement_timeout_ms - 0 без ограничения
+ENGINE_PROFILES = {
+    'interactive': {
+        'pool_min': int(os.getenv("DB_POOL_MIN", "5")),
+        'pool_max': int(os.getenv("DB_POOL_MAX", "15")),
+        'pool_timeout': float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        'statement_timeout_ms': int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000")),
+        'executemany_mode': None,
+    },
+    'bulk': {
+        'pool_min': int(os.getenv("DB_BULK_POOL_MIN", "1")),
+        'pool_max': int(os.getenv("DB_BULK_POOL_MAX", "4")),
+        'pool_timeout': float(os.getenv("DB_BULK_POOL_TIMEOUT", "300")),
+        'statement_timeout_ms': int(os.getenv("DB_BULK_STATEMENT_TIMEOUT_MS", "0")),
+        'executemany_mode': 'values_plus_batch',
+    },
+}
+
+# Пороги, после которых ожидание соединения и запрос пишутся в лог предупреждением
+SLOW_CHECKOUT_MS = float(os.getenv("DB_SLOW_CHECKOUT_MS", "100"))
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "1000"))
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool со счетчиками выдачи соединений
+
+    Ожиданием считается выдача соединения, когда все pool_max соединений заняты.
+    Долгое ожидание пишется в лог с именем профиля (logging_name пула)
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._capacity = self.size() + kwargs.get('max_overflow', 10)
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+
+    def connect(self):
+        exhausted = self.checkedout() >= self._capacity
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._stats_lock:
+                self._checkouts += 1
+                if exhausted:
+                    self._waits += 1
+                    self._wait_seconds += elapsed
+            if elapsed * 1000 >= SLOW_CHECKOUT_MS:
+                logger.warning(
+                    f"Пул {self._orig_logging_name}: ожидание соединения {elapsed * 1000:.0f} мс, "
+                    f"занято {self.checkedout()} из {self._capacity}"
+                )
+
+    def recreate(self):
+        # engine.dispose() пересоздает пул: счетчики сохраняются, чтобы статистика была за весь процесс
+        new_pool = super().recreate()
+        new_pool._checkouts, new_pool._waits, new_pool._wait_seconds = self._checkouts, self._waits, self._wait_seconds
+        return new_pool
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'size': self.size(),
+                'max_size': self._capacity,
+                'checked_out': self.checkedout(),
+                'idle': self.checkedin(),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_seconds': round(self._wait_seconds, 3),
+            }
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(profile='interactive'):
+    """
+    Движок профиля из ENGINE_PROFILES (один на процесс)
+
+    Raises:
+        ValueError: Если профиль неизвестен
+    """
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"Неизвестный профиль движка: {profile}, доступны: {list(ENGINE_PROFILES)}")
+
+    with _engines_lock:
+        if profile not in _engines:
+            _engines[profile] = _create_engine(profile, ENGINE_PROFILES[profile])
+        return _engines[profile]
+
+
+def _create_engine(profile, settings):
+    """Движок с пулом, statement_timeout и логированием медленных запросов"""
+    pool_min = settings['pool_min']
+    pool_max = max(settings['pool_max'], pool_min)
+
+    kwargs = {}
+    if settings['executemany_mode']:
+        kwargs['executemany_mode'] = settings['executemany_mode']
+
+    profile_engine = create_engine(
+        DATABASE_URL,
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_min,
+        max_overflow=pool_max - pool_min,
+        pool_timeout=settings['pool_timeout'],
+        pool_logging_name=profile,
+        pool_pre_ping=True,  # Проверка соединения перед использованием
+        pool_recycle=300,  # Переподключение каждые 300 секунд
+        connect_args={'options': f"-c statement_timeout={settings['statement_timeout_ms']}"},
+        echo=False,  # Установите True для отладки SQL запросов
+        **kwargs
+    )
+    _add_query_timing(profile_engine, profile)
+    return profile_engine
+
+
+def _add_query_timing(profile_engine, profile):
+    """Время каждого запроса через события движка: debug для всех, warning дольше SLOW_QUERY_MS"""
+
+    @event.listens_for(profile_engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(profile_engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info['query_started'].pop()) * 1000
+        query = ' '.join(statement.split())[:200]
+        if elapsed_ms >= SLOW_QUERY_MS:
+            logger.warning(f"[{profile}] Медленный запрос {elapsed_ms:.0f} мс: {query}")
+        else:
+            logger.debug(f"[{profile}] {elapsed_ms:.1f} мс: {query}")
+
+    @event.listens_for(profile_engine, "handle_error")
+    def _on_error(context):
+        # Запрос завершился ошибкой (в том числе по statement_timeout): отметка начала больше не нужна
+        started = context.connection.info.get('query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+# Движок по умолчанию (профиль interactive)
+engine = get_engine('interactive')
 
 # Создаем фабрику сессий
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Сессии загрузчиков (пересчет агрегатов после загрузки)
+BulkSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=get_engine('bulk'))
+
 # Базовый класс для моделей
 Base = declarative_base()
 
 
+def pool_stats(profile=None):
+    """
+    Состояние пулов соединений процесса
+
+    Args:
+        profile: Профиль движка. Если не указан, возвращается словарь по всем созданным профилям
+
+    Returns:
+        Словарь: size, max_size, checked_out (выдано сейчас), idle (свободно),
+        checkouts (выдач всего), waits (выдач при занятом пуле), wait_seconds (суммарное ожидание)
+    """
+    if profile is not None:
+        return get_engine(profile).pool.stats()
+    with _engines_lock:
+        return {name: profile_engine.pool.stats() for name, profile_engine in _engines.items()}
+
+
 # Функция для получения сессии базы данных
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
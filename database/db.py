@@ -1,19 +1,5 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# Конфигурация базы данных PostgreSQL
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'port': os.getenv('DB_PORT', '5432'),
-    'database': os.getenv('DB_NAME', 'server_metrics'),
-    'user': os.getenv('DB_USER', 'postgres'),
-    'password': os.getenv('DB_PASSWORD', 'postgres')
-}
+from base_logger import logger
+from database.connection import engine, pool_stats
 
 # SQL для создания таблицы
 CREATE_TABLE_SQL = """
@@ -38,21 +24,24 @@ ON server_metrics(vm, date, metric);
 
 
 def get_db_connection():
-    """Создание подключения к базе данных"""
+    """
+    psycopg2 соединение из пула engine (database/connection.py)
+
+    close() возвращает соединение в пул, незавершенная транзакция при этом откатывается
+    """
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        return conn
+        return engine.raw_connection()
     except Exception as e:
-        print(f"Ошибка подключения к базе данных: {e}")
+        logger.error(f"Ошибка подключения к базе данных: {e}, пул: {pool_stats('interactive')}")
         return None
 
 
 def close_db_connection(conn, cursor=None):
-    """Закрытие подключения к базе данных"""
+    """Возврат подключения в пул"""
     try:
         if cursor:
             cursor.close()
         if conn:
             conn.close()
     except Exception as e:
-        print(f"Ошибка при закрытии подключения: {e}")
+        logger.error(f"Ошибка при закрытии подключения: {e}")
@@ -2,66 +2,39 @@ import pandas as pd
 import streamlit as st
 from db import get_db_connection, close_db_connection
 import io
-from scripts.scripts import INSERT_SQL, LOG_SQL
+from database import import_jobs, normalize
+from database.ingest import ingest_dataframe
+from database.source_cache import file_digest, read_source
 
 def import_from_excel_to_db(file_path, source_type="excel"):
     """Импорт данных из Excel файла в базу данных"""
     try:
-        # Читаем Excel файл
-        df = pd.read_excel(file_path)
+        # Читаем Excel файл (повторная загрузка того же файла читается из кэша Feather)
+        df = read_source(file_path)
 
         # Проверяем необходимые колонки
-        required_columns = ['vm', 'date', 'metric', 'max_value', 'min_value', 'avg_value']
-        missing_cols = [col for col in required_columns if col not in df.columns]
-
-        if missing_cols:
-            st.error(f"Отсутствуют обязательные колонки: {missing_cols}")
-            return 0, False
-
-        # Подключаемся к базе
-        conn = get_db_connection()
-        if not conn:
-            st.error("Не удалось подключиться к базе данных")
+        try:
+            normalize.check_columns(df.columns, required=normalize.METRIC_COLUMNS)
+        except ValueError as e:
+            st.error(str(e))
             return 0, False
 
-        cursor = conn.cursor()
-
-        success_count = 0
-        error_count = 0
-
-        # Вставляем данные построчно
-        for _, row in df.iterrows():
-            try:
-                # Преобразуем дату
-                date_val = pd.to_datetime(row['date']).date()
-
-                # Вставляем данные
-                cursor.execute(INSERT_SQL, (
-                    str(row['vm']),
-                    date_val,
-                    str(row['metric']),
-                    float(row['max_value']) if pd.notna(row['max_value']) else None,
-                    float(row['min_value']) if pd.notna(row['min_value']) else None,
-                    float(row['avg_value']) if pd.notna(row['avg_value']) else None
-                ))
-                success_count += 1
-
-            except Exception as row_error:
-                error_count += 1
-                st.warning(f"Ошибка в строке {_}: {row_error}")
-                continue
-
-        # Логируем импорт
-        status = "success" if error_count == 0 else "partial"
-        cursor.execute(LOG_SQL, (source_type, success_count, status))
-
-        conn.commit()
+        # Загружаем данные через COPY во временную таблицу и слияние по ключу;
+        # загрузка записывается в import_batches, повторная загрузка того же файла пропускается.
+        # Соединение берется из пула bulk (ingest.engine): без statement_timeout дашборда
+        stats = ingest_dataframe(
+            df,
+            source=str(file_path),
+            source_type=source_type,
+            source_hash=file_digest(file_path)
+        )
 
-        # Закрываем подключение
-        cursor.close()
-        conn.close()
+        if stats['skipped']:
+            st.info("Этот файл уже был импортирован")
+        for reason, count in stats['reject_reasons'].items():
+            st.warning(f"Отклонено строк ({reason}): {count}")
 
-        return success_count, error_count
+        return stats['success'], stats['errors']
 
     except Exception as e:
         st.error(f"Ошибка при импорте данных: {e}")
@@ -71,44 +44,8 @@ def import_from_excel_to_db(file_path, source_type="excel"):
 def import_from_dataframe(df, source_type="manual"):
     """Импорт данных из DataFrame в базу"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return 0, 0
-
-        cursor = conn.cursor()
-
-        insert_sql = """
-        INSERT INTO server_metrics (vm, date, metric, max_value, min_value, avg_value)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        ON CONFLICT (vm, date, metric) 
-        DO UPDATE SET 
-            max_value = EXCLUDED.max_value,
-            min_value = EXCLUDED.min_value,
-            avg_value = EXCLUDED.avg_value,
-            updated_at = CURRENT_TIMESTAMP
-        """
-
-        success_count = 0
-
-        for _, row in df.iterrows():
-            try:
-                cursor.execute(insert_sql, (
-                    str(row['vm']),
-                    row['date'].date() if hasattr(row['date'], 'date') else row['date'],
-                    str(row['metric']),
-                    float(row['max_value']) if pd.notna(row['max_value']) else None,
-                    float(row['min_value']) if pd.notna(row['min_value']) else None,
-                    float(row['avg_value']) if pd.notna(row['avg_value']) else None
-                ))
-                success_count += 1
-            except:
-                continue
-
-        conn.commit()
-        cursor.close()
-        conn.close()
-
-        return success_count, 0
+        stats = ingest_dataframe(df, source_type=source_type)
+        return stats['success'], stats['errors']
 
     except Exception as e:
         st.error(f"Ошибка импорта: {e}")
@@ -133,33 +70,31 @@ def create_import_section():
         st.markdown("<br>", unsafe_allow_html=True)
         if st.button("📤 Импортировать в БД", use_container_width=True):
             if uploaded_file is not None:
-                with st.spinner("Импорт данных..."):
-                    # Сохраняем файл временно
-                    with open("temp_upload.xlsx", "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-
-                    # Импортируем в базу
-                    success_count, error_count = import_from_excel_to_db("temp_upload.xlsx")
-
-                    if success_count > 0:
-                        st.success(f"✅ Успешно импортировано: {success_count} записей")
-                        if error_count > 0:
-                            st.warning(f"⚠️ С ошибками: {error_count} записей")
-                    else:
-                        st.error("❌ Не удалось импортировать данные")
+                # Загрузка выполняется в фоновом потоке, интерфейс только следит за заданием
+                user = st.session_state.get('user') or {}
+                job_id = import_jobs.submit_import(
+                    uploaded_file.getvalue(),
+                    uploaded_file.name,
+                    created_by=user.get('username') or user.get('preferred_username')
+                )
+                st.session_state.setdefault('import_jobs', []).append(job_id)
+                st.info(f"Импорт поставлен в очередь (задание {job_id[:8]})")
             else:
                 st.warning("Пожалуйста, загрузите файл")
 
+    show_import_jobs()
+
     # Отображение истории импорта
     with st.expander("📋 История импорта"):
+        conn = None
         try:
             conn = get_db_connection()
             cursor = conn.cursor()
 
             cursor.execute("""
-                SELECT import_date, source_type, records_count, status 
-                FROM data_import_log 
-                ORDER BY import_date DESC 
+                SELECT started_at, source_type, rows_loaded, status
+                FROM import_batches
+                ORDER BY started_at DESC
                 LIMIT 10
             """)
 
@@ -172,7 +107,49 @@ def create_import_section():
                 st.info("Нет записей об импорте")
 
             cursor.close()
-            conn.close()
 
         except Exception as e:
-            st.warning(f"Не удалось загрузить историю: {e}")
\ No newline at end of file
+            st.warning(f"Не удалось загрузить историю: {e}")
+
+        finally:
+            close_db_connection(conn)
+
+
+JOB_STATUS_LABELS = {
+    import_jobs.STATUS_QUEUED: "⏳ В очереди",
+    import_jobs.STATUS_RUNNING: "🔄 Выполняется",
+    import_jobs.STATUS_COMPLETED: "✅ Завершено",
+    import_jobs.STATUS_SKIPPED: "↩️ Уже загружен",
+    import_jobs.STATUS_FAILED: "❌ Ошибка",
+}
+
+
+@st.fragment(run_every="2s")
+def show_import_jobs():
+    """
+    Статус заданий импорта текущей сессии
+
+    Фрагмент перезапускается сам каждые 2 секунды, не перезапуская весь скрипт страницы
+    """
+    job_ids = st.session_state.get('import_jobs', [])
+    if not job_ids:
+        return
+
+    for job_id in reversed(job_ids[-5:]):
+        job = import_jobs.get_job(job_id)
+        if job is None:
+            continue
+
+        label = JOB_STATUS_LABELS.get(job['status'], job['status'])
+        st.markdown(f"**{job['filename']}** — {label}")
+
+        if job['status'] == import_jobs.STATUS_RUNNING and job['rows_total']:
+            speed = f", {job['rows_per_sec']:,.0f} строк/с" if job['rows_per_sec'] else ""
+            st.progress(
+                min(job['rows_done'] / job['rows_total'], 1.0),
+                text=f"{job['rows_done']:,} из {job['rows_total']:,} строк{speed}"
+            )
+        elif job['status'] == import_jobs.STATUS_COMPLETED:
+            st.caption(f"Загружено: {job['rows_loaded']:,}, отклонено: {job['rows_rejected']:,}")
+        elif job['status'] == import_jobs.STATUS_FAILED:
+            st.caption(job['error'] or "")
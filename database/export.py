@@ -0,0 +1,346 @@
+"""
+Потоковая выгрузка метрик в CSV, Parquet и Excel
+CSV выгружается сервером через COPY (SELECT ...) TO STDOUT: psycopg2 пишет поток порциями
+во временный файл (при необходимости через gzip), строки не собираются в DataFrame.
+Parquet пишется порциями с серверного курсора через pyarrow.ParquetWriter, Excel - построчно
+с серверного курсора в книгу openpyxl в режиме write_only; лист Summary считает агрегат в БД.
+Временный файл (SpooledTemporaryFile) держится в памяти до EXPORT_SPOOL_BYTES и затем
+переносится на диск, поэтому размер выгрузки не ограничен памятью контейнера
+"""
+import gzip
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from base_logger import logger
+from database.connection import get_engine
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    logger.warning("pyarrow не установлен, выгрузка в Parquet недоступна")
+
+try:
+    from openpyxl import Workbook
+
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    OPENPYXL_AVAILABLE = False
+    logger.warning("openpyxl не установлен, выгрузка в Excel недоступна")
+
+# Выгрузка за длительный период дольше statement_timeout дашборда: профиль bulk
+engine = get_engine('bulk')
+
+# Сколько байт выгрузки держать в памяти до переноса временного файла на диск
+EXPORT_SPOOL_BYTES = int(os.getenv("EXPORT_SPOOL_BYTES", str(8 * 1024 * 1024)))
+
+# Строк в одной порции Parquet (одна группа строк в файле)
+PARQUET_CHUNK_ROWS = 200_000
+
+# Строк в одной порции серверного курсора для Excel
+EXCEL_CHUNK_ROWS = 50_000
+
+# Предел строк на листе Excel (с заголовком): дальше данные продолжаются на листах Metrics_2, Metrics_3, ...
+EXCEL_MAX_ROWS = 1_048_576
+
+EXPORT_COLUMNS = ['vm', 'date', 'metric', 'max_value', 'min_value', 'avg_value', 'updated_at']
+
+EXPORT_FROM_SQL = """
+FROM server_metrics sm
+JOIN vms v ON v.id = sm.vm_id
+JOIN metrics m ON m.id = sm.metric_id
+"""
+
+EXPORT_SELECT_SQL = """
+SELECT
+    v.name AS vm,
+    sm.date,
+    m.name AS metric,
+    sm.max_value,
+    sm.min_value,
+    sm.avg_value,
+    sm.updated_at
+""" + EXPORT_FROM_SQL
+
+# Excel не хранит часовой пояс: даты выгружаются в UTC без пояса
+EXCEL_SELECT_SQL = """
+SELECT
+    v.name AS vm,
+    sm.date AT TIME ZONE 'UTC' AS date,
+    m.name AS metric,
+    sm.max_value,
+    sm.min_value,
+    sm.avg_value,
+    sm.updated_at AT TIME ZONE 'UTC' AS updated_at
+""" + EXPORT_FROM_SQL
+
+EXPORT_ORDER_SQL = " ORDER BY v.name, sm.date, m.name"
+
+COUNT_SQL = "SELECT count(*)" + EXPORT_FROM_SQL
+
+# Пороги статуса загрузки на листе Summary (%): (низкая, высокая)
+CPU_STATUS_THRESHOLDS = (20, 70)
+MEM_STATUS_THRESHOLDS = (30, 80)
+
+SUMMARY_COLUMNS = [
+    'vm',
+    'CPU_avg_mean', 'CPU_avg_max', 'CPU_avg_min', 'CPU_days_nunique',
+    'Memory_avg_mean', 'Memory_avg_max', 'Memory_avg_min', 'Memory_days_nunique',
+    'CPU_status', 'Memory_status',
+]
+
+# Сводка по серверам для листа Summary: одна агрегация в БД вместо groupby по всей выгрузке.
+# {where} - условие build_filters с параметрами %s, поэтому % в шаблонах LIKE удвоены
+SUMMARY_SQL = """
+SELECT
+    vm,
+    cpu_mean, cpu_max, cpu_min, cpu_days,
+    mem_mean, mem_max, mem_min, mem_days,
+    CASE WHEN cpu_mean > {cpu_high} THEN 'Высокая' WHEN cpu_mean < {cpu_low} THEN 'Низкая' ELSE 'Нормальная' END,
+    CASE WHEN mem_mean > {mem_high} THEN 'Высокая' WHEN mem_mean < {mem_low} THEN 'Низкая' ELSE 'Нормальная' END
+FROM (
+    SELECT
+        v.name AS vm,
+        round(avg(sm.avg_value) FILTER (WHERE m.name ILIKE '%%cpu.usage%%')::numeric, 2) AS cpu_mean,
+        round(max(sm.avg_value) FILTER (WHERE m.name ILIKE '%%cpu.usage%%')::numeric, 2) AS cpu_max,
+        round(min(sm.avg_value) FILTER (WHERE m.name ILIKE '%%cpu.usage%%')::numeric, 2) AS cpu_min,
+        count(DISTINCT sm.date) FILTER (WHERE m.name ILIKE '%%cpu.usage%%') AS cpu_days,
+        round(avg(sm.avg_value) FILTER (WHERE m.name ILIKE '%%mem.usage%%')::numeric, 2) AS mem_mean,
+        round(max(sm.avg_value) FILTER (WHERE m.name ILIKE '%%mem.usage%%')::numeric, 2) AS mem_max,
+        round(min(sm.avg_value) FILTER (WHERE m.name ILIKE '%%mem.usage%%')::numeric, 2) AS mem_min,
+        count(DISTINCT sm.date) FILTER (WHERE m.name ILIKE '%%mem.usage%%') AS mem_days
+    {from_sql}
+    {where} AND (m.name ILIKE '%%cpu.usage%%' OR m.name ILIKE '%%mem.usage%%')
+    GROUP BY v.name
+) s
+ORDER BY vm
+"""
+
+COPY_CSV_SQL = "COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+
+FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+def build_filters(filters: Optional[Dict[str, Any]] = None) -> Tuple[str, List[Any]]:
+    """
+    Условие WHERE по фильтрам выгрузки
+
+    Args:
+        filters: Словарь с необязательными ключами vm (имя сервера или список имен),
+            start_date, end_date, metric (подстрока)
+
+    Returns:
+        Кортеж (WHERE ..., параметры psycopg2)
+    """
+    conditions, params = ["TRUE"], []
+    filters = filters or {}
+
+    vm = filters.get('vm')
+    if vm and isinstance(vm, (list, tuple)):
+        # psycopg2 передает list как массив PostgreSQL
+        conditions.append("v.name = ANY(%s)")
+        params.append(list(vm))
+    elif vm:
+        conditions.append("v.name = %s")
+        params.append(vm)
+    if filters.get('start_date'):
+        conditions.append("sm.date >= %s")
+        params.append(filters['start_date'])
+    if filters.get('end_date'):
+        # Дата окончания включительно: date хранится с временем
+        conditions.append("sm.date < %s::date + 1")
+        params.append(filters['end_date'])
+    if filters.get('metric'):
+        conditions.append("m.name LIKE %s")
+        params.append(f"%{filters['metric']}%")
+
+    return " WHERE " + " AND ".join(conditions), params
+
+
+def count_rows(filters: Optional[Dict[str, Any]] = None) -> int:
+    """Количество строк выгрузки"""
+    where, params = build_filters(filters)
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(COUNT_SQL + where, params)
+        return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def export_metrics(
+        filters: Optional[Dict[str, Any]] = None,
+        fmt: str = 'csv.gz',
+        file_prefix: str = 'server_metrics'
+) -> Dict[str, Any]:
+    """
+    Выгрузка метрик во временный файл
+
+    Args:
+        filters: Фильтры (см. build_filters)
+        fmt: Формат: 'csv', 'csv.gz', 'parquet' или 'xlsx'
+        file_prefix: Начало имени файла для скачивания
+
+    Returns:
+        Словарь: file (временный файл, открыт на чтение с начала; закрытие удаляет его),
+        file_name, mime, rows, bytes, seconds
+
+    Raises:
+        ValueError: Если формат неизвестен
+        RuntimeError: Если для Parquet не установлен pyarrow или для Excel - openpyxl
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}, доступны: {list(FORMATS)}")
+    if fmt == 'parquet' and not PYARROW_AVAILABLE:
+        raise RuntimeError("Для выгрузки в Parquet нужен pyarrow")
+    if fmt == 'xlsx' and not OPENPYXL_AVAILABLE:
+        raise RuntimeError("Для выгрузки в Excel нужен openpyxl")
+
+    started = time.perf_counter()
+    where, params = build_filters(filters)
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES, prefix='export-')
+
+    conn = engine.raw_connection()
+    try:
+        if fmt == 'parquet':
+            rows = _write_parquet(conn, EXPORT_SELECT_SQL + where + EXPORT_ORDER_SQL, params, spool)
+        elif fmt == 'xlsx':
+            rows = _write_excel(conn, where, params, spool)
+        else:
+            rows = _copy_csv(conn, EXPORT_SELECT_SQL + where + EXPORT_ORDER_SQL, params, spool, compress=fmt == 'csv.gz')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        spool.close()
+        raise
+    finally:
+        conn.close()
+
+    size = spool.tell()
+    spool.seek(0)
+    seconds = time.perf_counter() - started
+    suffix, mime = FORMATS[fmt]
+
+    logger.info(f"Выгрузка {fmt}: {rows} строк, {size / 1024 / 1024:.1f} МБ за {seconds:.2f} с")
+    return {
+        'file': spool,
+        'file_name': f"{file_prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}",
+        'mime': mime,
+        'rows': rows,
+        'bytes': size,
+        'seconds': seconds,
+    }
+
+
+def _copy_csv(conn, query: str, params: List[Any], spool, compress: bool) -> int:
+    """COPY TO STDOUT в файл; COPY не принимает параметры, поэтому запрос подставляется через mogrify"""
+    cursor = conn.cursor()
+    try:
+        sql = COPY_CSV_SQL.format(query=cursor.mogrify(query, params).decode())
+        if compress:
+            with gzip.GzipFile(fileobj=spool, mode='wb', compresslevel=6) as gz:
+                cursor.copy_expert(sql, gz)
+        else:
+            cursor.copy_expert(sql, spool)
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def _write_parquet(conn, query: str, params: List[Any], spool) -> int:
+    """Parquet по порциям с серверного курсора: одна порция - одна группа строк"""
+    schema = pa.schema([
+        ('vm', pa.string()),
+        ('date', pa.timestamp('us', tz='UTC')),
+        ('metric', pa.string()),
+        ('max_value', pa.float64()),
+        ('min_value', pa.float64()),
+        ('avg_value', pa.float64()),
+        ('updated_at', pa.timestamp('us', tz='UTC')),
+    ])
+
+    rows = 0
+    cursor = conn.cursor(name='export_metrics')
+    cursor.itersize = PARQUET_CHUNK_ROWS
+    try:
+        cursor.execute(query, params)
+        with pq.ParquetWriter(spool, schema, compression='snappy') as writer:
+            while True:
+                chunk = cursor.fetchmany(PARQUET_CHUNK_ROWS)
+                if not chunk:
+                    break
+                columns = list(zip(*chunk))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                    schema=schema
+                ))
+                rows += len(chunk)
+    finally:
+        cursor.close()
+    return rows
+
+
+def _write_excel(conn, where: str, params: List[Any], spool) -> int:
+    """
+    Книга Excel в режиме write_only: строки пишутся сразу в XML листа и не хранятся в памяти.
+    Лист Summary - одна агрегация SUMMARY_SQL в БД
+    """
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows, sheets = None, 0, 0
+
+    rows = 0
+    cursor = conn.cursor(name='export_metrics_xlsx')
+    cursor.itersize = EXCEL_CHUNK_ROWS
+    try:
+        cursor.execute(EXCEL_SELECT_SQL + where + EXPORT_ORDER_SQL, params)
+        while True:
+            chunk = cursor.fetchmany(EXCEL_CHUNK_ROWS)
+            if not chunk:
+                break
+            for row in chunk:
+                if sheet is None or sheet_rows == EXCEL_MAX_ROWS:
+                    sheets += 1
+                    sheet = workbook.create_sheet('Metrics' if sheets == 1 else f'Metrics_{sheets}')
+                    sheet.append(EXPORT_COLUMNS)
+                    sheet_rows = 1
+                sheet.append(row)
+                sheet_rows += 1
+            rows += len(chunk)
+    finally:
+        cursor.close()
+
+    if sheet is None:
+        workbook.create_sheet('Metrics').append(EXPORT_COLUMNS)
+
+    if rows:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(SUMMARY_SQL.format(
+                from_sql=EXPORT_FROM_SQL,
+                where=where,
+                cpu_low=CPU_STATUS_THRESHOLDS[0],
+                cpu_high=CPU_STATUS_THRESHOLDS[1],
+                mem_low=MEM_STATUS_THRESHOLDS[0],
+                mem_high=MEM_STATUS_THRESHOLDS[1],
+            ), params)
+            summary = workbook.create_sheet('Summary')
+            summary.append(SUMMARY_COLUMNS)
+            for row in cursor:
+                summary.append(row)
+        finally:
+            cursor.close()
+
+    workbook.save(spool)
+    return rows
@@ -0,0 +1,284 @@
+"""
+Журнал загрузок import_batches: идемпотентная загрузка с возобновлением
+Загрузчик открывает запись по хэшу содержимого источника и целевой таблице. Уже загруженный
+источник пропускается. Файл загружается блоками по целым строкам: каждый блок сливается
+в целевую таблицу и фиксирует в import_batches смещение своего конца в той же транзакции,
+поэтому после сбоя загрузка продолжается с первого незакоммиченного блока.
+Пока запись открыта, загрузчик держит advisory lock по ее id: один источник не загружается
+двумя процессами одновременно
+"""
+import hashlib
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+import pandas as pd
+
+from base_logger import logger
+from database.source_cache import file_digest
+
+# Размер блока между контрольными точками по умолчанию
+DEFAULT_CHECKPOINT_BYTES = 64 * 1024 * 1024
+
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+
+# Запросы выполняются psycopg2 курсором загрузчика, отсюда pyformat параметры
+OPEN_BATCH_SQL = """
+INSERT INTO import_batches (source, source_type, source_hash, target, status, bytes_total)
+VALUES (%(source)s, %(source_type)s, %(source_hash)s, %(target)s, 'running', %(bytes_total)s)
+ON CONFLICT ON CONSTRAINT uq_import_batches_source_target DO UPDATE SET source = EXCLUDED.source
+RETURNING id
+"""
+
+LOCK_BATCH_SQL = "SELECT pg_try_advisory_lock(hashtext('import_batches'), %(id)s)"
+UNLOCK_BATCH_SQL = "SELECT pg_advisory_unlock(hashtext('import_batches'), %(id)s)"
+
+BATCH_STATE_SQL = "SELECT status, bytes_committed, rows_read FROM import_batches WHERE id = %(id)s"
+
+# Повторная загрузка (force) начинает источник заново
+RESET_BATCH_SQL = """
+UPDATE import_batches
+SET bytes_committed = 0, rows_read = 0, rows_loaded = 0, rows_rejected = 0, duration_seconds = 0
+WHERE id = %(id)s
+"""
+
+START_BATCH_SQL = """
+UPDATE import_batches
+SET status = 'running', error = NULL, finished_at = NULL, bytes_total = %(bytes_total)s
+WHERE id = %(id)s
+"""
+
+CHECKPOINT_SQL = """
+UPDATE import_batches
+SET bytes_committed = COALESCE(%(bytes_committed)s, bytes_committed),
+    rows_read = rows_read + %(rows_read)s,
+    rows_loaded = rows_loaded + %(rows_loaded)s,
+    rows_rejected = rows_rejected + %(rows_rejected)s,
+    duration_seconds = duration_seconds + %(seconds)s
+WHERE id = %(id)s
+"""
+
+FINISH_BATCH_SQL = """
+UPDATE import_batches SET status = %(status)s, error = %(error)s, finished_at = now() WHERE id = %(id)s
+"""
+
+
+def dataframe_digest(df: pd.DataFrame) -> str:
+    """SHA-256 содержимого DataFrame (колонки и значения, без индекса)"""
+    digest = hashlib.sha256()
+    digest.update('\x1f'.join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def begin_batch(
+        conn,
+        source: str,
+        source_hash: str,
+        target: str,
+        source_type: str,
+        bytes_total: Optional[int] = None,
+        force: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Открытие (или продолжение) загрузки источника в целевую таблицу
+
+    Args:
+        conn: psycopg2 соединение загрузчика (держит advisory lock до finish_batch)
+        source: Путь к файлу или описание источника
+        source_hash: Хэш содержимого (file_digest / dataframe_digest)
+        target: Целевая таблица
+        source_type: Тип источника
+        bytes_total: Размер файла
+        force: Загрузить заново, даже если источник уже загружен
+
+    Returns:
+        Словарь (id, bytes_committed, rows_read) или None, если источник уже загружен
+
+    Raises:
+        RuntimeError: Если источник сейчас загружается другим процессом
+    """
+    cursor = conn.cursor()
+    locked = False
+    try:
+        cursor.execute(OPEN_BATCH_SQL, {
+            'source': source, 'source_type': source_type, 'source_hash': source_hash,
+            'target': target, 'bytes_total': bytes_total,
+        })
+        batch_id = cursor.fetchone()[0]
+        conn.commit()
+
+        cursor.execute(LOCK_BATCH_SQL, {'id': batch_id})
+        if not cursor.fetchone()[0]:
+            raise RuntimeError(f"Источник {source} уже загружается другим процессом (import_batches.id={batch_id})")
+        locked = True
+
+        cursor.execute(BATCH_STATE_SQL, {'id': batch_id})
+        status, bytes_committed, rows_read = cursor.fetchone()
+
+        if status == STATUS_COMPLETED and not force:
+            cursor.execute(UNLOCK_BATCH_SQL, {'id': batch_id})
+            conn.commit()
+            logger.info(f"Источник {source} уже загружен в {target} (import_batches.id={batch_id}), пропуск")
+            return None
+
+        if force:
+            cursor.execute(RESET_BATCH_SQL, {'id': batch_id})
+            bytes_committed, rows_read = 0, 0
+        cursor.execute(START_BATCH_SQL, {'id': batch_id, 'bytes_total': bytes_total})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        if locked:
+            # Advisory lock сессионный и откатом не снимается: соединение вернется в пул
+            # и будет блокировать источник для всех следующих загрузок
+            cursor.execute(UNLOCK_BATCH_SQL, {'id': batch_id})
+            conn.commit()
+        raise
+    finally:
+        cursor.close()
+
+    if bytes_committed or rows_read:
+        logger.info(f"Продолжение загрузки {source}: смещение {bytes_committed} байт, {rows_read} строк")
+    return {'id': batch_id, 'bytes_committed': bytes_committed, 'rows_read': rows_read}
+
+
+def checkpoint(cursor, batch_id: int, result: Dict[str, Any], seconds: float, bytes_committed: Optional[int] = None) -> None:
+    """
+    Контрольная точка в транзакции блока: смещение конца блока и счетчики строк
+
+    Args:
+        cursor: psycopg2 курсор транзакции, в которой загружен блок
+        batch_id: import_batches.id
+        result: Результат блока (staged, success, errors)
+        seconds: Длительность блока
+        bytes_committed: Смещение конца блока в файле (None для DataFrame: позиция хранится в rows_read)
+    """
+    cursor.execute(CHECKPOINT_SQL, {
+        'id': batch_id,
+        'bytes_committed': bytes_committed,
+        'rows_read': result['staged'] + result['errors'],
+        'rows_loaded': result['success'],
+        'rows_rejected': result['errors'],
+        'seconds': seconds,
+    })
+
+
+def finish_batch(cursor, batch_id: int, status: str, error: Optional[str] = None) -> None:
+    """Завершение загрузки и снятие advisory lock (коммит выполняет вызывающий код)"""
+    cursor.execute(FINISH_BATCH_SQL, {'id': batch_id, 'status': status, 'error': error})
+    cursor.execute(UNLOCK_BATCH_SQL, {'id': batch_id})
+
+
+def run_batch(
+        conn,
+        batch: Dict[str, Any],
+        blocks: Iterable[Tuple[Any, Optional[int]]],
+        load_block: Callable[[Any, Any], Dict[str, Any]],
+        after_commit: Optional[Callable[[Dict[str, Any]], None]] = None,
+        source: str = ''
+) -> Dict[str, Any]:
+    """
+    Загрузка блоков с контрольной точкой и коммитом после каждого блока
+
+    Args:
+        conn: psycopg2 соединение, на котором открыт batch
+        batch: Результат begin_batch
+        blocks: Пары (данные блока, смещение конца блока в байтах или None)
+        load_block: Загрузка блока курсором без коммита, возвращает словарь (staged, success, errors, ...)
+        after_commit: Вызывается с результатом блока после коммита
+        source: Источник для логов
+
+    Returns:
+        Словарь (staged, success, errors, reject_reasons) за этот запуск
+    """
+    totals = {'staged': 0, 'success': 0, 'errors': 0, 'reject_reasons': Counter()}
+    cursor = conn.cursor()
+    try:
+        for payload, offset in blocks:
+            started = time.perf_counter()
+            try:
+                result = load_block(cursor, payload)
+                checkpoint(cursor, batch['id'], result, time.perf_counter() - started, bytes_committed=offset)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            for key in ('staged', 'success', 'errors'):
+                totals[key] += result[key]
+            totals['reject_reasons'].update(result.get('reject_reasons', {}))
+            if after_commit is not None:
+                after_commit(result)
+
+        finish_batch(cursor, batch['id'], STATUS_COMPLETED)
+        conn.commit()
+
+    except Exception as e:
+        logger.error(f"Загрузка {source} прервана, зафиксированные блоки сохранены: {e}", exc_info=True)
+        try:
+            finish_batch(cursor, batch['id'], STATUS_FAILED, str(e))
+            conn.commit()
+        except Exception as log_error:
+            # Соединение потеряно: запись остается running, advisory lock снят вместе с сессией
+            logger.warning(f"Не удалось отметить загрузку {source} как failed: {log_error}")
+        raise
+
+    finally:
+        cursor.close()
+
+    return totals
+
+
+def iter_line_blocks(
+        file_path: Union[str, Path],
+        start_offset: int = 0,
+        block_bytes: int = DEFAULT_CHECKPOINT_BYTES
+) -> Iterator[Tuple[bytes, bytes, int]]:
+    """
+    Чтение текстового файла блоками по целым строкам начиная со смещения
+
+    Строки с переводом строки внутри кавычек не поддерживаются: в выгрузках метрик их нет
+
+    Args:
+        file_path: Путь к файлу с заголовком в первой строке
+        start_offset: Смещение, с которого продолжить (0 - сразу после заголовка)
+        block_bytes: Примерный размер блока
+
+    Yields:
+        Кортежи (строка заголовка, блок целых строк, смещение конца блока)
+    """
+    with open(file_path, 'rb') as f:
+        header = f.readline()
+        offset = max(start_offset, len(header))
+        f.seek(offset)
+        while True:
+            block = f.read(block_bytes)
+            if not block:
+                break
+            if not block.endswith(b'\n'):
+                block += f.readline()
+            offset += len(block)
+            yield header, block, offset
+
+
+def open_file_batch(
+        conn,
+        file_path: Path,
+        target: str,
+        source_type: str,
+        force: bool = False
+) -> Optional[Dict[str, Any]]:
+    """begin_batch для файла: хэш содержимого и размер"""
+    return begin_batch(
+        conn,
+        source=str(file_path),
+        source_hash=file_digest(file_path),
+        target=target,
+        source_type=source_type,
+        bytes_total=file_path.stat().st_size,
+        force=force
+    )
@@ -0,0 +1,197 @@
+"""
+Фоновая загрузка файлов из интерфейса
+Загруженный файл сохраняется во временный каталог, в import_jobs создается задание,
+а загрузка выполняется в пуле потоков процесса приложения (ingest_dataframe с COPY,
+см. database/ingest.py). После каждой закоммиченной порции рабочий поток записывает
+в задание прогресс и скорость; интерфейс только читает статус и не блокируется загрузкой
+"""
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from base_logger import logger
+from database.connection import engine
+
+# Количество одновременных фоновых загрузок
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+
+# Каталог для загруженных файлов до окончания загрузки
+UPLOAD_DIR = Path(os.getenv("IMPORT_UPLOAD_DIR", Path(tempfile.gettempdir()) / "server_metrics_uploads"))
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_SKIPPED = 'skipped'
+STATUS_FAILED = 'failed'
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+JOB_COLUMNS = (
+    "id, filename, source_type, status, batch_id, rows_total, rows_done, rows_loaded, rows_rejected, "
+    "rows_per_sec, error, created_by, created_at, started_at, finished_at, updated_at"
+)
+
+CREATE_JOB_SQL = """
+INSERT INTO import_jobs (id, filename, source_type, status, created_by)
+VALUES (:id, :filename, :source_type, 'queued', :created_by)
+"""
+
+START_JOB_SQL = """
+UPDATE import_jobs SET status = 'running', rows_total = :rows_total, started_at = now(), updated_at = now()
+WHERE id = :id
+"""
+
+PROGRESS_SQL = """
+UPDATE import_jobs
+SET rows_done = rows_done + :rows_done,
+    rows_loaded = rows_loaded + :rows_loaded,
+    rows_rejected = rows_rejected + :rows_rejected,
+    rows_per_sec = (rows_done + :rows_done) / GREATEST(EXTRACT(EPOCH FROM now() - started_at), 0.001),
+    updated_at = now()
+WHERE id = :id
+"""
+
+FINISH_JOB_SQL = """
+UPDATE import_jobs
+SET status = :status, batch_id = :batch_id, error = :error, finished_at = now(), updated_at = now()
+WHERE id = :id
+"""
+
+# Задания, прерванные остановкой приложения
+INTERRUPTED_JOBS_SQL = """
+UPDATE import_jobs
+SET status = 'failed', error = 'Загрузка прервана перезапуском приложения', finished_at = now(), updated_at = now()
+WHERE status IN ('queued', 'running')
+"""
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def submit_import(
+        content: bytes,
+        filename: str,
+        source_type: str = 'excel',
+        created_by: Optional[str] = None
+) -> str:
+    """
+    Постановка загрузки файла в фоновую очередь
+
+    Args:
+        content: Содержимое загруженного файла
+        filename: Исходное имя файла (расширение определяет формат)
+        source_type: Тип источника для import_batches
+        created_by: Пользователь, загрузивший файл
+
+    Returns:
+        id задания (import_jobs.id)
+    """
+    executor = _get_executor()
+
+    job_id = str(uuid.uuid4())
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    path = UPLOAD_DIR / f"{job_id}{Path(filename).suffix.lower()}"
+    path.write_bytes(content)
+
+    with engine.begin() as conn:
+        conn.execute(text(CREATE_JOB_SQL), {
+            'id': job_id, 'filename': filename, 'source_type': source_type, 'created_by': created_by,
+        })
+
+    executor.submit(_run_job, job_id, path, filename, source_type)
+    logger.info(f"Загрузка {filename} поставлена в очередь (задание {job_id})")
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Статус задания или None, если задание не найдено"""
+    with engine.connect() as conn:
+        row = conn.execute(text(f"SELECT {JOB_COLUMNS} FROM import_jobs WHERE id = :id"), {'id': job_id}).mappings().first()
+    return dict(row) if row else None
+
+
+def recent_jobs(limit: int = 10) -> List[Dict[str, Any]]:
+    """Последние задания, новые первыми"""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(f"SELECT {JOB_COLUMNS} FROM import_jobs ORDER BY created_at DESC LIMIT :limit"),
+            {'limit': limit}
+        ).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Пул потоков загрузки, общий для всех сессий приложения
+
+    При создании пула задания, оставшиеся активными от прошлого запуска приложения, отмечаются как failed
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            with engine.begin() as conn:
+                interrupted = conn.execute(text(INTERRUPTED_JOBS_SQL)).rowcount
+            if interrupted:
+                logger.warning(f"Отмечено прерванных заданий загрузки: {interrupted}")
+            _executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix='import')
+        return _executor
+
+
+def _run_job(job_id: str, path: Path, filename: str, source_type: str) -> None:
+    """Выполнение задания в рабочем потоке"""
+    # Импорт здесь: ingest тянет repository и normalize, которые не нужны для чтения статуса
+    from database import normalize
+    from database.ingest import ingest_dataframe
+    from database.source_cache import file_digest, read_source
+
+    started = time.perf_counter()
+    status, batch_id, error = STATUS_FAILED, None, None
+    try:
+        df = read_source(path, use_cache=False)
+        normalize.check_columns(df.columns, required=normalize.METRIC_COLUMNS)
+
+        with engine.begin() as conn:
+            conn.execute(text(START_JOB_SQL), {'id': job_id, 'rows_total': len(df)})
+
+        stats = ingest_dataframe(
+            df,
+            source=filename,
+            source_type=source_type,
+            source_hash=file_digest(path),
+            on_block=lambda result: _report_progress(job_id, result)
+        )
+        status = STATUS_SKIPPED if stats['skipped'] else STATUS_COMPLETED
+        batch_id = stats['batch_id']
+
+    except Exception as e:
+        error = str(e)
+        logger.error(f"Ошибка фоновой загрузки {filename} (задание {job_id}): {e}", exc_info=True)
+
+    finally:
+        path.unlink(missing_ok=True)
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(FINISH_JOB_SQL), {
+                    'id': job_id, 'status': status, 'batch_id': batch_id, 'error': error,
+                })
+        except Exception as e:
+            logger.error(f"Не удалось сохранить статус задания {job_id}: {e}")
+
+    logger.info(f"Задание {job_id} ({filename}): {status}, {time.perf_counter() - started:.2f} с")
+
+
+def _report_progress(job_id: str, result: Dict[str, Any]) -> None:
+    """Прогресс задания после коммита порции"""
+    with engine.begin() as conn:
+        conn.execute(text(PROGRESS_SQL), {
+            'id': job_id,
+            'rows_done': result['staged'] + result['errors'],
+            'rows_loaded': result['success'],
+            'rows_rejected': result['errors'],
+        })
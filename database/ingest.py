@@ -0,0 +1,294 @@
+"""
+Потоковая загрузка метрик в server_metrics через COPY
+Данные (DataFrame или CSV/TSV файл) блоками копируются во временную staging-таблицу
+и сливаются в server_metrics по ключу uq_vm_date_metric; каждый блок коммитится
+вместе с контрольной точкой в import_batches (см. database/import_batches.py).
+Имена серверов и метрик заменяются на id справочников vms/metrics при слиянии
+"""
+import io
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+import pandas as pd
+
+from base_logger import logger
+from database import import_batches, normalize
+from database.connection import BulkSessionLocal, get_engine
+from database.partitions import ensure_partitions
+from database.repository import MetricsRepository
+
+# Профиль bulk (database/connection.py): свой пул и без statement_timeout
+engine = get_engine('bulk')
+
+# Размер порции по умолчанию: в памяти одновременно находится только одна порция
+DEFAULT_CHUNK_ROWS = 100_000
+
+STAGE_TABLE = 'server_metrics_stage'
+STAGE_COLUMNS = normalize.METRIC_COLUMNS
+
+CREATE_STAGE_SQL = f"""
+CREATE TEMP TABLE {STAGE_TABLE} (
+    seq BIGSERIAL,
+    vm VARCHAR(255),
+    date TIMESTAMP WITH TIME ZONE,
+    metric VARCHAR(100),
+    max_value DOUBLE PRECISION,
+    min_value DOUBLE PRECISION,
+    avg_value DOUBLE PRECISION
+) ON COMMIT DROP
+"""
+
+COPY_STAGE_SQL = f"COPY {STAGE_TABLE} ({', '.join(STAGE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+# Новые серверы и метрики добавляются в справочники до слияния;
+# ON CONFLICT защищает от параллельной загрузки тех же имен
+INSERT_DIMENSIONS_SQL = f"""
+INSERT INTO vms (name)
+SELECT DISTINCT vm FROM {STAGE_TABLE} s
+WHERE NOT EXISTS (SELECT 1 FROM vms v WHERE v.name = s.vm)
+ON CONFLICT (name) DO NOTHING;
+
+INSERT INTO metrics (name)
+SELECT DISTINCT metric FROM {STAGE_TABLE} s
+WHERE NOT EXISTS (SELECT 1 FROM metrics m WHERE m.name = s.metric)
+ON CONFLICT (name) DO NOTHING;
+"""
+
+# Дата усекается до дня, как в MetricsRepository.insert_from_dataframe: все загрузчики пишут один ключ.
+# DISTINCT ON оставляет последнюю строку по ключу: ON CONFLICT не может обновить строку дважды
+MERGE_STAGE_SQL = f"""
+INSERT INTO server_metrics (id, vm_id, date, metric_id, max_value, min_value, avg_value)
+SELECT gen_random_uuid(), v.id, staged.day, m.id, staged.max_value, staged.min_value, staged.avg_value
+FROM (
+    SELECT DISTINCT ON (vm, day, metric) vm, day, metric, max_value, min_value, avg_value
+    FROM (SELECT *, date_trunc('day', date) AS day FROM {STAGE_TABLE}) s
+    ORDER BY vm, day, metric, seq DESC
+) staged
+JOIN vms v ON v.name = staged.vm
+JOIN metrics m ON m.name = staged.metric
+ON CONFLICT ON CONSTRAINT uq_vm_date_metric DO UPDATE SET
+    max_value = EXCLUDED.max_value,
+    min_value = EXCLUDED.min_value,
+    avg_value = EXCLUDED.avg_value,
+    updated_at = now()
+"""
+
+
+def ingest_dataframe(
+        df: pd.DataFrame,
+        conn=None,
+        chunk_rows: int = DEFAULT_CHUNK_ROWS,
+        source: str = 'DataFrame',
+        source_type: str = 'dataframe',
+        source_hash: Optional[str] = None,
+        force: bool = False,
+        on_block: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Загрузка DataFrame в server_metrics через COPY
+
+    Каждая порция коммитится вместе с контрольной точкой в import_batches: тот же DataFrame
+    повторно не загружается, прерванная загрузка продолжается с первой незакоммиченной порции
+
+    Args:
+        df: DataFrame с колонками: vm, date, metric, max_value, min_value, avg_value
+        conn: psycopg2 соединение. Если не указано, берется из пула engine
+        chunk_rows: Количество строк в одной порции COPY
+        source: Описание источника для import_batches (например, путь к Excel файлу)
+        source_type: Тип источника для import_batches
+        source_hash: Хэш источника. По умолчанию хэш содержимого DataFrame
+        force: Загрузить заново, даже если источник уже загружен
+        on_block: Вызывается после коммита каждой порции с ее результатом (staged, success, errors)
+
+    Returns:
+        Словарь со статистикой загрузки (success, errors, reject_reasons, seconds, rows_per_sec, skipped)
+    """
+    normalize.check_columns(df.columns)
+    if source_hash is None:
+        source_hash = import_batches.dataframe_digest(df)
+
+    def open_batch(connection):
+        return import_batches.begin_batch(
+            connection, source=source, source_hash=source_hash, target='server_metrics',
+            source_type=source_type, force=force
+        )
+
+    def blocks(batch):
+        for start in range(batch['rows_read'], len(df), chunk_rows):
+            yield [df.iloc[start:start + chunk_rows]], None
+
+    return _ingest_batch(open_batch, blocks, conn=conn, source=source, on_block=on_block)
+
+
+def ingest_file(
+        file_path: Union[str, Path],
+        conn=None,
+        sep: Optional[str] = None,
+        chunk_rows: int = DEFAULT_CHUNK_ROWS,
+        checkpoint_bytes: int = import_batches.DEFAULT_CHECKPOINT_BYTES,
+        force: bool = False,
+        on_block: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Потоковая загрузка CSV/TSV файла в server_metrics через COPY
+
+    Файл читается блоками по checkpoint_bytes (целыми строками), блок - порциями по chunk_rows строк,
+    поэтому потребление памяти не зависит от размера файла. После каждого блока в import_batches
+    фиксируется смещение: уже загруженный файл пропускается, прерванная загрузка продолжается
+    с первого незакоммиченного блока.
+
+    Args:
+        file_path: Путь к CSV/TSV файлу
+        conn: psycopg2 соединение. Если не указано, берется из пула engine
+        sep: Разделитель. По умолчанию табуляция для .tsv/.txt и запятая для остальных
+        chunk_rows: Количество строк в одной порции COPY
+        checkpoint_bytes: Размер блока между контрольными точками
+        force: Загрузить заново, даже если файл уже загружен
+        on_block: Вызывается после коммита каждого блока с его результатом (staged, success, errors)
+
+    Returns:
+        Словарь со статистикой загрузки (success, errors, reject_reasons, seconds, rows_per_sec, skipped)
+    """
+    file_path = Path(file_path)
+    if sep is None:
+        sep = '\t' if file_path.suffix.lower() in ('.tsv', '.txt') else ','
+
+    header = pd.read_csv(file_path, sep=sep, nrows=0)
+    normalize.check_columns(header.columns)
+    usecols = [col for col in header.columns if col in STAGE_COLUMNS]
+
+    def open_batch(connection):
+        return import_batches.open_file_batch(connection, file_path, target='server_metrics',
+                                              source_type='csv', force=force)
+
+    def blocks(batch):
+        for header_line, block, offset in import_batches.iter_line_blocks(
+                file_path, batch['bytes_committed'], checkpoint_bytes):
+            chunks = pd.read_csv(
+                io.BytesIO(header_line + block),
+                sep=sep,
+                usecols=usecols,
+                dtype={'vm': str, 'metric': str},
+                chunksize=chunk_rows
+            )
+            yield chunks, offset
+
+    return _ingest_batch(open_batch, blocks, conn=conn, source=str(file_path), on_block=on_block)
+
+
+def _prepare_chunk(chunk: pd.DataFrame):
+    """
+    Приведение типов порции и отделение строк с ошибками (database/normalize.py)
+
+    Returns:
+        Кортеж (подготовленная порция, отклоненные строки с колонкой reject_reason)
+    """
+    return normalize.normalize_metrics(chunk)
+
+
+def _copy_chunk(cursor, chunk: pd.DataFrame) -> None:
+    """Копирование одной порции в staging-таблицу"""
+    buffer = io.StringIO()
+    chunk.to_csv(buffer, index=False, header=False, date_format='%Y-%m-%d %H:%M:%S%z')
+    buffer.seek(0)
+    cursor.copy_expert(COPY_STAGE_SQL, buffer)
+
+
+def _load_block(cursor, chunks: Iterable[pd.DataFrame], source: str = '') -> Dict[str, Any]:
+    """
+    Загрузка блока в staging-таблицу и слияние в server_metrics (без коммита)
+
+    Returns:
+        Словарь (staged, success, errors, first_date, last_date)
+    """
+    result = {'staged': 0, 'success': 0, 'errors': 0, 'reject_reasons': Counter(),
+              'first_date': None, 'last_date': None}
+    cursor.execute(CREATE_STAGE_SQL)
+
+    for chunk in chunks:
+        prepared, rejects = _prepare_chunk(chunk)
+        if len(rejects):
+            result['errors'] += len(rejects)
+            result['reject_reasons'].update(normalize.reject_counts(rejects))
+        if prepared.empty:
+            continue
+        _copy_chunk(cursor, prepared)
+        result['staged'] += len(prepared)
+        chunk_first, chunk_last = prepared['date'].min(), prepared['date'].max()
+        result['first_date'] = chunk_first if result['first_date'] is None else min(result['first_date'], chunk_first)
+        result['last_date'] = chunk_last if result['last_date'] is None else max(result['last_date'], chunk_last)
+        logger.debug(f"COPY порции: {len(prepared)} строк ({source})")
+
+    if result['staged']:
+        # Партиции создаются отдельным соединением до MERGE: загрузка еще не держит блокировок server_metrics
+        with engine.begin() as ddl_conn:
+            ensure_partitions(ddl_conn, 'server_metrics', result['first_date'], result['last_date'])
+
+        cursor.execute(INSERT_DIMENSIONS_SQL)
+        cursor.execute(MERGE_STAGE_SQL)
+        # Слияние обновляет существующие строки, поэтому загруженными считаются все строки блока
+        result['success'] = result['staged']
+
+    # Staging-таблица удаляется при коммите блока (ON COMMIT DROP)
+    return result
+
+
+def _refresh_daily(result: Dict[str, Any]) -> None:
+    """Пересчет дневного агрегата за дни закоммиченного блока"""
+    if result['staged']:
+        with BulkSessionLocal() as session, MetricsRepository(session) as repo:
+            repo.refresh_daily_rollup(start_date=result['first_date'], end_date=result['last_date'])
+
+
+def _ingest_batch(open_batch, blocks, conn=None, source: str = '', on_block=None) -> Dict[str, Any]:
+    """
+    Загрузка источника блоками с контрольными точками в import_batches
+    """
+    own_connection = conn is None
+    if own_connection:
+        conn = engine.raw_connection()
+
+    started = time.perf_counter()
+    try:
+        batch = open_batch(conn)
+        if batch is None:
+            return {'success': 0, 'errors': 0, 'reject_reasons': {}, 'seconds': 0.0, 'rows_per_sec': 0.0,
+                    'skipped': True, 'batch_id': None}
+
+        def after_commit(result):
+            # Дневной агрегат пересчитывается только за затронутые дни
+            _refresh_daily(result)
+            if on_block is not None:
+                on_block(result)
+
+        totals = import_batches.run_batch(
+            conn,
+            batch,
+            blocks(batch),
+            lambda cursor, chunks: _load_block(cursor, chunks, source=source),
+            after_commit=after_commit,
+            source=source
+        )
+    finally:
+        if own_connection:
+            conn.close()
+
+    seconds = time.perf_counter() - started
+    rows_per_sec = totals['success'] / seconds if seconds > 0 else 0.0
+    logger.info(
+        f"Загружено {totals['success']} записей из {source}, отброшено: {totals['errors']}, "
+        f"{seconds:.2f} с ({rows_per_sec:,.0f} строк/с)"
+    )
+    if totals['errors']:
+        logger.warning(f"Причины отклонения строк {source}: {dict(totals['reject_reasons'])}")
+    return {
+        'success': totals['success'],
+        'errors': totals['errors'],
+        'reject_reasons': dict(totals['reject_reasons']),
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(rows_per_sec, 1),
+        'skipped': False,
+        'batch_id': batch['id'],
+    }
@@ -1,11 +1,11 @@
 """
 Скрипт для инициализации базы данных и загрузки данных из Excel
 """
-import pandas as pd
-from sqlalchemy import create_engine
 from database.connection import Base, engine, DATABASE_URL
+from database import normalize
+from database.ingest import ingest_dataframe
 from database.models import ServerMetrics
-import uuid
+from database.source_cache import file_digest, read_source
 from datetime import datetime
 import os
 import sys
@@ -30,61 +30,47 @@ def init_database():
 
 
 def validate_and_transform_data(df):
-    """Проверка и преобразование данных из Excel"""
-    # Требуемые колонки в модели
-    required_columns = ['vm', 'date', 'metric', 'max_value', 'min_value', 'avg_value']
-
-    # Проверяем наличие необходимых колонок
-    missing_columns = [col for col in required_columns if col not in df.columns]
-    if missing_columns:
-        raise ValueError(f"Отсутствуют необходимые колонки: {missing_columns}")
-
-    # Преобразуем типы данных
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'])
-
-    # Преобразуем числовые колонки
-    numeric_columns = ['max_value', 'min_value', 'avg_value']
-    for col in numeric_columns:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+    """
+    Проверка структуры данных из Excel
 
+    Типы приводятся и некорректные строки отделяются при загрузке (database/normalize.py)
+    """
+    normalize.check_columns(df.columns, required=normalize.METRIC_COLUMNS)
     return df
 
 
-def load_excel_to_db(excel_path="../data/metrics.xlsx"):
-    """Загрузка данных из Excel в базу данных"""
+def load_excel_to_db(excel_path="../data/metrics.xlsx", force=False):
+    """
+    Загрузка данных из Excel в базу данных
+
+    Загрузка идемпотентна: строки сливаются по (vm, date, metric), а файл, уже загруженный
+    ранее (import_batches), пропускается, если не указан force
+    """
     logger.info(f"Загрузка данных из {excel_path}...")
 
     try:
         # Чтение Excel файла
-        df = pd.read_excel(excel_path)
+        df = read_source(excel_path)
         logger.info(f"Прочитано {len(df)} записей из Excel")
 
         # Проверяем и преобразуем данные
         df = validate_and_transform_data(df)
 
-        # Добавляем необходимые поля для модели
-        df['id'] = [uuid.uuid4() for _ in range(len(df))]
-
-        # Создаем подключение к базе данных
-        engine_db = create_engine(DATABASE_URL)
-
-        # Загружаем данные в таблицу server_metrics
-        with engine_db.begin() as connection:
-            # Очищаем таблицу перед загрузкой
-            connection.execute("TRUNCATE TABLE server_metrics RESTART IDENTITY CASCADE;")
-
-            # Загружаем данные
-            df.to_sql(
-                'server_metrics',
-                connection,
-                if_exists='append',
-                index=False,
-                method='multi'  # Для более быстрой загрузки
-            )
-
-        logger.info(f"Данные успешно загружены ({len(df)} записей)")
+        # Загружаем данные в таблицу server_metrics: vm/metric заменяются на id справочников
+        result = ingest_dataframe(
+            df,
+            source=str(excel_path),
+            source_type='excel',
+            source_hash=file_digest(excel_path),
+            force=force
+        )
+
+        if result['skipped']:
+            logger.info(f"Файл {excel_path} уже загружен")
+        else:
+            logger.info(f"Данные успешно загружены ({result['success']} записей)")
+            if result['errors']:
+                logger.warning(f"Отклонено {result['errors']} строк: {result['reject_reasons']}")
         return True
 
     except FileNotFoundError:
@@ -101,7 +87,7 @@ def load_excel_to_db(excel_path="../data/metrics.xlsx"):
 def check_excel_structure(excel_path):
     """Проверка структуры Excel файла"""
     try:
-        df = pd.read_excel(excel_path)
+        df = read_source(excel_path)
         print("\n" + "="*50)
         print("СТРУКТУРА EXCEL ФАЙЛА:")
         print("="*50)
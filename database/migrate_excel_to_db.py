@@ -24,7 +24,7 @@ def init_database():
 
         logger.info("Таблицы созданы успешно!")
         logger.info(f"   - Таблица: {ServerMetrics.__tablename__}")
-        logger.info(f"   - Индексы: idx_metrics_vm_date, idx_metrics_date, idx_metrics_metric")
+        logger.info(f"   - Индексы: uq_vm_date_metric, idx_metrics_date, idx_metrics_metric_date_cover")
 
         return True
 
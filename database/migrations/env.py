@@ -14,7 +14,8 @@ sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
 # Import base and models
 from database.connection import Base, DATABASE_URL
-from database.table import ServerMetrics  # Import all models here
+from database.models import (DataVersion, ImportBatch, ImportJob, Metric, RollupWatermark,  # Import all models here
+                             ServerMetrics, ServerMetricsDaily, VMMetrics, Vm)
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,49 @@
+"""Add server_metrics_daily rollup table
+
+Revision ID: 002_daily_rollup
+Revises: 001_initial
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002_daily_rollup'
+down_revision = '001_initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create server_metrics_daily table
+    op.create_table(
+        'server_metrics_daily',
+        sa.Column('vm', sa.String(length=255), primary_key=True, nullable=False),
+        sa.Column('day', sa.Date(), primary_key=True, nullable=False),
+        sa.Column('metric', sa.String(length=100), primary_key=True, nullable=False),
+        sa.Column('max_value', sa.Float(), nullable=True),
+        sa.Column('min_value', sa.Float(), nullable=True),
+        sa.Column('avg_value', sa.Float(), nullable=True),
+        sa.Column('samples', sa.Integer(), nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+
+    # Create indexes
+    op.create_index('idx_metrics_daily_metric_day', 'server_metrics_daily', ['metric', 'day'], unique=False)
+
+    # Fill rollup from existing data
+    op.execute("""
+        INSERT INTO server_metrics_daily (vm, day, metric, max_value, min_value, avg_value, samples)
+        SELECT vm, date(date), metric, max(max_value), min(min_value), avg(avg_value), count(*)
+        FROM server_metrics
+        GROUP BY vm, date(date), metric
+    """)
+
+
+def downgrade() -> None:
+    # Drop indexes
+    op.drop_index('idx_metrics_daily_metric_day', table_name='server_metrics_daily')
+
+    # Drop table
+    op.drop_table('server_metrics_daily')
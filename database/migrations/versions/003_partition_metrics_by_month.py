@@ -0,0 +1,165 @@
+"""Partition server_metrics and vm_metrics by month
+
+Revision ID: 003_partition_by_month
+Revises: 002_daily_rollup
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from database.partitions import PARTITIONS_AHEAD_MONTHS, add_months, create_partition_sql, iter_months, month_start
+
+# revision identifiers, used by Alembic.
+revision = '003_partition_by_month'
+down_revision = '002_daily_rollup'
+branch_labels = None
+depends_on = None
+
+SERVER_METRICS_COLUMNS = 'id, vm, date, metric, max_value, min_value, avg_value, created_at, updated_at'
+
+VM_METRICS_COLUMNS = (
+    'id, vm_name, vcenter, timestamp, cpu_usage_average, cpu_ready_summation, cpu_usagemhz_average, '
+    'mem_usage_average, mem_consumed_average, mem_vmmemctl_average, disk_usage_average, '
+    'disk_maxtotallatency_latest, net_usage_average, created_at'
+)
+
+
+def _server_metrics_columns():
+    return [
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('vm', sa.String(length=255), nullable=False),
+        sa.Column('date', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('metric', sa.String(length=100), nullable=False),
+        sa.Column('max_value', sa.DECIMAL(10, 5), nullable=True),
+        sa.Column('min_value', sa.DECIMAL(10, 5), nullable=True),
+        sa.Column('avg_value', sa.DECIMAL(10, 5), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    ]
+
+
+def _vm_metrics_columns():
+    return [
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('vm_name', sa.String(length=255), nullable=False),
+        sa.Column('vcenter', sa.String(length=100), nullable=False),
+        sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('cpu_usage_average', sa.DECIMAL(20, 5), nullable=True),
+        sa.Column('cpu_ready_summation', sa.DECIMAL(20, 5), nullable=True),
+        sa.Column('cpu_usagemhz_average', sa.DECIMAL(20, 5), nullable=True),
+        sa.Column('mem_usage_average', sa.DECIMAL(20, 5), nullable=True),
+        sa.Column('mem_consumed_average', sa.DECIMAL(20, 5), nullable=True),
+        sa.Column('mem_vmmemctl_average', sa.DECIMAL(20, 5), nullable=True),
+        sa.Column('disk_usage_average', sa.DECIMAL(20, 5), nullable=True),
+        sa.Column('disk_maxtotallatency_latest', sa.DECIMAL(20, 5), nullable=True),
+        sa.Column('net_usage_average', sa.DECIMAL(20, 5), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    ]
+
+
+def _create_server_metrics(**kw):
+    op.create_table(
+        'server_metrics',
+        *_server_metrics_columns(),
+        sa.PrimaryKeyConstraint('id', 'date', name='server_metrics_pkey'),
+        sa.UniqueConstraint('vm', 'date', 'metric', name='uq_vm_date_metric'),
+        **kw
+    )
+    op.create_index('idx_metrics_vm_date', 'server_metrics', ['vm', 'date', 'metric'], unique=False)
+    op.create_index('idx_metrics_date', 'server_metrics', ['date'], unique=False)
+    op.create_index('idx_metrics_metric', 'server_metrics', ['metric'], unique=False)
+    op.create_index(op.f('ix_server_metrics_id'), 'server_metrics', ['id'], unique=False)
+    op.create_index(op.f('ix_server_metrics_vm'), 'server_metrics', ['vm'], unique=False)
+    op.create_index(op.f('ix_server_metrics_date'), 'server_metrics', ['date'], unique=False)
+    op.create_index(op.f('ix_server_metrics_metric'), 'server_metrics', ['metric'], unique=False)
+
+
+def _create_vm_metrics(**kw):
+    op.create_table(
+        'vm_metrics',
+        *_vm_metrics_columns(),
+        sa.PrimaryKeyConstraint('id', 'timestamp', name='vm_metrics_pkey'),
+        **kw
+    )
+    op.create_index('idx_vm_metrics_vm_timestamp', 'vm_metrics', ['vm_name', 'timestamp'], unique=False)
+    op.create_index('idx_vm_metrics_vcenter_timestamp', 'vm_metrics', ['vcenter', 'timestamp'], unique=False)
+    op.create_index(op.f('ix_vm_metrics_vm_name'), 'vm_metrics', ['vm_name'], unique=False)
+    op.create_index(op.f('ix_vm_metrics_vcenter'), 'vm_metrics', ['vcenter'], unique=False)
+    op.create_index(op.f('ix_vm_metrics_timestamp'), 'vm_metrics', ['timestamp'], unique=False)
+
+
+def _rename_away(table):
+    """Переименование старой таблицы и ее индексов/ограничений, чтобы освободить имена"""
+    bind = op.get_bind()
+    old = f'{table}_unpartitioned'
+    op.rename_table(table, old)
+
+    # Переименование ограничения переименовывает и его индекс, поэтому сначала ограничения
+    constraints = bind.execute(sa.text("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = CAST(:t AS regclass) AND contype IN ('p', 'u', 'x')
+    """), {'t': old}).scalars().all()
+    for name in constraints:
+        op.execute(f'ALTER TABLE {old} RENAME CONSTRAINT {name} TO {name}_old')
+
+    indexes = bind.execute(sa.text("""
+        SELECT ic.relname FROM pg_index i
+        JOIN pg_class ic ON ic.oid = i.indexrelid
+        LEFT JOIN pg_constraint c ON c.conindid = i.indexrelid
+        WHERE i.indrelid = CAST(:t AS regclass) AND c.oid IS NULL
+    """), {'t': old}).scalars().all()
+    for name in indexes:
+        op.execute(f'ALTER INDEX {name} RENAME TO {name}_old')
+    return old
+
+
+def _create_partitions(table, column, source):
+    """Партиции за период существующих данных и на PARTITIONS_AHEAD_MONTHS вперед"""
+    bounds = op.get_bind().execute(sa.text(f'SELECT min({column}), max({column}) FROM {source}')).one()
+
+    months = set()
+    if bounds[0] is not None:
+        months.update(iter_months(bounds[0], bounds[1]))
+    current = month_start(date.today())
+    months.update(iter_months(current, add_months(current, PARTITIONS_AHEAD_MONTHS)))
+
+    for month in sorted(months):
+        op.execute(create_partition_sql(table, month))
+
+
+def upgrade() -> None:
+    # server_metrics: перенос в партиционированную таблицу
+    old = _rename_away('server_metrics')
+    _create_server_metrics(postgresql_partition_by='RANGE (date)')
+    _create_partitions('server_metrics', 'date', old)
+    op.execute(f'INSERT INTO server_metrics ({SERVER_METRICS_COLUMNS}) SELECT {SERVER_METRICS_COLUMNS} FROM {old}')
+    op.drop_table(old)
+
+    # vm_metrics: таблица могла быть создана через create_all, но не миграцией
+    if sa.inspect(op.get_bind()).has_table('vm_metrics'):
+        old = _rename_away('vm_metrics')
+        _create_vm_metrics(postgresql_partition_by='RANGE (timestamp)')
+        _create_partitions('vm_metrics', 'timestamp', old)
+        op.execute(f'INSERT INTO vm_metrics ({VM_METRICS_COLUMNS}) SELECT {VM_METRICS_COLUMNS} FROM {old}')
+        op.drop_table(old)
+    else:
+        _create_vm_metrics(postgresql_partition_by='RANGE (timestamp)')
+        current = month_start(date.today())
+        for month in iter_months(current, add_months(current, PARTITIONS_AHEAD_MONTHS)):
+            op.execute(create_partition_sql('vm_metrics', month))
+
+
+def downgrade() -> None:
+    # Обратный перенос в обычные таблицы
+    for table, columns, create in (
+            ('server_metrics', SERVER_METRICS_COLUMNS, _create_server_metrics),
+            ('vm_metrics', VM_METRICS_COLUMNS, _create_vm_metrics),
+    ):
+        old = _rename_away(table)
+        create()
+        op.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {old}')
+        op.drop_table(old)  # Партиции удаляются вместе с родительской таблицей
@@ -0,0 +1,58 @@
+"""Drop redundant server_metrics indexes, add covering index for dashboard queries
+
+Revision ID: 004_rationalise_indexes
+Revises: 003_partition_by_month
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '004_rationalise_indexes'
+down_revision = '003_partition_by_month'
+branch_labels = None
+depends_on = None
+
+# Индексы, дублирующие uq_vm_date_metric, первичный ключ или друг друга
+REDUNDANT_SERVER_METRICS_INDEXES = [
+    'idx_metrics_vm_date',       # = uq_vm_date_metric (vm, date, metric)
+    'idx_metrics_metric',        # префикс покрывающего (metric, date)
+    'ix_server_metrics_id',      # префикс первичного ключа (id, date)
+    'ix_server_metrics_vm',      # префикс uq_vm_date_metric
+    'ix_server_metrics_date',    # = idx_metrics_date
+    'ix_server_metrics_metric',  # префикс покрывающего (metric, date)
+]
+
+# Префиксы составных индексов idx_vm_metrics_*_timestamp
+REDUNDANT_VM_METRICS_INDEXES = [
+    'ix_vm_metrics_vm_name',
+    'ix_vm_metrics_vcenter',
+]
+
+
+def upgrade() -> None:
+    # Drop redundant indexes (IF EXISTS: часть БД создана через create_all)
+    for name in REDUNDANT_SERVER_METRICS_INDEXES + REDUNDANT_VM_METRICS_INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
+
+    # Create covering index for charts filtered by metric and date range
+    op.create_index(
+        'idx_metrics_metric_date_cover',
+        'server_metrics',
+        ['metric', 'date'],
+        unique=False,
+        postgresql_include=['vm', 'avg_value']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_metrics_metric_date_cover', table_name='server_metrics')
+
+    op.create_index('idx_metrics_vm_date', 'server_metrics', ['vm', 'date', 'metric'], unique=False)
+    op.create_index('idx_metrics_metric', 'server_metrics', ['metric'], unique=False)
+    op.create_index(op.f('ix_server_metrics_id'), 'server_metrics', ['id'], unique=False)
+    op.create_index(op.f('ix_server_metrics_vm'), 'server_metrics', ['vm'], unique=False)
+    op.create_index(op.f('ix_server_metrics_date'), 'server_metrics', ['date'], unique=False)
+    op.create_index(op.f('ix_server_metrics_metric'), 'server_metrics', ['metric'], unique=False)
+    op.create_index(op.f('ix_vm_metrics_vm_name'), 'vm_metrics', ['vm_name'], unique=False)
+    op.create_index(op.f('ix_vm_metrics_vcenter'), 'vm_metrics', ['vcenter'], unique=False)
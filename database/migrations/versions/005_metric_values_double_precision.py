@@ -0,0 +1,45 @@
+"""Store metric values as double precision instead of DECIMAL
+
+Revision ID: 005_values_double_precision
+Revises: 004_rationalise_indexes
+Create Date: 2026-10-16 15:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '005_values_double_precision'
+down_revision = '004_rationalise_indexes'
+branch_labels = None
+depends_on = None
+
+# Таблица -> (колонки значений, тип до миграции)
+VALUE_COLUMNS = {
+    'server_metrics': (['max_value', 'min_value', 'avg_value'], 'DECIMAL(10, 5)'),
+    'vm_metrics': (
+        [
+            'cpu_usage_average', 'cpu_ready_summation', 'cpu_usagemhz_average',
+            'mem_usage_average', 'mem_consumed_average', 'mem_vmmemctl_average',
+            'disk_usage_average', 'disk_maxtotallatency_latest', 'net_usage_average',
+        ],
+        'DECIMAL(20, 5)'
+    ),
+}
+
+
+def _alter_types(table, columns, type_sql):
+    """Смена типа всех колонок одной командой: таблица переписывается один раз, а не на каждую колонку"""
+    clauses = ', '.join(f'ALTER COLUMN {column} TYPE {type_sql}' for column in columns)
+    op.execute(f'ALTER TABLE {table} {clauses}')
+
+
+def upgrade() -> None:
+    # ALTER на партиционированной таблице применяется ко всем партициям,
+    # индекс с INCLUDE (avg_value) перестраивается автоматически
+    for table, (columns, _) in VALUE_COLUMNS.items():
+        _alter_types(table, columns, 'DOUBLE PRECISION')
+
+
+def downgrade() -> None:
+    for table, (columns, old_type) in VALUE_COLUMNS.items():
+        _alter_types(table, columns, old_type)
@@ -0,0 +1,134 @@
+"""Dictionary-encode vm and metric with vms/metrics lookup tables
+
+Revision ID: 006_vm_metric_dimensions
+Revises: 005_values_double_precision
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006_vm_metric_dimensions'
+down_revision = '005_values_double_precision'
+branch_labels = None
+depends_on = None
+
+ROLLUP_FILL_SQL = """
+    INSERT INTO server_metrics_daily ({vm}, day, {metric}, max_value, min_value, avg_value, samples)
+    SELECT {vm}, date(date), {metric}, max(max_value), min(min_value), avg(avg_value), count(*)
+    FROM server_metrics
+    GROUP BY {vm}, date(date), {metric}
+"""
+
+
+def _create_daily(vm_column, metric_column):
+    """Дневной агрегат пересоздается и пересчитывается: это производные данные"""
+    op.drop_table('server_metrics_daily')
+
+    if vm_column == 'vm_id':
+        key_columns = [
+            sa.Column('vm_id', sa.Integer(), sa.ForeignKey('vms.id'), primary_key=True, nullable=False),
+            sa.Column('day', sa.Date(), primary_key=True, nullable=False),
+            sa.Column('metric_id', sa.Integer(), sa.ForeignKey('metrics.id'), primary_key=True, nullable=False),
+        ]
+    else:
+        key_columns = [
+            sa.Column('vm', sa.String(length=255), primary_key=True, nullable=False),
+            sa.Column('day', sa.Date(), primary_key=True, nullable=False),
+            sa.Column('metric', sa.String(length=100), primary_key=True, nullable=False),
+        ]
+
+    op.create_table(
+        'server_metrics_daily',
+        *key_columns,
+        sa.Column('max_value', sa.Float(), nullable=True),
+        sa.Column('min_value', sa.Float(), nullable=True),
+        sa.Column('avg_value', sa.Float(), nullable=True),
+        sa.Column('samples', sa.Integer(), nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.create_index('idx_metrics_daily_metric_day', 'server_metrics_daily', [metric_column, 'day'], unique=False)
+    op.execute(ROLLUP_FILL_SQL.format(vm=vm_column, metric=metric_column))
+
+
+def upgrade() -> None:
+    # Create lookup tables
+    op.create_table(
+        'vms',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    op.create_table(
+        'metrics',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+
+    # Fill lookup tables from existing data (id по алфавиту)
+    op.execute("INSERT INTO vms (name) SELECT DISTINCT vm FROM server_metrics ORDER BY vm")
+    op.execute("INSERT INTO metrics (name) SELECT DISTINCT metric FROM server_metrics ORDER BY metric")
+
+    # Replace names with ids; таблица переписывается одной командой UPDATE
+    op.add_column('server_metrics', sa.Column('vm_id', sa.Integer(), nullable=True))
+    op.add_column('server_metrics', sa.Column('metric_id', sa.Integer(), nullable=True))
+    op.execute("""
+        UPDATE server_metrics sm
+        SET vm_id = v.id, metric_id = m.id
+        FROM vms v, metrics m
+        WHERE v.name = sm.vm AND m.name = sm.metric
+    """)
+    op.alter_column('server_metrics', 'vm_id', nullable=False)
+    op.alter_column('server_metrics', 'metric_id', nullable=False)
+
+    # Индексы и ограничение на строковых колонках удаляются вместе с колонками
+    op.drop_column('server_metrics', 'vm')
+    op.drop_column('server_metrics', 'metric')
+
+    op.create_unique_constraint('uq_vm_date_metric', 'server_metrics', ['vm_id', 'date', 'metric_id'])
+    op.create_index(
+        'idx_metrics_metric_date_cover',
+        'server_metrics',
+        ['metric_id', 'date'],
+        unique=False,
+        postgresql_include=['vm_id', 'avg_value']
+    )
+    op.create_foreign_key('fk_server_metrics_vm_id', 'server_metrics', 'vms', ['vm_id'], ['id'])
+    op.create_foreign_key('fk_server_metrics_metric_id', 'server_metrics', 'metrics', ['metric_id'], ['id'])
+
+    _create_daily('vm_id', 'metric_id')
+
+
+def downgrade() -> None:
+    op.add_column('server_metrics', sa.Column('vm', sa.String(length=255), nullable=True))
+    op.add_column('server_metrics', sa.Column('metric', sa.String(length=100), nullable=True))
+    op.execute("""
+        UPDATE server_metrics sm
+        SET vm = v.name, metric = m.name
+        FROM vms v, metrics m
+        WHERE v.id = sm.vm_id AND m.id = sm.metric_id
+    """)
+    op.alter_column('server_metrics', 'vm', nullable=False)
+    op.alter_column('server_metrics', 'metric', nullable=False)
+
+    # Ограничения, индексы и внешние ключи на id удаляются вместе с колонками
+    op.drop_column('server_metrics', 'vm_id')
+    op.drop_column('server_metrics', 'metric_id')
+
+    op.create_unique_constraint('uq_vm_date_metric', 'server_metrics', ['vm', 'date', 'metric'])
+    op.create_index(
+        'idx_metrics_metric_date_cover',
+        'server_metrics',
+        ['metric', 'date'],
+        unique=False,
+        postgresql_include=['vm', 'avg_value']
+    )
+
+    _create_daily('vm', 'metric')
+
+    op.drop_table('metrics')
+    op.drop_table('vms')
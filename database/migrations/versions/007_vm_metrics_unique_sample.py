@@ -0,0 +1,38 @@
+"""Unique (vm_name, vcenter, timestamp) on vm_metrics for idempotent vCenter loads
+
+Revision ID: 007_vm_metrics_unique_sample
+Revises: 006_vm_metric_dimensions
+Create Date: 2026-10-16 17:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '007_vm_metrics_unique_sample'
+down_revision = '006_vm_metric_dimensions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Remove duplicate samples left by earlier loads (остается строка с наименьшим id)
+    op.execute("""
+        DELETE FROM vm_metrics t
+        USING vm_metrics d
+        WHERE t.vm_name = d.vm_name
+          AND t.vcenter = d.vcenter
+          AND t.timestamp = d.timestamp
+          AND t.id::text > d.id::text
+    """)
+
+    # Уникальный индекс (vm_name, vcenter, timestamp) заменяет idx_vm_metrics_vm_timestamp:
+    # сервер принадлежит одному vCenter, поэтому поиск по VM и периоду использует его же
+    op.create_unique_constraint(
+        'uq_vm_metrics_vm_vcenter_timestamp', 'vm_metrics', ['vm_name', 'vcenter', 'timestamp']
+    )
+    op.drop_index('idx_vm_metrics_vm_timestamp', table_name='vm_metrics')
+
+
+def downgrade() -> None:
+    op.create_index('idx_vm_metrics_vm_timestamp', 'vm_metrics', ['vm_name', 'timestamp'], unique=False)
+    op.drop_constraint('uq_vm_metrics_vm_vcenter_timestamp', 'vm_metrics', type_='unique')
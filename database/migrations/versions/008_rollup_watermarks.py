@@ -0,0 +1,31 @@
+"""Add rollup_watermarks for incremental vm_metrics -> server_metrics rollup
+
+Revision ID: 008_rollup_watermarks
+Revises: 007_vm_metrics_unique_sample
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008_rollup_watermarks'
+down_revision = '007_vm_metrics_unique_sample'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create rollup_watermarks table
+    op.create_table(
+        'rollup_watermarks',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('last_timestamp', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade() -> None:
+    # Drop table
+    op.drop_table('rollup_watermarks')
@@ -0,0 +1,44 @@
+"""Add import_batches for idempotent, resumable ingest
+
+Revision ID: 009_import_batches
+Revises: 008_rollup_watermarks
+Create Date: 2026-10-16 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009_import_batches'
+down_revision = '008_rollup_watermarks'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create import_batches table
+    op.create_table(
+        'import_batches',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('source', sa.String(length=1024), nullable=False),
+        sa.Column('source_type', sa.String(length=50), nullable=False),
+        sa.Column('source_hash', sa.String(length=64), nullable=False),
+        sa.Column('target', sa.String(length=100), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('bytes_total', sa.BigInteger(), nullable=True),
+        sa.Column('bytes_committed', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('rows_read', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('rows_loaded', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('rows_rejected', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('duration_seconds', sa.Float(), server_default='0', nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source_hash', 'target', name='uq_import_batches_source_target'),
+    )
+
+
+def downgrade() -> None:
+    # Drop table
+    op.drop_table('import_batches')
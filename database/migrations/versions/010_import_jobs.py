@@ -0,0 +1,48 @@
+"""Add import_jobs for background imports from the UI
+
+Revision ID: 010_import_jobs
+Revises: 009_import_batches
+Create Date: 2026-10-16 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '010_import_jobs'
+down_revision = '009_import_batches'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create import_jobs table
+    op.create_table(
+        'import_jobs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('filename', sa.String(length=1024), nullable=False),
+        sa.Column('source_type', sa.String(length=50), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('batch_id', sa.Integer(), nullable=True),
+        sa.Column('rows_total', sa.BigInteger(), nullable=True),
+        sa.Column('rows_done', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('rows_loaded', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('rows_rejected', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('rows_per_sec', sa.Float(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_by', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['batch_id'], ['import_batches.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_import_jobs_status'), 'import_jobs', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    # Drop table
+    op.drop_index(op.f('ix_import_jobs_status'), table_name='import_jobs')
+    op.drop_table('import_jobs')
@@ -0,0 +1,31 @@
+"""Add data_versions counters for writes outside import_batches
+
+Revision ID: 011_data_versions
+Revises: 010_import_jobs
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011_data_versions'
+down_revision = '010_import_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create data_versions table
+    op.create_table(
+        'data_versions',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade() -> None:
+    # Drop table
+    op.drop_table('data_versions')
@@ -1,10 +1,37 @@
-from database.connection import Base, engine
-from sqlalchemy import Column, DateTime, DECIMAL, String, UniqueConstraint, Index
+from database.connection import Base
+from sqlalchemy import BigInteger, Column, Date, DateTime, Float, ForeignKey, Integer, String, Text, UniqueConstraint, Index
+from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 import uuid
 
 
+class Vm(Base):
+    """
+    Справочник серверов: таблицы метрик хранят только vm_id
+    """
+    __tablename__ = "vms"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(255), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f"<Vm(id={self.id}, name='{self.name}')>"
+
+
+class Metric(Base):
+    """
+    Справочник названий метрик: таблицы метрик хранят только metric_id
+    """
+    __tablename__ = "metrics"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(100), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f"<Metric(id={self.id}, name='{self.name}')>"
+
+
 class ServerMetrics(Base):
     """
     Модель для хранения метрик серверов
@@ -12,24 +39,147 @@ class ServerMetrics(Base):
     """
     __tablename__ = "server_metrics"
 
+    # Таблица партиционирована помесячно по date (см. database/partitions.py),
+    # поэтому ключ партиционирования входит в первичный ключ
+    # uq_vm_date_metric обслуживает поиск по vm; покрывающий индекс - графики по метрике и периоду
     __table_args__ = (
-        UniqueConstraint('vm', 'date', 'metric', name='uq_vm_date_metric'),
-        Index('idx_metrics_vm_date', 'vm', 'date', 'metric'),
+        UniqueConstraint('vm_id', 'date', 'metric_id', name='uq_vm_date_metric'),
         Index('idx_metrics_date', 'date'),
-        Index('idx_metrics_metric', 'metric'),
+        Index('idx_metrics_metric_date_cover', 'metric_id', 'date', postgresql_include=['vm_id', 'avg_value']),
+        {'postgresql_partition_by': 'RANGE (date)'},
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    vm_id = Column(Integer, ForeignKey('vms.id'), nullable=False)
+    date = Column(DateTime(timezone=True), primary_key=True, nullable=False)
+    metric_id = Column(Integer, ForeignKey('metrics.id'), nullable=False)
+    max_value = Column(Float, nullable=True)
+    min_value = Column(Float, nullable=True)
+    avg_value = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    vm = relationship(Vm)
+    metric = relationship(Metric)
+
+    def __repr__(self):
+        return (f"<ServerMetrics(vm_id={self.vm_id}, date='{self.date}', metric_id={self.metric_id}, "
+                f"avg_value={self.avg_value})>")
+
+
+class ServerMetricsDaily(Base):
+    """
+    Дневной агрегат метрик серверов (VM × день × метрика)
+    Поддерживается загрузчиками через MetricsRepository.refresh_daily_rollup
+    """
+    __tablename__ = "server_metrics_daily"
+
+    __table_args__ = (
+        Index('idx_metrics_daily_metric_day', 'metric_id', 'day'),
+    )
+
+    vm_id = Column(Integer, ForeignKey('vms.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    metric_id = Column(Integer, ForeignKey('metrics.id'), primary_key=True)
+    max_value = Column(Float, nullable=True)
+    min_value = Column(Float, nullable=True)
+    avg_value = Column(Float, nullable=True)
+    samples = Column(Integer, nullable=False)
+    refreshed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return (f"<ServerMetricsDaily(vm_id={self.vm_id}, day='{self.day}', metric_id={self.metric_id}, "
+                f"avg_value={self.avg_value})>")
+
+
+class RollupWatermark(Base):
+    """
+    Отметка (high-water mark) инкрементальных агрегатов: до какого значения исходные данные уже обработаны
+    """
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String(100), primary_key=True)
+    last_timestamp = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<RollupWatermark(name='{self.name}', last_timestamp='{self.last_timestamp}')>"
+
+
+class DataVersion(Base):
+    """
+    Счетчик записей в таблицы метрик вне import_batches (репозиторий, удаление по сроку хранения)
+
+    Увеличивается в той же транзакции, что и запись: по нему кэши дашборда видят изменение данных
+    """
+    __tablename__ = "data_versions"
+
+    name = Column(String(100), primary_key=True)
+    version = Column(BigInteger, server_default='0', nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<DataVersion(name='{self.name}', version={self.version})>"
+
+
+class ImportBatch(Base):
+    """
+    Журнал загрузок: один исходный файл (по хэшу содержимого) в одну таблицу
+    Загрузчики фиксируют смещение после каждой закоммиченной порции (см. database/import_batches.py),
+    поэтому уже загруженный файл пропускается, а прерванная загрузка продолжается с места остановки
+    """
+    __tablename__ = "import_batches"
+
+    __table_args__ = (
+        UniqueConstraint('source_hash', 'target', name='uq_import_batches_source_target'),
     )
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    vm = Column(String(255), nullable=False, index=True)
-    date = Column(DateTime(timezone=True), nullable=False, index=True)
-    metric = Column(String(100), nullable=False, index=True)
-    max_value = Column(DECIMAL(20, 5), nullable=True)
-    min_value = Column(DECIMAL(20, 5), nullable=True)
-    avg_value = Column(DECIMAL(20, 5), nullable=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source = Column(String(1024), nullable=False)  # Путь к файлу или описание источника
+    source_type = Column(String(50), nullable=False)  # excel, csv, vcenter, dataframe
+    source_hash = Column(String(64), nullable=False)  # SHA-256 содержимого
+    target = Column(String(100), nullable=False)  # server_metrics, vm_metrics
+    status = Column(String(20), nullable=False)  # running, completed, failed
+    bytes_total = Column(BigInteger, nullable=True)
+    bytes_committed = Column(BigInteger, nullable=False, server_default='0')  # Смещение после последней порции
+    rows_read = Column(BigInteger, nullable=False, server_default='0')  # Строк источника в закоммиченных порциях
+    rows_loaded = Column(BigInteger, nullable=False, server_default='0')  # Добавлено или обновлено строк
+    rows_rejected = Column(BigInteger, nullable=False, server_default='0')
+    duration_seconds = Column(Float, nullable=False, server_default='0')
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<ImportBatch(id={self.id}, source='{self.source}', target='{self.target}', status='{self.status}')>"
+
+
+class ImportJob(Base):
+    """
+    Фоновая загрузка файла из интерфейса (см. database/import_jobs.py)
+    Рабочий поток обновляет прогресс после каждой закоммиченной порции, интерфейс опрашивает статус
+    """
+    __tablename__ = "import_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    filename = Column(String(1024), nullable=False)
+    source_type = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, index=True)  # queued, running, completed, skipped, failed
+    batch_id = Column(Integer, ForeignKey('import_batches.id', ondelete='SET NULL'), nullable=True)
+    rows_total = Column(BigInteger, nullable=True)
+    rows_done = Column(BigInteger, nullable=False, server_default='0')
+    rows_loaded = Column(BigInteger, nullable=False, server_default='0')
+    rows_rejected = Column(BigInteger, nullable=False, server_default='0')
+    rows_per_sec = Column(Float, nullable=True)
+    error = Column(Text, nullable=True)
+    created_by = Column(String(255), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
     def __repr__(self):
-        return f"<ServerMetrics(vm='{self.vm}', date='{self.date}', metric='{self.metric}', avg_value={self.avg_value})>"
+        return f"<ImportJob(id={self.id}, filename='{self.filename}', status='{self.status}')>"
 
 
 class VMMetrics(Base):
@@ -39,26 +189,26 @@ class VMMetrics(Base):
     __tablename__ = "vm_metrics"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    vm_name = Column(String(255), nullable=False, index=True)
-    vcenter = Column(String(100), nullable=False, index=True)
-    timestamp = Column(DateTime(timezone=True), nullable=False, index=True)
+    vm_name = Column(String(255), nullable=False)
+    vcenter = Column(String(100), nullable=False)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, nullable=False, index=True)
 
     # CPU метрики
-    cpu_usage_average = Column(DECIMAL(20, 5), nullable=True)  # cpu.usage.average, %
-    cpu_ready_summation = Column(DECIMAL(20, 5), nullable=True)  # cpu.ready.summation, milliseconds
-    cpu_usagemhz_average = Column(DECIMAL(20, 5), nullable=True)  # cpu.usagemhz.average, MHz
+    cpu_usage_average = Column(Float, nullable=True)  # cpu.usage.average, %
+    cpu_ready_summation = Column(Float, nullable=True)  # cpu.ready.summation, milliseconds
+    cpu_usagemhz_average = Column(Float, nullable=True)  # cpu.usagemhz.average, MHz
 
     # Memory метрики
-    mem_usage_average = Column(DECIMAL(20, 5), nullable=True)  # mem.usage.average, %
-    mem_consumed_average = Column(DECIMAL(20, 5), nullable=True)  # mem.consumed.average, Kbs
-    mem_vmmemctl_average = Column(DECIMAL(20, 5), nullable=True)  # mem.vmmemctl.average, Kbs
+    mem_usage_average = Column(Float, nullable=True)  # mem.usage.average, %
+    mem_consumed_average = Column(Float, nullable=True)  # mem.consumed.average, Kbs
+    mem_vmmemctl_average = Column(Float, nullable=True)  # mem.vmmemctl.average, Kbs
 
     # Disk метрики
-    disk_usage_average = Column(DECIMAL(20, 5), nullable=True)  # disk.usage.average, Kbps
-    disk_maxtotallatency_latest = Column(DECIMAL(20, 5), nullable=True)  # disk.maxtotallatency.latest, milliseconds
+    disk_usage_average = Column(Float, nullable=True)  # disk.usage.average, Kbps
+    disk_maxtotallatency_latest = Column(Float, nullable=True)  # disk.maxtotallatency.latest, milliseconds
 
     # Network метрики
-    net_usage_average = Column(DECIMAL(20, 5), nullable=True)  # net.usage.average, Kbps
+    net_usage_average = Column(Float, nullable=True)  # net.usage.average, Kbps
 
     # Метаданные
     # is_anomaly = Column(Boolean, default=False, index=True)
@@ -67,10 +217,10 @@ class VMMetrics(Base):
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Партиционирование помесячно по timestamp
+    # uq_vm_metrics_vm_vcenter_timestamp отсекает повторную загрузку выгрузок и обслуживает поиск по VM
     __table_args__ = (
-        Index('idx_vm_metrics_vm_timestamp', 'vm_name', 'timestamp'),
+        UniqueConstraint('vm_name', 'vcenter', 'timestamp', name='uq_vm_metrics_vm_vcenter_timestamp'),
         Index('idx_vm_metrics_vcenter_timestamp', 'vcenter', 'timestamp'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
     )
-
-
-Base.metadata.create_all(engine)
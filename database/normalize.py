@@ -0,0 +1,119 @@
+"""
+Общая проверка и нормализация метрик перед загрузкой в server_metrics
+Используется загрузчиками (database/ingest.py, MetricsRepository.insert_from_dataframe
+и _bulk_upsert_dataframe, init_database, db_import): схема проверяется один раз,
+типы приводятся целыми колонками, а строки с ошибками отделяются булевыми масками с причиной по каждой колонке.
+Имена серверов и метрик разбираются через pd.factorize, поэтому проверки строк
+выполняются по уникальным значениям, а не по каждой строке. id строк генерирует БД
+"""
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+KEY_COLUMNS = ['vm', 'date', 'metric']
+VALUE_COLUMNS = ['max_value', 'min_value', 'avg_value']
+METRIC_COLUMNS = KEY_COLUMNS + VALUE_COLUMNS
+
+# Минимальный набор колонок: max_value/min_value могут отсутствовать
+REQUIRED_COLUMNS = KEY_COLUMNS + ['avg_value']
+
+REJECT_REASON_COLUMN = 'reject_reason'
+
+
+def check_columns(columns: Iterable[str], required: List[str] = REQUIRED_COLUMNS) -> None:
+    """
+    Проверка наличия обязательных колонок
+
+    Raises:
+        ValueError: Если каких-то колонок нет
+    """
+    columns = set(columns)
+    missing = [col for col in required if col not in columns]
+    if missing:
+        raise ValueError(f"Отсутствуют обязательные колонки: {missing}")
+
+
+def normalize_metrics(df: pd.DataFrame, date_format: Optional[str] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Приведение типов и отделение некорректных строк
+
+    Args:
+        df: DataFrame с колонками vm, date, metric, avg_value и (необязательно) max_value, min_value
+        date_format: Формат date, если даты строками в известном формате (быстрее разбора по каждой строке)
+
+    Returns:
+        Кортеж (корректные строки с колонками METRIC_COLUMNS,
+        некорректные строки исходного DataFrame с колонкой reject_reason)
+    """
+    check_columns(df.columns)
+
+    vm, vm_blank = _clean_names(df['vm'])
+    metric, metric_blank = _clean_names(df['metric'])
+    date = _parse_dates(df['date'], date_format)
+
+    data = pd.DataFrame({'vm': vm, 'date': date, 'metric': metric}, index=df.index)
+    masks = {
+        'vm is empty': vm_blank,
+        'metric is empty': metric_blank,
+        'invalid date': data['date'].isna().to_numpy(),
+    }
+    for col in VALUE_COLUMNS:
+        if col not in df.columns:
+            data[col] = np.nan
+            continue
+        data[col] = pd.to_numeric(df[col], errors='coerce')
+        masks[f'{col} is not numeric'] = (data[col].isna() & df[col].notna()).to_numpy()
+
+    rejected = np.logical_or.reduce(list(masks.values()))
+    if not rejected.any():
+        return data, df.iloc[0:0].assign(**{REJECT_REASON_COLUMN: pd.Series(dtype=object)})
+
+    # Текст причины собирается только для отклоненных строк
+    reasons = np.full(int(rejected.sum()), '', dtype=object)
+    for reason, mask in masks.items():
+        hit = mask[rejected]
+        reasons[hit] = reasons[hit] + f'{reason}; '
+    rejects = df[rejected].assign(**{REJECT_REASON_COLUMN: pd.Series(reasons, dtype=object).str.rstrip('; ').to_numpy()})
+
+    return data[~rejected], rejects
+
+
+def reject_counts(rejects: pd.DataFrame) -> Dict[str, int]:
+    """Количество отклоненных строк по каждой причине (строка может иметь несколько причин)"""
+    counts = Counter()
+    for reasons, count in rejects[REJECT_REASON_COLUMN].value_counts().items():
+        for reason in reasons.split('; '):
+            counts[reason] += int(count)
+    return dict(counts)
+
+
+def _parse_dates(values: pd.Series, date_format: Optional[str] = None) -> np.ndarray:
+    """
+    Разбор дат по уникальным значениям: в выгрузке одна дата повторяется у всех серверов и метрик
+
+    Без date_format каждое значение разбирается отдельно ('mixed'): иначе pandas выводит формат
+    по первому значению и превращает в NaT даты другого вида ('2025-01-02' после '2025-01-01 10:00')
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy()
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_datetime(pd.Index(uniques, dtype=object), format=date_format or 'mixed', errors='coerce')
+    return parsed.take(codes, allow_fill=True, fill_value=pd.NaT)
+
+
+def _clean_names(values: pd.Series) -> Tuple[pd.Categorical, np.ndarray]:
+    """
+    Имена без пробелов по краям в виде Categorical и маска пустых значений
+
+    Строки обрабатываются по уникальным значениям (pd.factorize), а не по каждой строке
+    """
+    codes, uniques = pd.factorize(values)
+    names = pd.Index(uniques).astype(str).str.strip()
+    # Код -1 (NaN) указывает на последний элемент таблиц перекодировки
+    blank = np.append(np.asarray(names == '', dtype=bool), True)[codes]
+
+    categories = names[names != ''].unique()
+    name_codes = np.append(categories.get_indexer(names), -1)
+    return pd.Categorical.from_codes(name_codes[codes], categories=categories), blank
@@ -0,0 +1,334 @@
+"""
+Параллельная загрузка нескольких выгрузок vCenter в vm_metrics
+Файлы разбираются в пуле процессов: каждый процесс читает свой файл и копирует его
+через собственное соединение в отдельную staging-таблицу. После того как все файлы
+загружены, координатор добавляет staging-таблицы в vm_metrics одной транзакцией
+(в порядке файлов, каждый под своей точкой сохранения) и один раз запускает агрегацию.
+Файлы, уже загруженные ранее (по хэшу содержимого в import_batches), пропускаются.
+
+Запуск:
+    python -m database.parallel_ingest exports/ --pattern "*.txt" --workers 4
+    python -m database.parallel_ingest "exports/2025-*.txt"
+
+Код возврата 1, если хотя бы один файл не загружен
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from base_logger import logger
+from database import import_batches
+from database.connection import get_engine
+from database.partitions import ensure_partitions
+from database.vcenter_ingest import (
+    DEFAULT_CHUNK_ROWS,
+    DROP_STAGE_SQL,
+    SHARED_STAGE,
+    merge_stage,
+    read_vcenter_chunks,
+    stage_chunks,
+)
+
+engine = get_engine('bulk')
+
+DEFAULT_PATTERN = '*.txt'
+
+
+def resolve_files(source: str, pattern: str = DEFAULT_PATTERN) -> List[Path]:
+    """
+    Список файлов для загрузки: все файлы каталога по маске или файлы по glob-шаблону
+
+    Args:
+        source: Каталог, файл или glob-шаблон
+        pattern: Маска файлов, если source - каталог
+
+    Returns:
+        Отсортированный список путей
+    """
+    path = Path(source)
+    if path.is_dir():
+        return sorted(item for item in path.glob(pattern) if item.is_file())
+    return sorted(Path(item) for item in glob.glob(source) if Path(item).is_file())
+
+
+def _init_worker() -> None:
+    """
+    Инициализация процесса пула: соединения, унаследованные от родителя, не используются
+    """
+    engine.dispose(close=False)
+
+
+def stage_file(file_path: str, stage: str, names_table: str, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Dict[str, Any]:
+    """
+    Загрузка одного файла в собственные staging-таблицы (выполняется в процессе пула)
+
+    Таблицы создаются в той же транзакции, что и COPY: при ошибке они исчезают при откате
+
+    Returns:
+        Словарь (staged, errors, first_timestamp, last_timestamp, seconds)
+    """
+    started = time.perf_counter()
+    conn = engine.raw_connection()
+    cursor = conn.cursor()
+    try:
+        result = stage_chunks(
+            cursor,
+            read_vcenter_chunks(file_path, chunk_rows=chunk_rows),
+            stage=stage,
+            names_table=names_table,
+            table_options=SHARED_STAGE,
+            source=file_path
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def ingest_files(
+        files: List[Path],
+        workers: Optional[int] = None,
+        chunk_rows: int = DEFAULT_CHUNK_ROWS,
+        rollup: bool = True,
+        force: bool = False,
+        reports: Optional[List[Dict[str, Any]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Параллельная загрузка файлов в staging-таблицы и слияние в vm_metrics
+
+    Args:
+        files: Файлы выгрузок vCenter
+        workers: Количество процессов. По умолчанию os.cpu_count()
+        chunk_rows: Количество строк в одной порции
+        rollup: После загрузки пересчитать дневные метрики server_metrics (database/rollup.py)
+        force: Загрузить заново файлы, уже загруженные ранее (import_batches)
+        reports: Список для отчетов по файлам; заполняется до начала загрузки,
+            поэтому отчеты доступны вызывающему коду, даже если загрузка прервана исключением
+
+    Returns:
+        Список отчетов по файлам (file, status, staged, success, duplicates, errors, seconds, message)
+    """
+    # database.rollup импортирует database.vcenter_ingest, как и в vcenter_ingest._load_block
+    from database import rollup as vm_rollup
+
+    run_id = uuid.uuid4().hex[:8]
+    reports = [] if reports is None else reports
+    reports.extend(
+        {
+            'file': str(file_path),
+            'stage': f'vm_metrics_stage_{run_id}_{number}',
+            'names_table': f'vm_metrics_stage_names_{run_id}_{number}',
+            'status': 'pending',
+            'staged': 0,
+            'success': 0,
+            'duplicates': 0,
+            'errors': 0,
+            'seconds': 0.0,
+            'message': '',
+        }
+        for number, file_path in enumerate(files)
+    )
+
+    try:
+        _ingest_reports(reports, workers, chunk_rows, rollup, force, vm_rollup)
+    finally:
+        for report in reports:
+            for key in ('stage', 'names_table', 'batch_id', 'first_timestamp', 'last_timestamp'):
+                report.pop(key, None)
+    return reports
+
+
+def _ingest_reports(reports: List[Dict[str, Any]], workers: Optional[int], chunk_rows: int, rollup: bool,
+                    force: bool, vm_rollup) -> None:
+    """Загрузка, слияние и пересчет по подготовленным отчетам (см. ingest_files)"""
+
+    # Соединение координатора держит advisory lock открытых записей import_batches до конца загрузки
+    conn = engine.raw_connection()
+    cursor = conn.cursor()
+    try:
+        _open_batches(conn, reports, force)
+        pending = [report for report in reports if report['status'] == 'pending']
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [
+                pool.submit(stage_file, report['file'], report['stage'], report['names_table'], chunk_rows)
+                for report in pending
+            ]
+            for report, future in zip(pending, futures):
+                try:
+                    staged = future.result()
+                except Exception as e:
+                    report.update(status='failed', message=str(e))
+                    logger.error(f"Ошибка загрузки выгрузки vCenter {report['file']}: {e}")
+                    continue
+                report.update(
+                    status='staged',
+                    staged=staged['staged'],
+                    errors=staged['errors'],
+                    seconds=staged['seconds'],
+                    first_timestamp=staged['first_timestamp'],
+                    last_timestamp=staged['last_timestamp'],
+                )
+
+        staged_reports = [report for report in pending if report['status'] == 'staged']
+        try:
+            _merge_staged(conn, cursor, staged_reports, vm_rollup)
+        finally:
+            for report in staged_reports:
+                cursor.execute(DROP_STAGE_SQL.format(stage=report['stage'], names=report['names_table']))
+            for report in pending:
+                if report['status'] == 'failed':
+                    import_batches.finish_batch(cursor, report['batch_id'], import_batches.STATUS_FAILED,
+                                                report['message'])
+            conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    if rollup and any(report['success'] for report in reports):
+        vm_rollup.rollup_vm_metrics()
+
+
+def _open_batches(conn, reports: List[Dict[str, Any]], force: bool) -> None:
+    """
+    Запись import_batches для каждого файла; уже загруженные файлы отмечаются как skipped
+    """
+    for report in reports:
+        try:
+            batch = import_batches.open_file_batch(conn, Path(report['file']), target='vm_metrics',
+                                                   source_type='vcenter', force=force)
+        except Exception as e:
+            report.update(status='failed', message=str(e))
+            logger.error(f"Ошибка загрузки выгрузки vCenter {report['file']}: {e}")
+            continue
+        if batch is None:
+            report['status'] = 'skipped'
+        else:
+            report['batch_id'] = batch['id']
+
+
+def _merge_staged(conn, cursor, reports: List[Dict[str, Any]], vm_rollup) -> None:
+    """
+    Слияние staging-таблиц в vm_metrics одной транзакцией, каждый файл под своей точкой сохранения
+    """
+    loaded = [report for report in reports if report['staged']]
+    if loaded:
+        # Партиции создаются отдельным соединением до слияния, как в database/ingest.py
+        with engine.begin() as ddl_conn:
+            ensure_partitions(
+                ddl_conn,
+                'vm_metrics',
+                min(report['first_timestamp'] for report in loaded),
+                max(report['last_timestamp'] for report in loaded)
+            )
+
+    first_inserted = None
+    try:
+        for report in reports:
+            if not report['staged'] and report['errors']:
+                # Все строки отклонены (например, timestamp в другом формате): файл не отмечается
+                # загруженным, иначе следующие запуски пропустят его без --force
+                report.update(status='failed', message=f"Все строки отклонены ({report['errors']})")
+                logger.error(f"Выгрузка vCenter {report['file']} не загружена: все {report['errors']} строк отклонены")
+                continue
+
+            started = time.perf_counter()
+            cursor.execute("SAVEPOINT merge_file")
+            try:
+                inserted = merge_stage(cursor, stage=report['stage'], names_table=report['names_table'])
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT merge_file")
+                report.update(status='failed', message=str(e))
+                logger.error(f"Ошибка слияния выгрузки vCenter {report['file']}: {e}")
+                continue
+            cursor.execute("RELEASE SAVEPOINT merge_file")
+
+            report.update(
+                status='ok',
+                success=inserted,
+                duplicates=report['staged'] - inserted,
+                seconds=round(report['seconds'] + time.perf_counter() - started, 3),
+            )
+            # Файл сливается целиком, поэтому контрольная точка одна - конец файла
+            import_batches.checkpoint(
+                cursor, report['batch_id'], report, report['seconds'],
+                bytes_committed=Path(report['file']).stat().st_size
+            )
+            import_batches.finish_batch(cursor, report['batch_id'], import_batches.STATUS_COMPLETED)
+            if inserted and (first_inserted is None or report['first_timestamp'] < first_inserted):
+                first_inserted = report['first_timestamp']
+
+        if first_inserted is not None:
+            # Сэмплы старше отметки агрегации будут учтены следующим запуском
+            vm_rollup.rewind_watermark(cursor, first_inserted.to_pydatetime())
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        for report in reports:
+            report.update(status='failed', success=0, duplicates=0, message=str(e))
+        raise
+
+
+def format_report(reports: List[Dict[str, Any]]) -> str:
+    """Таблица отчета по файлам для вывода в консоль"""
+    header = f"{'Файл':<40} {'Статус':<8} {'Строк':>10} {'Добавлено':>10} {'Дублей':>10} {'Ошибок':>8} {'Сек':>8}"
+    lines = [header, '-' * len(header)]
+    for report in reports:
+        lines.append(
+            f"{Path(report['file']).name:<40} {report['status']:<8} {report['staged']:>10} "
+            f"{report['success']:>10} {report['duplicates']:>10} {report['errors']:>8} {report['seconds']:>8.2f}"
+        )
+        if report['message']:
+            lines.append(f"    {report['message']}")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Параллельная загрузка выгрузок vCenter в vm_metrics")
+    parser.add_argument('source', help="Каталог с выгрузками или glob-шаблон")
+    parser.add_argument('--pattern', default=DEFAULT_PATTERN, help="Маска файлов в каталоге")
+    parser.add_argument('--workers', type=int, default=None, help="Количество процессов (по умолчанию по числу CPU)")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help="Строк в одной порции")
+    parser.add_argument('--no-rollup', action='store_true', help="Не пересчитывать server_metrics после загрузки")
+    parser.add_argument('--force', action='store_true', help="Загрузить заново уже загруженные файлы")
+    args = parser.parse_args(argv)
+
+    files = resolve_files(args.source, args.pattern)
+    if not files:
+        logger.error(f"Не найдено файлов для загрузки: {args.source}")
+        return 1
+
+    started = time.perf_counter()
+    workers = args.workers or min(len(files), os.cpu_count() or 1)
+    logger.info(f"Загрузка {len(files)} файлов в {workers} процессах")
+    reports = []
+    try:
+        ingest_files(files, workers=workers, chunk_rows=args.chunk_rows, rollup=not args.no_rollup,
+                     force=args.force, reports=reports)
+    except Exception as e:
+        logger.error(f"Загрузка выгрузок vCenter прервана: {e}", exc_info=True)
+        print(format_report(reports))
+        return 1
+
+    print(format_report(reports))
+    print(f"Всего: {sum(report['success'] for report in reports)} строк добавлено, "
+          f"{time.perf_counter() - started:.2f} с")
+
+    return 0 if all(report['status'] in ('ok', 'skipped') for report in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
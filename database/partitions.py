@@ -0,0 +1,215 @@
+"""
+Помесячное партиционирование таблиц метрик
+server_metrics партиционируется по date, vm_metrics - по timestamp (RANGE, одна партиция на месяц).
+Партиции создаются заранее при загрузке данных, а хранение ограничивается удалением целых партиций
+"""
+import os
+import re
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from base_logger import logger
+
+# Таблица -> колонка ключа партиционирования
+PARTITIONED_TABLES = {
+    'server_metrics': 'date',
+    'vm_metrics': 'timestamp',
+}
+
+# Сколько месяцев вперед от текущего создавать партиции
+PARTITIONS_AHEAD_MONTHS = int(os.getenv("PARTITIONS_AHEAD_MONTHS", "3"))
+
+_PARTITION_SUFFIX = re.compile(r'_p(\d{4})_(\d{2})$')
+
+# Кэш процесса: уже существующие партиции и признак партиционирования таблиц
+_known_partitions = set()
+_partitioned_tables: Dict[str, bool] = {}
+
+
+def month_start(value: Any) -> date:
+    """Первый день месяца для даты/времени"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    """Сдвиг первого дня месяца на указанное количество месяцев"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def iter_months(start: Any, end: Any) -> Iterator[date]:
+    """Первые дни всех месяцев от start до end включительно"""
+    month = month_start(start)
+    last = month_start(end)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    """Имя партиции таблицы за месяц, например server_metrics_p2025_01"""
+    return f"{table}_p{month:%Y_%m}"
+
+
+def create_partition_sql(table: str, month: date) -> str:
+    """SQL создания партиции таблицы за месяц"""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+    )
+
+
+def _dialect_name(conn) -> str:
+    """Имя диалекта для Connection или Session"""
+    dialect = getattr(conn, 'dialect', None) or conn.get_bind().dialect
+    return dialect.name
+
+
+def is_partitioned(conn, table: str) -> bool:
+    """
+    Проверка, является ли таблица партиционированной
+
+    Args:
+        conn: SQLAlchemy Connection или Session
+
+    Returns:
+        True для партиционированной таблицы PostgreSQL
+    """
+    if _dialect_name(conn) != 'postgresql':
+        return False
+
+    if table not in _partitioned_tables:
+        _partitioned_tables[table] = bool(conn.execute(text("""
+            SELECT EXISTS (
+                SELECT 1 FROM pg_partitioned_table pt
+                JOIN pg_class c ON c.oid = pt.partrelid
+                WHERE c.relname = :table
+            )
+        """), {'table': table}).scalar())
+
+    return _partitioned_tables[table]
+
+
+def _partition_months(start: Any, end: Optional[Any], ahead_months: int) -> List[date]:
+    """Месяцы периода загрузки и ahead_months месяцев вперед от текущего"""
+    months = set(iter_months(start, end or start))
+    if ahead_months:
+        current = month_start(date.today())
+        months.update(iter_months(current, add_months(current, ahead_months)))
+    return sorted(months)
+
+
+def ensure_partitions(
+        conn,
+        table: str,
+        start: Any,
+        end: Optional[Any] = None,
+        ahead_months: int = PARTITIONS_AHEAD_MONTHS,
+        remember: bool = True
+) -> List[str]:
+    """
+    Создание недостающих партиций за период загрузки и на ahead_months вперед
+
+    Для непартиционированной таблицы ничего не делает.
+
+    Args:
+        conn: SQLAlchemy Connection или Session
+        table: Имя таблицы из PARTITIONED_TABLES
+        start: Первая дата загружаемых данных
+        end: Последняя дата загружаемых данных (по умолчанию равна start)
+        ahead_months: Количество месяцев вперед от текущего
+        remember: Сразу запомнить партиции в кэше процесса. False для транзакции,
+            которая еще может откатиться: после коммита вызывается remember_partitions
+
+    Returns:
+        Список имен созданных (или проверенных впервые) партиций
+    """
+    if not is_partitioned(conn, table):
+        return []
+
+    created = []
+    for month in _partition_months(start, end, ahead_months):
+        if (table, month) in _known_partitions:
+            continue
+        conn.execute(text(create_partition_sql(table, month)))
+        if remember:
+            _known_partitions.add((table, month))
+        created.append(partition_name(table, month))
+
+    if created:
+        logger.info(f"Проверены партиции {table}: {', '.join(created)}")
+    return created
+
+
+def remember_partitions(
+        table: str,
+        start: Any,
+        end: Optional[Any] = None,
+        ahead_months: int = PARTITIONS_AHEAD_MONTHS
+) -> None:
+    """
+    Запоминание партиций, созданных ensure_partitions(remember=False), после коммита транзакции
+
+    Аргументы те же, что у ensure_partitions. Откат транзакции отменяет и создание партиций,
+    поэтому до коммита они в кэш не попадают и при следующей записи создаются заново
+    """
+    _known_partitions.update((table, month) for month in _partition_months(start, end, ahead_months))
+
+
+def list_partitions(conn, table: str) -> List[Tuple[str, date]]:
+    """
+    Список помесячных партиций таблицы
+
+    Returns:
+        Список (имя партиции, первый день месяца), отсортированный по месяцу
+    """
+    rows = conn.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname = :table
+    """), {'table': table}).all()
+
+    partitions = []
+    for (name,) in rows:
+        match = _PARTITION_SUFFIX.search(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def drop_partitions_before(conn, table: str, cutoff: date, detach: bool = False) -> Dict[str, Any]:
+    """
+    Удаление (или отсоединение) партиций, целиком лежащих раньше cutoff
+
+    Args:
+        conn: SQLAlchemy Connection или Session
+        table: Имя партиционированной таблицы
+        cutoff: Граница хранения: удаляются месяцы, закончившиеся до этой даты
+        detach: Только отсоединить партиции (для архивации), не удаляя данные
+
+    Returns:
+        Словарь с именами обработанных партиций и количеством строк в них
+    """
+    result = {'partitions': [], 'rows': 0}
+
+    for name, month in list_partitions(conn, table):
+        if add_months(month, 1) > cutoff:
+            continue
+
+        result['rows'] += conn.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        if not detach:
+            conn.execute(text(f"DROP TABLE {name}"))
+        _known_partitions.discard((table, month))
+        result['partitions'].append(name)
+
+    if result['partitions']:
+        action = 'Отсоединены' if detach else 'Удалены'
+        logger.info(f"{action} партиции {table}: {', '.join(result['partitions'])} ({result['rows']} строк)")
+    return result
@@ -2,32 +2,71 @@
 Репозиторий для работы с метриками серверов в базе данных
 Использует SQLAlchemy для единообразной работы с БД
 """
+import numpy as np
 import pandas as pd
-from datetime import datetime, date
-from typing import Optional, List, Dict, Any
+from datetime import datetime, date, timedelta
+from typing import Optional, List, Dict, Any, Iterator, Sequence, Union
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, desc
-from database.connection import get_db, SessionLocal
-from database.models import ServerMetrics
+from sqlalchemy import and_, or_, func, desc, select, case, delete, exists, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from database.connection import BulkSessionLocal, get_db, SessionLocal
+from database.models import (DataVersion, ImportBatch, Metric, RollupWatermark, ServerMetrics,
+                             ServerMetricsDaily, VMMetrics, Vm)
+from database import normalize, partitions
 from base_logger import logger
 
+# Количество строк, забираемых с серверного курсора за один раз
+FETCH_BATCH_ROWS = 50_000
+
+# Колонки, возвращаемые get_all_metrics
+METRIC_FRAME_COLUMNS = ['vm', 'date', 'metric', 'max_value', 'min_value', 'avg_value', 'created_at']
+VALUE_COLUMNS = ['max_value', 'min_value', 'avg_value']
+
+# Колонки, возвращаемые get_daily_metrics
+DAILY_FRAME_COLUMNS = ['vm', 'date', 'metric', 'max_value', 'min_value', 'avg_value', 'samples']
+
+# Счетчик data_versions, который сдвигают записи репозитория (см. MetricsRepository.data_version)
+DATA_VERSION_NAME = 'metrics'
+
+# Колонки, которые хранятся как id справочника и возвращаются как Categorical
+DIMENSION_COLUMNS = {'vm': Vm, 'metric': Metric}
+
+# Фильтр по серверам: имя одного сервера или список имен
+VmFilter = Optional[Union[str, Sequence[str]]]
+
 
 class MetricsRepository:
     """Репозиторий для работы с метриками серверов"""
 
-    def __init__(self, db: Optional[Session] = None):
+    def __init__(self, db: Optional[Session] = None, session_factory=None):
         """
         Инициализация репозитория
 
         Args:
             db: SQLAlchemy сессия. Если не указана, будет создана новая
+            session_factory: Фабрика новой сессии (по умолчанию SessionLocal, профиль interactive)
         """
         self.db = db
+        self._session_factory = session_factory
+        # Строки, отклоненные последней массовой вставкой (bulk режим)
+        self.last_rejects = pd.DataFrame()
+        # Кэш справочников vms/metrics: модель -> (массив id -> код категории, имена)
+        self._dimensions: Dict[Any, Any] = {}
+
+    @classmethod
+    def bulk(cls) -> 'MetricsRepository':
+        """
+        Репозиторий для загрузки и обслуживания на сессии профиля bulk (BulkSessionLocal)
+
+        Сессия по умолчанию использует профиль interactive со statement_timeout дашборда, который
+        прерывает массовую вставку, пересчет агрегата за большой период и удаление по сроку хранения
+        """
+        return cls(session_factory=BulkSessionLocal)
 
     def __enter__(self):
         """Контекстный менеджер для автоматического управления сессией"""
         if self.db is None:
-            self.db = SessionLocal()
+            self.db = (self._session_factory or SessionLocal)()
             self._own_session = True
         else:
             self._own_session = False
@@ -40,7 +79,7 @@ class MetricsRepository:
 
     def get_all_metrics(
             self,
-            vm: Optional[str] = None,
+            vm: VmFilter = None,
             start_date: Optional[date] = None,
             end_date: Optional[date] = None,
             metric: Optional[str] = None,
@@ -50,7 +89,7 @@ class MetricsRepository:
         Получение всех метрик с фильтрацией
 
         Args:
-            vm: Фильтр по имени сервера
+            vm: Фильтр по имени сервера или списку имен
             start_date: Начальная дата
             end_date: Конечная дата
             metric: Фильтр по метрике (поддержка LIKE)
@@ -60,58 +99,197 @@ class MetricsRepository:
             DataFrame с метриками
         """
         try:
-            query = self.db.query(ServerMetrics)
+            stmt = self._metrics_select(vm=vm, start_date=start_date, end_date=end_date, metric=metric)
+            if limit:
+                stmt = stmt.limit(limit)
 
-            # Применяем фильтры
-            if vm:
-                query = query.filter(ServerMetrics.vm == vm)
+            # Серверный курсор: строки забираются порциями и сразу раскладываются по колонкам
+            result = self.db.execute(stmt.execution_options(stream_results=True))
+            chunks = [
+                self._columns_from_rows(rows)
+                for rows in result.partitions(FETCH_BATCH_ROWS)
+            ]
 
-            if start_date:
-                query = query.filter(ServerMetrics.date >= start_date)
+            df = self._frame_from_columns(chunks)
 
-            if end_date:
-                query = query.filter(ServerMetrics.date <= end_date)
+            logger.info(f"Получено {len(df)} записей из базы данных")
+            return df
 
-            if metric:
-                query = query.filter(ServerMetrics.metric.like(f'%{metric}%'))
+        except Exception as e:
+            logger.error(f"Ошибка при получении метрик: {e}", exc_info=True)
+            return pd.DataFrame()
 
-            # Сортировка
-            query = query.order_by(ServerMetrics.vm, ServerMetrics.date, ServerMetrics.metric)
+    def iter_metrics(
+            self,
+            vm: VmFilter = None,
+            start_date: Optional[date] = None,
+            end_date: Optional[date] = None,
+            metric: Optional[str] = None,
+            chunk_rows: int = FETCH_BATCH_ROWS
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Постраничное чтение метрик с серверного (именованного) курсора
 
-            # Ограничение
-            if limit:
-                query = query.limit(limit)
-
-            # Выполняем запрос
-            results = query.all()
-
-            # Преобразуем в DataFrame
-            data = []
-            for row in results:
-                data.append({
-                    'vm': row.vm,
-                    'date': row.date,
-                    'metric': row.metric,
-                    'max_value': float(row.max_value) if row.max_value else None,
-                    'min_value': float(row.min_value) if row.min_value else None,
-                    'avg_value': float(row.avg_value) if row.avg_value else None,
-                    'created_at': row.created_at,
-                })
-
-            df = pd.DataFrame(data)
+        В памяти одновременно находится только одна порция, поэтому вызывающий
+        код может агрегировать данные инкрементально, не загружая всю историю.
 
-            if not df.empty:
-                # Преобразуем дату в datetime если нужно
-                if 'date' in df.columns:
-                    df['date'] = pd.to_datetime(df['date'])
+        Args:
+            vm: Фильтр по имени сервера или списку имен
+            start_date: Начальная дата
+            end_date: Конечная дата
+            metric: Фильтр по метрике (поддержка LIKE)
+            chunk_rows: Количество строк в одной порции
 
-            logger.info(f"Получено {len(df)} записей из базы данных")
-            return df
+        Yields:
+            DataFrame с порцией метрик (колонки как у get_all_metrics)
+        """
+        stmt = self._metrics_select(vm=vm, start_date=start_date, end_date=end_date, metric=metric)
+        result = self.db.execute(
+            stmt.execution_options(stream_results=True, max_row_buffer=chunk_rows)
+        )
 
+        try:
+            for rows in result.partitions(chunk_rows):
+                yield self._frame_from_columns([self._columns_from_rows(rows)])
         except Exception as e:
-            logger.error(f"Ошибка при получении метрик: {e}", exc_info=True)
+            logger.error(f"Ошибка при постраничном чтении метрик: {e}", exc_info=True)
+            raise
+        finally:
+            result.close()
+
+    @staticmethod
+    def _metrics_select(
+            vm: VmFilter = None,
+            start_date: Optional[date] = None,
+            end_date: Optional[date] = None,
+            metric: Optional[str] = None
+    ):
+        """
+        Core SELECT только нужных колонок с фильтрами и сортировкой
+
+        vm и metric выбираются как id справочников и декодируются на стороне pandas
+        """
+        stmt = select(
+            ServerMetrics.vm_id,
+            ServerMetrics.date,
+            ServerMetrics.metric_id,
+            ServerMetrics.max_value,
+            ServerMetrics.min_value,
+            ServerMetrics.avg_value,
+            ServerMetrics.created_at,
+        )
+
+        if vm:
+            stmt = stmt.where(_vm_filter(ServerMetrics.vm_id, vm))
+
+        if start_date:
+            stmt = stmt.where(ServerMetrics.date >= start_date)
+
+        if end_date:
+            stmt = stmt.where(_date_upper_bound(ServerMetrics.date, end_date))
+
+        if metric:
+            stmt = stmt.where(_metric_filter(ServerMetrics.metric_id, metric))
+
+        return stmt.order_by(ServerMetrics.vm_id, ServerMetrics.date, ServerMetrics.metric_id)
+
+    @staticmethod
+    def _columns_from_rows(rows) -> Dict[str, Any]:
+        """
+        Раскладка порции строк по NumPy массивам (по одному на колонку)
+
+        Даты приводятся к datetime64 в UTC; исходный часовой пояс сохраняется
+        в ключе '_tz', чтобы восстановить его при сборке DataFrame
+        """
+        columns = dict(zip(METRIC_FRAME_COLUMNS, zip(*rows)))
+        arrays = {'_tz': {}}
+        for name in METRIC_FRAME_COLUMNS:
+            values = columns[name]
+            if name in VALUE_COLUMNS:
+                # None превращается в NaN при построении float64 массива
+                arrays[name] = np.array(values, dtype=np.float64)
+            elif name in DIMENSION_COLUMNS:
+                arrays[name] = np.array(values, dtype=np.int64)
+            elif name in ('date', 'created_at'):
+                arrays['_tz'][name] = getattr(values[0], 'tzinfo', None)
+                arrays[name] = pd.to_datetime(pd.Index(values, dtype=object), utc=True).tz_localize(None).values
+            else:
+                arrays[name] = np.array(values, dtype=object)
+        return arrays
+
+    def _frame_from_columns(self, chunks: List[Dict[str, Any]]) -> pd.DataFrame:
+        """
+        Сборка DataFrame из порций колоночных массивов
+        """
+        if not chunks:
             return pd.DataFrame()
 
+        data = {}
+        for name in METRIC_FRAME_COLUMNS:
+            values = np.concatenate([chunk[name] for chunk in chunks])
+            tz = chunks[0]['_tz'].get(name)
+            if tz is not None:
+                values = pd.DatetimeIndex(values).tz_localize('UTC').tz_convert(tz)
+            if name in DIMENSION_COLUMNS:
+                values = self._categorical(DIMENSION_COLUMNS[name], values)
+            data[name] = values
+
+        return pd.DataFrame(data)
+
+    def _categorical(self, model, ids) -> pd.Categorical:
+        """
+        Декодирование id справочника в Categorical с именами в качестве категорий
+
+        Категории - все значения справочника по алфавиту, поэтому порции
+        iter_metrics склеиваются без потери типа.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        lookup, categories = self._dimension_lookup(model)
+        if len(ids) and (ids.max() >= len(lookup) or (lookup[ids] < 0).any()):
+            # В справочник добавлены значения после заполнения кэша
+            self._dimensions.pop(model, None)
+            lookup, categories = self._dimension_lookup(model)
+        return pd.Categorical.from_codes(lookup[ids], categories=categories)
+
+    def _dimension_lookup(self, model):
+        """
+        Кэш справочника: массив id -> код категории и отсортированный список имен
+        """
+        if model not in self._dimensions:
+            names = dict(self.db.execute(select(model.id, model.name)).all())
+            categories = sorted(names.values())
+            codes = {name: code for code, name in enumerate(categories)}
+            lookup = np.full(max(names, default=0) + 1, -1, dtype=np.int64)
+            for dimension_id, name in names.items():
+                lookup[dimension_id] = codes[name]
+            self._dimensions[model] = (lookup, categories)
+        return self._dimensions[model]
+
+    def _dimension_ids(self, model, names) -> Dict[str, int]:
+        """
+        id справочника для списка имен; недостающие имена добавляются
+
+        Транзакцию не фиксирует: коммит выполняет вызывающий метод.
+
+        Args:
+            model: Vm или Metric
+            names: Имена серверов или метрик
+
+        Returns:
+            Словарь {имя: id}
+        """
+        names = list(dict.fromkeys(names))
+        ids = dict(self.db.execute(select(model.name, model.id).where(model.name.in_(names))).all())
+
+        missing = [name for name in names if name not in ids]
+        if missing:
+            stmt = self._dialect_insert()(model.__table__).on_conflict_do_nothing(index_elements=['name'])
+            self.db.execute(stmt, [{'name': name} for name in missing])
+            ids.update(self.db.execute(select(model.name, model.id).where(model.name.in_(missing))).all())
+            self._dimensions.pop(model, None)
+
+        return ids
+
     def get_metrics_by_server(self, vm: str) -> pd.DataFrame:
         """
         Получение всех метрик для конкретного сервера
@@ -155,8 +333,8 @@ class MetricsRepository:
             Список имен серверов
         """
         try:
-            servers = self.db.query(ServerMetrics.vm).distinct().order_by(ServerMetrics.vm).all()
-            return [s[0] for s in servers]
+            stmt = select(Vm.name).where(exists().where(ServerMetrics.vm_id == Vm.id)).order_by(Vm.name)
+            return list(self.db.execute(stmt).scalars())
         except Exception as e:
             logger.error(f"Ошибка при получении списка серверов: {e}")
             return []
@@ -169,8 +347,8 @@ class MetricsRepository:
             Список метрик
         """
         try:
-            metrics = self.db.query(ServerMetrics.metric).distinct().order_by(ServerMetrics.metric).all()
-            return [m[0] for m in metrics]
+            stmt = select(Metric.name).where(exists().where(ServerMetrics.metric_id == Metric.id)).order_by(Metric.name)
+            return list(self.db.execute(stmt).scalars())
         except Exception as e:
             logger.error(f"Ошибка при получении списка метрик: {e}")
             return []
@@ -201,7 +379,8 @@ class MetricsRepository:
             metric: str,
             max_value: Optional[float] = None,
             min_value: Optional[float] = None,
-            avg_value: Optional[float] = None
+            avg_value: Optional[float] = None,
+            refresh_rollup: bool = True
     ) -> bool:
         """
         Вставка одной метрики
@@ -213,17 +392,25 @@ class MetricsRepository:
             max_value: Максимальное значение
             min_value: Минимальное значение
             avg_value: Среднее значение
+            refresh_rollup: Пересчитать день в server_metrics_daily. False, если вызывающий
+                пересчитывает агрегат сам за весь период загрузки
 
         Returns:
             True если успешно, False в противном случае
         """
         try:
+            # Партиция месяца создается в транзакции вставки и запоминается только после коммита:
+            # откат отменяет и CREATE TABLE ... PARTITION OF
+            partitions.ensure_partitions(self.db, ServerMetrics.__tablename__, date, remember=False)
+            vm_id = self._dimension_ids(Vm, [vm])[vm]
+            metric_id = self._dimension_ids(Metric, [metric])[metric]
+
             # Проверяем существование записи
             existing = self.db.query(ServerMetrics).filter(
                 and_(
-                    ServerMetrics.vm == vm,
+                    ServerMetrics.vm_id == vm_id,
                     ServerMetrics.date == date,
-                    ServerMetrics.metric == metric
+                    ServerMetrics.metric_id == metric_id
                 )
             ).first()
 
@@ -235,60 +422,72 @@ class MetricsRepository:
             else:
                 # Создаем новую запись
                 new_metric = ServerMetrics(
-                    vm=vm,
+                    vm_id=vm_id,
                     date=date,
-                    metric=metric,
+                    metric_id=metric_id,
                     max_value=max_value,
                     min_value=min_value,
                     avg_value=avg_value
                 )
                 self.db.add(new_metric)
 
+            self._touch_data_version()
             self.db.commit()
-            return True
-
+            partitions.remember_partitions(ServerMetrics.__tablename__, date)
         except Exception as e:
             logger.error(f"Ошибка при вставке метрики: {e}", exc_info=True)
             self.db.rollback()
             return False
 
-    def insert_from_dataframe(self, df: pd.DataFrame) -> Dict[str, int]:
+        if refresh_rollup:
+            self.refresh_daily_rollup(start_date=date, end_date=date)
+        return True
+
+    def insert_from_dataframe(
+            self,
+            df: pd.DataFrame,
+            bulk: bool = False,
+            chunk_size: int = 5000
+    ) -> Dict[str, int]:
         """
         Массовая вставка данных из DataFrame
 
         Args:
             df: DataFrame с колонками: vm, date, metric, max_value, min_value, avg_value
+            bulk: Использовать set-based upsert (одна транзакция, INSERT ... ON CONFLICT)
+                вместо построчной вставки. Для больших DataFrame используйте MetricsRepository.bulk()
+            chunk_size: Размер пачки строк в одном INSERT (только для bulk режима)
 
         Returns:
-            Словарь с количеством успешных и неудачных вставок
+            Словарь с количеством успешных и неудачных вставок.
+            В bulk режиме отклоненные строки доступны в self.last_rejects
         """
+        if bulk:
+            return self._bulk_upsert_dataframe(df, chunk_size=chunk_size)
+
         success_count = 0
         error_count = 0
 
         try:
-            # Проверяем необходимые колонки
-            required_columns = ['vm', 'date', 'metric', 'avg_value']
-            missing = [col for col in required_columns if col not in df.columns]
+            valid, rejects = normalize.normalize_metrics(df)
+        except ValueError as e:
+            logger.error(str(e))
+            return {'success': 0, 'errors': len(df)}
+        error_count = len(rejects)
 
-            if missing:
-                logger.error(f"Отсутствуют обязательные колонки: {missing}")
-                return {'success': 0, 'errors': len(df)}
-
-            # Преобразуем дату если нужно
-            if 'date' in df.columns:
-                df['date'] = pd.to_datetime(df['date']).dt.date
+        try:
+            # Типы приведены целыми колонками; NaN заменяются на None одной операцией
+            rows = valid.assign(
+                vm=valid['vm'].astype(str),
+                metric=valid['metric'].astype(str),
+                date=valid['date'].dt.date,
+            )
+            rows = rows.astype(object).where(rows.notna(), None)
 
             # Вставляем данные построчно
-            for _, row in df.iterrows():
+            for index, row in zip(rows.index, rows.to_dict('records')):
                 try:
-                    result = self.insert_metric(
-                        vm=str(row['vm']),
-                        date=row['date'],
-                        metric=str(row['metric']),
-                        max_value=float(row['max_value']) if pd.notna(row.get('max_value')) else None,
-                        min_value=float(row['min_value']) if pd.notna(row.get('min_value')) else None,
-                        avg_value=float(row['avg_value']) if pd.notna(row['avg_value']) else None
-                    )
+                    result = self.insert_metric(**row, refresh_rollup=False)
 
                     if result:
                         success_count += 1
@@ -296,16 +495,111 @@ class MetricsRepository:
                         error_count += 1
 
                 except Exception as e:
-                    logger.warning(f"Ошибка при вставке строки {_}: {e}")
+                    logger.warning(f"Ошибка при вставке строки {index}: {e}")
                     error_count += 1
                     continue
 
+            # Дневной агрегат пересчитывается один раз за период загрузки, как в bulk режиме
+            if success_count:
+                self.refresh_daily_rollup(start_date=rows['date'].min(), end_date=rows['date'].max())
+
             logger.info(f"Вставлено {success_count} записей, ошибок: {error_count}")
             return {'success': success_count, 'errors': error_count}
 
         except Exception as e:
             logger.error(f"Ошибка при массовой вставке: {e}", exc_info=True)
-            return {'success': success_count, 'errors': error_count + len(df) - success_count}
+            return {'success': success_count, 'errors': len(df) - success_count}
+
+    def _bulk_upsert_dataframe(self, df: pd.DataFrame, chunk_size: int = 5000) -> Dict[str, int]:
+        """
+        Set-based upsert DataFrame в server_metrics в одной транзакции
+
+        Строки с некорректными ключами или значениями не прерывают загрузку,
+        а собираются в self.last_rejects с колонкой reject_reason.
+
+        Args:
+            df: DataFrame с колонками: vm, date, metric, max_value, min_value, avg_value
+            chunk_size: Количество строк в одном INSERT ... ON CONFLICT
+
+        Returns:
+            Словарь с количеством успешных и неудачных вставок
+        """
+        self.last_rejects = pd.DataFrame()
+
+        try:
+            valid, rejects = normalize.normalize_metrics(df)
+        except ValueError as e:
+            logger.error(str(e))
+            self.last_rejects = df.assign(reject_reason=str(e))
+            return {'success': 0, 'errors': len(df)}
+
+        rejected_count = len(rejects)
+        if rejected_count:
+            self.last_rejects = rejects
+            logger.warning(f"Отклонено {rejected_count} строк при массовой вставке: {normalize.reject_counts(rejects)}")
+
+        if valid.empty:
+            return {'success': 0, 'errors': rejected_count}
+
+        valid = valid.assign(
+            vm=valid['vm'].astype(str),
+            metric=valid['metric'].astype(str),
+            date=valid['date'].dt.date,
+        )
+        # ON CONFLICT не может обновить одну строку дважды в одной команде:
+        # как и при построчной вставке, побеждает последнее значение ключа
+        deduped = valid.drop_duplicates(subset=['vm', 'date', 'metric'], keep='last')
+
+        try:
+            partitions.ensure_partitions(
+                self.db, ServerMetrics.__tablename__, valid['date'].min(), valid['date'].max(), remember=False
+            )
+            rows = deduped.assign(
+                vm=deduped['vm'].map(self._dimension_ids(Vm, deduped['vm'].unique())),
+                metric=deduped['metric'].map(self._dimension_ids(Metric, deduped['metric'].unique())),
+            ).rename(columns={'vm': 'vm_id', 'metric': 'metric_id'})
+            records = rows.astype(object).where(rows.notna(), None).to_dict('records')
+
+            stmt = self._upsert_statement()
+            for start in range(0, len(records), chunk_size):
+                self.db.execute(stmt, records[start:start + chunk_size])
+            self._touch_data_version()
+            self.db.commit()
+            partitions.remember_partitions(ServerMetrics.__tablename__, valid['date'].min(), valid['date'].max())
+        except Exception as e:
+            logger.error(f"Ошибка при массовой вставке: {e}", exc_info=True)
+            self.db.rollback()
+            return {'success': 0, 'errors': len(df)}
+
+        self.refresh_daily_rollup(start_date=valid['date'].min(), end_date=valid['date'].max())
+
+        logger.info(f"Вставлено {len(valid)} записей (bulk), ошибок: {rejected_count}")
+        return {'success': len(valid), 'errors': rejected_count}
+
+    def _dialect_insert(self):
+        """
+        insert() с поддержкой ON CONFLICT для текущего диалекта БД
+        """
+        dialect = self.db.get_bind().dialect.name
+        return sqlite.insert if dialect == 'sqlite' else postgresql.insert
+
+    def _upsert_statement(self):
+        """
+        INSERT ... ON CONFLICT (vm_id, date, metric_id) DO UPDATE для текущего диалекта БД
+
+        Обновляет те же колонки, что слияние COPY (database/ingest.py) и агрегация vm_metrics
+        (database/rollup.py), включая updated_at
+        """
+        stmt = self._dialect_insert()(ServerMetrics.__table__)
+        return stmt.on_conflict_do_update(
+            index_elements=['vm_id', 'date', 'metric_id'],
+            set_={
+                'max_value': stmt.excluded.max_value,
+                'min_value': stmt.excluded.min_value,
+                'avg_value': stmt.excluded.avg_value,
+                'updated_at': func.now(),
+            }
+        )
 
     def get_server_summary(self, vm: str) -> Dict[str, Any]:
         """
@@ -318,94 +612,384 @@ class MetricsRepository:
             Словарь со сводной информацией
         """
         try:
-            metrics = self.get_metrics_by_server(vm)
-
-            if metrics.empty:
-                return {
-                    'vm': vm,
-                    'cpu_avg': 0,
-                    'cpu_max': 0,
-                    'mem_avg': 0,
-                    'mem_max': 0,
-                    'total_metrics': 0
-                }
-
-            # CPU метрики
-            cpu_data = metrics[metrics['metric'].str.contains('cpu.usage', case=False, na=False)]
-            cpu_avg = cpu_data['avg_value'].mean() if not cpu_data.empty else 0
-            cpu_max = cpu_data['avg_value'].max() if not cpu_data.empty else 0
-
-            # Memory метрики
-            mem_data = metrics[metrics['metric'].str.contains('mem.usage', case=False, na=False)]
-            mem_avg = mem_data['avg_value'].mean() if not mem_data.empty else 0
-            mem_max = mem_data['avg_value'].max() if not mem_data.empty else 0
-
-            return {
-                'vm': vm,
-                'cpu_avg': round(cpu_avg, 2),
-                'cpu_max': round(cpu_max, 2),
-                'mem_avg': round(mem_avg, 2),
-                'mem_max': round(mem_max, 2),
-                'total_metrics': len(metrics)
-            }
+            summaries = self.get_servers_summary(vms=[vm])
+            return summaries.get(vm, self._empty_summary(vm))
 
         except Exception as e:
             logger.error(f"Ошибка при получении сводки по серверу {vm}: {e}")
-            return {
-                'vm': vm,
-                'cpu_avg': 0,
-                'cpu_max': 0,
-                'mem_avg': 0,
-                'mem_max': 0,
-                'total_metrics': 0
+            return self._empty_summary(vm)
+
+    def get_servers_summary(self, vms: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Сводная информация по нескольким серверам за один запрос
+
+        avg/max по семействам метрик cpu.usage и mem.usage считаются
+        в БД одним GROUP BY vm, без выгрузки строк в pandas.
+
+        Args:
+            vms: Список серверов. Если не указан, возвращаются все серверы
+
+        Returns:
+            Словарь {имя сервера: сводная информация как в get_server_summary}
+        """
+        # '_' в LIKE соответствует '.' в регулярном выражении 'cpu.usage'
+        is_cpu = Metric.name.ilike('%cpu_usage%')
+        is_mem = Metric.name.ilike('%mem_usage%')
+        value = ServerMetrics.avg_value
+
+        stmt = select(
+            Vm.name.label('vm'),
+            func.avg(case((is_cpu, value))).label('cpu_avg'),
+            func.max(case((is_cpu, value))).label('cpu_max'),
+            func.avg(case((is_mem, value))).label('mem_avg'),
+            func.max(case((is_mem, value))).label('mem_max'),
+            func.count().label('total_metrics'),
+        ).select_from(ServerMetrics).join(
+            Vm, ServerMetrics.vm_id == Vm.id
+        ).join(
+            Metric, ServerMetrics.metric_id == Metric.id
+        ).group_by(Vm.name).order_by(Vm.name)
+
+        if vms:
+            stmt = stmt.where(Vm.name.in_(vms))
+
+        summaries = {}
+        for row in self.db.execute(stmt):
+            summaries[row.vm] = {
+                'vm': row.vm,
+                'cpu_avg': round(row.cpu_avg or 0, 2),
+                'cpu_max': round(row.cpu_max or 0, 2),
+                'mem_avg': round(row.mem_avg or 0, 2),
+                'mem_max': round(row.mem_max or 0, 2),
+                'total_metrics': row.total_metrics
             }
 
-    def delete_old_metrics(self, days: int = 90) -> int:
+        return summaries
+
+    @staticmethod
+    def _empty_summary(vm: str) -> Dict[str, Any]:
+        """Сводка для сервера без данных"""
+        return {
+            'vm': vm,
+            'cpu_avg': 0,
+            'cpu_max': 0,
+            'mem_avg': 0,
+            'mem_max': 0,
+            'total_metrics': 0
+        }
+
+    def refresh_daily_rollup(
+            self,
+            start_date: Optional[date] = None,
+            end_date: Optional[date] = None
+    ) -> int:
+        """
+        Пересчет дневного агрегата server_metrics_daily за период
+
+        Дни периода удаляются из агрегата и пересчитываются одним
+        INSERT ... SELECT ... GROUP BY в одной транзакции. Пересчет большого периода
+        выполняйте через MetricsRepository.bulk(): на сессии дашборда действует statement_timeout.
+
+        Args:
+            start_date: Первый пересчитываемый день (по умолчанию вся история)
+            end_date: Последний пересчитываемый день (по умолчанию вся история)
+
+        Returns:
+            Количество строк агрегата после пересчета
+        """
+        try:
+            day = func.date(ServerMetrics.date)
+            source = select(
+                ServerMetrics.vm_id,
+                day.label('day'),
+                ServerMetrics.metric_id,
+                func.max(ServerMetrics.max_value),
+                func.min(ServerMetrics.min_value),
+                func.avg(ServerMetrics.avg_value),
+                func.count(),
+            ).group_by(ServerMetrics.vm_id, day, ServerMetrics.metric_id)
+            stale = delete(ServerMetricsDaily)
+
+            if start_date:
+                start_date = pd.Timestamp(start_date).date()
+                source = source.where(ServerMetrics.date >= start_date)
+                stale = stale.where(ServerMetricsDaily.day >= start_date)
+
+            if end_date:
+                # Верхняя граница исключающая, чтобы захватить весь последний день
+                end_date = pd.Timestamp(end_date).date()
+                source = source.where(ServerMetrics.date < end_date + timedelta(days=1))
+                stale = stale.where(ServerMetricsDaily.day <= end_date)
+
+            self.db.execute(stale)
+            result = self.db.execute(
+                insert(ServerMetricsDaily).from_select(
+                    ['vm_id', 'day', 'metric_id', 'max_value', 'min_value', 'avg_value', 'samples'],
+                    source
+                )
+            )
+            self._touch_data_version()
+            self.db.commit()
+
+            logger.info(f"Дневной агрегат пересчитан за {start_date or '...'} - {end_date or '...'}: "
+                        f"{result.rowcount} строк")
+            return result.rowcount
+
+        except Exception as e:
+            logger.error(f"Ошибка при пересчете дневного агрегата: {e}", exc_info=True)
+            self.db.rollback()
+            return 0
+
+    def data_version(self) -> tuple:
+        """
+        Версия данных для кэшей: меняется после каждой закоммиченной записи
+
+        Загрузчики фиксируют каждый блок вместе с rows_loaded в import_batches,
+        агрегация vm_metrics сдвигает rollup_watermarks.updated_at, а вставки репозитория,
+        пересчет дневного агрегата и удаление по сроку хранения увеличивают счетчик data_versions
+
+        Returns:
+            Кортеж (число загрузок, сумма rows_loaded, последнее finished_at,
+            последнее обновление агрегата, счетчик записей репозитория)
+        """
+        batches, rows_loaded, finished_at = self.db.query(
+            func.count(ImportBatch.id),
+            func.coalesce(func.sum(ImportBatch.rows_loaded), 0),
+            func.max(ImportBatch.finished_at)
+        ).one()
+        rollup_at = self.db.query(func.max(RollupWatermark.updated_at)).scalar()
+        writes = self.db.query(DataVersion.version).filter(DataVersion.name == DATA_VERSION_NAME).scalar()
+        return batches, int(rows_loaded), finished_at, rollup_at, writes or 0
+
+    def _touch_data_version(self) -> None:
+        """
+        Увеличение счетчика data_versions в текущей транзакции (коммитит вызывающий код)
+        """
+        stmt = self._dialect_insert()(DataVersion.__table__).values(name=DATA_VERSION_NAME, version=1)
+        self.db.execute(stmt.on_conflict_do_update(
+            index_elements=['name'],
+            set_={'version': DataVersion.__table__.c.version + 1, 'updated_at': func.now()}
+        ))
+
+    def daily_rollup_covers(
+            self,
+            start_date: Optional[date] = None,
+            end_date: Optional[date] = None
+    ) -> bool:
+        """
+        Проверка, покрывает ли дневной агрегат запрошенный период
+
+        Незаданные границы берутся из диапазона дат сырых данных.
+
+        Returns:
+            True если можно читать из server_metrics_daily
+        """
+        try:
+            rollup_min, rollup_max = self.db.query(
+                func.min(ServerMetricsDaily.day), func.max(ServerMetricsDaily.day)
+            ).one()
+            if rollup_min is None:
+                return False
+
+            if start_date is None or end_date is None:
+                raw_range = self.get_date_range()
+                if raw_range['min_date'] is None:
+                    return False
+                start_date = start_date or raw_range['min_date']
+                end_date = end_date or raw_range['max_date']
+
+            return (
+                pd.Timestamp(rollup_min).date() <= pd.Timestamp(start_date).date()
+                and pd.Timestamp(rollup_max).date() >= pd.Timestamp(end_date).date()
+            )
+
+        except Exception as e:
+            logger.error(f"Ошибка при проверке дневного агрегата: {e}")
+            return False
+
+    def get_daily_metrics(
+            self,
+            vm: VmFilter = None,
+            start_date: Optional[date] = None,
+            end_date: Optional[date] = None,
+            metric: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        Получение дневных агрегатов метрик из server_metrics_daily
+
+        Args:
+            vm: Фильтр по имени сервера или списку имен
+            start_date: Начальная дата
+            end_date: Конечная дата
+            metric: Фильтр по метрике (поддержка LIKE)
+
+        Returns:
+            DataFrame с колонками vm, date, metric, max_value, min_value, avg_value, samples
+        """
+        try:
+            stmt = select(
+                ServerMetricsDaily.vm_id,
+                ServerMetricsDaily.day,
+                ServerMetricsDaily.metric_id,
+                ServerMetricsDaily.max_value,
+                ServerMetricsDaily.min_value,
+                ServerMetricsDaily.avg_value,
+                ServerMetricsDaily.samples,
+            )
+
+            if vm:
+                stmt = stmt.where(_vm_filter(ServerMetricsDaily.vm_id, vm))
+
+            if start_date:
+                stmt = stmt.where(ServerMetricsDaily.day >= pd.Timestamp(start_date).date())
+
+            if end_date:
+                stmt = stmt.where(ServerMetricsDaily.day <= pd.Timestamp(end_date).date())
+
+            if metric:
+                stmt = stmt.where(_metric_filter(ServerMetricsDaily.metric_id, metric))
+
+            stmt = stmt.order_by(ServerMetricsDaily.vm_id, ServerMetricsDaily.day, ServerMetricsDaily.metric_id)
+
+            rows = self.db.execute(stmt).all()
+            if not rows:
+                return pd.DataFrame()
+
+            df = pd.DataFrame(rows, columns=DAILY_FRAME_COLUMNS)
+            df['date'] = pd.to_datetime(df['date'])
+            for col, model in DIMENSION_COLUMNS.items():
+                df[col] = self._categorical(model, df[col].to_numpy())
+            for col in VALUE_COLUMNS:
+                df[col] = df[col].astype('float64')
+
+            logger.info(f"Получено {len(df)} дневных агрегатов из базы данных")
+            return df
+
+        except Exception as e:
+            logger.error(f"Ошибка при получении дневных агрегатов: {e}", exc_info=True)
+            return pd.DataFrame()
+
+    def delete_old_metrics(self, days: int = 90, detach: bool = False) -> int:
         """
         Удаление старых метрик (старше указанного количества дней)
 
+        Для партиционированной таблицы целые месяцы старше границы удаляются
+        (или отсоединяются) вместе с партицией, построчный DELETE выполняется
+        только внутри пограничной партиции. Вызывается через MetricsRepository.bulk():
+        на сессии дашборда действует statement_timeout.
+
         Args:
             days: Количество дней для хранения
+            detach: Отсоединять партиции вместо удаления (для архивации)
 
         Returns:
             Количество удаленных записей
         """
+        deleted = self._apply_retention(ServerMetrics, ServerMetrics.date, days, detach)
+
+        # Дневной агрегат не должен показывать удаленную историю
+        if deleted:
+            cutoff_date = datetime.now().date() - timedelta(days=days)
+            self.db.query(ServerMetricsDaily).filter(ServerMetricsDaily.day < cutoff_date).delete()
+            self._touch_data_version()
+            self.db.commit()
+
+        return deleted
+
+    def delete_old_vm_metrics(self, days: int = 90, detach: bool = False) -> int:
+        """
+        Удаление старых сырых метрик vm_metrics (старше указанного количества дней)
+
+        Вызывается через MetricsRepository.bulk(), как delete_old_metrics
+
+        Args:
+            days: Количество дней для хранения
+            detach: Отсоединять партиции вместо удаления (для архивации)
+
+        Returns:
+            Количество удаленных записей
+        """
+        return self._apply_retention(VMMetrics, VMMetrics.timestamp, days, detach)
+
+    def _apply_retention(self, model, column, days: int, detach: bool) -> int:
+        """
+        Удаление строк модели старше days дней: по партициям, если возможно
+        """
+        table = model.__tablename__
         try:
-            cutoff_date = datetime.now().date() - pd.Timedelta(days=days)
+            cutoff_date = datetime.now().date() - timedelta(days=days)
+            deleted = 0
 
-            deleted = self.db.query(ServerMetrics).filter(
-                ServerMetrics.date < cutoff_date
-            ).delete()
+            if partitions.is_partitioned(self.db, table):
+                dropped = partitions.drop_partitions_before(self.db, table, cutoff_date, detach=detach)
+                deleted += dropped['rows']
 
+            # Остаток внутри пограничной партиции (или вся таблица без партиций)
+            deleted += self.db.query(model).filter(column < cutoff_date).delete(synchronize_session=False)
+
+            if deleted:
+                self._touch_data_version()
             self.db.commit()
-            logger.info(f"Удалено {deleted} записей старше {days} дней")
+            logger.info(f"Удалено {deleted} записей {table} старше {days} дней")
             return deleted
 
         except Exception as e:
-            logger.error(f"Ошибка при удалении старых метрик: {e}")
+            logger.error(f"Ошибка при удалении старых метрик {table}: {e}")
             self.db.rollback()
             return 0
 
 
+def _vm_filter(column, vm: Union[str, Sequence[str]]):
+    """Условие на колонку vm_id по имени сервера или списку имен"""
+    if isinstance(vm, str):
+        return column == select(Vm.id).where(Vm.name == vm).scalar_subquery()
+    return column.in_(select(Vm.id).where(Vm.name.in_(list(vm))))
+
+
+def _date_upper_bound(column, end_date: date):
+    """Условие на верхнюю границу периода: дата без времени включает весь день"""
+    if isinstance(end_date, datetime):
+        return column <= end_date
+    return column < end_date + timedelta(days=1)
+
+
+def _metric_filter(column, metric: str):
+    """Условие на колонку metric_id по подстроке имени метрики (LIKE)"""
+    return column.in_(select(Metric.id).where(Metric.name.like(f'%{metric}%')))
+
+
 def get_metrics_from_db(
-        vm: Optional[str] = None,
+        vm: VmFilter = None,
         start_date: Optional[date] = None,
         end_date: Optional[date] = None,
-        metric: Optional[str] = None
+        metric: Optional[str] = None,
+        prefer_daily: bool = False
 ) -> pd.DataFrame:
     """
     Удобная функция для получения метрик из БД
 
     Args:
-        vm: Фильтр по серверу
+        vm: Фильтр по серверу или списку серверов
         start_date: Начальная дата
         end_date: Конечная дата
         metric: Фильтр по метрике
+        prefer_daily: Читать дневной агрегат server_metrics_daily,
+            если он покрывает запрошенный период
 
     Returns:
         DataFrame с метриками
     """
     with MetricsRepository() as repo:
+        if prefer_daily and repo.daily_rollup_covers(start_date=start_date, end_date=end_date):
+            df = repo.get_daily_metrics(
+                vm=vm,
+                start_date=start_date,
+                end_date=end_date,
+                metric=metric
+            )
+            if not df.empty:
+                return df
+
         return repo.get_all_metrics(
             vm=vm,
             start_date=start_date,
@@ -413,3 +997,50 @@ def get_metrics_from_db(
             metric=metric
         )
 
+
+def get_date_range_from_db() -> Dict[str, Optional[date]]:
+    """Удобная функция для получения диапазона дат в БД"""
+    with MetricsRepository() as repo:
+        return repo.get_date_range()
+
+
+def get_servers_from_db() -> List[str]:
+    """Удобная функция для получения списка серверов с метриками"""
+    with MetricsRepository() as repo:
+        return repo.get_unique_servers()
+
+
+def get_data_version() -> tuple:
+    """Удобная функция для получения версии данных (см. MetricsRepository.data_version)"""
+    with MetricsRepository() as repo:
+        return repo.data_version()
+
+
+def iter_metrics_from_db(
+        vm: VmFilter = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        metric: Optional[str] = None,
+        chunk_rows: int = FETCH_BATCH_ROWS
+) -> Iterator[pd.DataFrame]:
+    """
+    Удобная функция для постраничного чтения метрик из БД
+
+    Args:
+        vm: Фильтр по серверу или списку серверов
+        start_date: Начальная дата
+        end_date: Конечная дата
+        metric: Фильтр по метрике
+        chunk_rows: Количество строк в одной порции
+
+    Yields:
+        DataFrame с порцией метрик
+    """
+    with MetricsRepository() as repo:
+        yield from repo.iter_metrics(
+            vm=vm,
+            start_date=start_date,
+            end_date=end_date,
+            metric=metric,
+            chunk_rows=chunk_rows
+        )
@@ -0,0 +1,162 @@
+"""
+Инкрементальная агрегация сырых метрик vm_metrics в дневные метрики server_metrics
+Отметка (high-water mark) по vm_metrics.timestamp хранится в rollup_watermarks.
+Каждый запуск находит пары (VM, день) с сэмплами новее отметки, пересчитывает в SQL
+max/min/avg только этих дней по всем счетчикам и делает upsert в server_metrics,
+поэтому стоимость запуска пропорциональна объему новых данных, а не всей истории
+"""
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+
+from base_logger import logger
+from database.connection import BulkSessionLocal, get_engine
+from database.partitions import ensure_partitions
+from database.repository import MetricsRepository
+from database.vcenter_ingest import COUNTER_COLUMNS
+
+# Агрегация может идти дольше statement_timeout дашборда: профиль bulk
+engine = get_engine('bulk')
+
+WATERMARK_NAME = 'vm_metrics_daily'
+
+# Счетчик vCenter (имя метрики в server_metrics) -> колонка vm_metrics
+UNPIVOT_VALUES = ',\n        '.join(
+    f"('{metric}', s.{column})" for metric, column in COUNTER_COLUMNS.items()
+)
+
+CREATE_WATERMARK_SQL = "INSERT INTO rollup_watermarks (name) VALUES (:name) ON CONFLICT (name) DO NOTHING"
+
+# Блокировка строки отметки сериализует запуски агрегации и сдвиг отметки загрузчиком
+LOCK_WATERMARK_SQL = "SELECT last_timestamp FROM rollup_watermarks WHERE name = :name FOR UPDATE"
+
+NEW_RANGE_SQL = """
+SELECT min(timestamp), max(timestamp) FROM vm_metrics
+WHERE timestamp > COALESCE(CAST(:watermark AS timestamptz), '-infinity')
+"""
+
+# Пары (VM, день), в которых появились новые сэмплы
+AFFECTED_DAYS_SQL = """
+CREATE TEMP TABLE vm_rollup_days ON COMMIT DROP AS
+SELECT DISTINCT vm_name, date_trunc('day', timestamp) AS day
+FROM vm_metrics
+WHERE timestamp > COALESCE(CAST(:watermark AS timestamptz), '-infinity')
+  AND timestamp <= :high_water
+"""
+
+# Дни пересчитываются целиком: в агрегат входят и сэмплы, загруженные до отметки
+AGGREGATE_SQL = f"""
+CREATE TEMP TABLE vm_rollup_values ON COMMIT DROP AS
+SELECT d.vm_name AS vm, d.day, c.metric,
+       max(c.value) AS max_value, min(c.value) AS min_value, avg(c.value) AS avg_value
+FROM vm_rollup_days d
+JOIN vm_metrics s
+  ON s.vm_name = d.vm_name
+ AND s.timestamp >= d.day
+ AND s.timestamp < d.day + INTERVAL '1 day'
+CROSS JOIN LATERAL (VALUES
+        {UNPIVOT_VALUES}
+) AS c(metric, value)
+WHERE c.value IS NOT NULL
+GROUP BY d.vm_name, d.day, c.metric
+"""
+
+INSERT_DIMENSIONS_SQL = """
+INSERT INTO vms (name)
+SELECT DISTINCT vm FROM vm_rollup_values r
+WHERE NOT EXISTS (SELECT 1 FROM vms v WHERE v.name = r.vm)
+ON CONFLICT (name) DO NOTHING;
+
+INSERT INTO metrics (name)
+SELECT DISTINCT metric FROM vm_rollup_values r
+WHERE NOT EXISTS (SELECT 1 FROM metrics m WHERE m.name = r.metric)
+ON CONFLICT (name) DO NOTHING
+"""
+
+UPSERT_SQL = """
+INSERT INTO server_metrics (id, vm_id, date, metric_id, max_value, min_value, avg_value)
+SELECT gen_random_uuid(), v.id, r.day, m.id, r.max_value, r.min_value, r.avg_value
+FROM vm_rollup_values r
+JOIN vms v ON v.name = r.vm
+JOIN metrics m ON m.name = r.metric
+ON CONFLICT ON CONSTRAINT uq_vm_date_metric DO UPDATE SET
+    max_value = EXCLUDED.max_value,
+    min_value = EXCLUDED.min_value,
+    avg_value = EXCLUDED.avg_value,
+    updated_at = now()
+"""
+
+SAVE_WATERMARK_SQL = """
+UPDATE rollup_watermarks SET last_timestamp = :high_water, updated_at = now() WHERE name = :name
+"""
+
+# Загрузка сэмплов старше отметки сдвигает ее назад, чтобы следующий запуск их учел
+# (выполняется psycopg2 курсором загрузчика, отсюда pyformat параметры)
+REWIND_WATERMARK_SQL = """
+UPDATE rollup_watermarks
+SET last_timestamp = LEAST(last_timestamp, %(before)s), updated_at = now()
+WHERE name = %(name)s
+"""
+
+
+def rollup_vm_metrics(name: str = WATERMARK_NAME) -> Dict[str, Any]:
+    """
+    Инкрементальный пересчет дневных метрик server_metrics из vm_metrics
+
+    Returns:
+        Словарь со статистикой (vm_days, rows, watermark, seconds)
+    """
+    started = time.perf_counter()
+
+    with engine.connect() as conn:
+        with conn.begin():
+            conn.execute(text(CREATE_WATERMARK_SQL), {'name': name})
+            watermark = conn.execute(text(LOCK_WATERMARK_SQL), {'name': name}).scalar()
+            first_timestamp, high_water = conn.execute(text(NEW_RANGE_SQL), {'watermark': watermark}).one()
+
+            if high_water is None:
+                logger.info(f"Новых сэмплов vm_metrics нет (отметка {watermark})")
+                return {'vm_days': 0, 'rows': 0, 'watermark': watermark, 'seconds': 0.0}
+
+            params = {'watermark': watermark, 'high_water': high_water}
+            vm_days = conn.execute(text(AFFECTED_DAYS_SQL), params).rowcount
+            conn.execute(text(AGGREGATE_SQL))
+
+            # Партиции server_metrics создаются отдельным соединением, как в database/ingest.py
+            with engine.begin() as ddl_conn:
+                ensure_partitions(ddl_conn, 'server_metrics', first_timestamp, high_water)
+
+            conn.execute(text(INSERT_DIMENSIONS_SQL))
+            rows = conn.execute(text(UPSERT_SQL)).rowcount
+            conn.execute(text(SAVE_WATERMARK_SQL), {'name': name, 'high_water': high_water})
+
+    # Дневной агрегат server_metrics_daily за затронутые дни
+    with BulkSessionLocal() as session, MetricsRepository(session) as repo:
+        repo.refresh_daily_rollup(start_date=first_timestamp, end_date=high_water)
+
+    seconds = time.perf_counter() - started
+    logger.info(
+        f"Агрегация vm_metrics: {vm_days} пар (VM, день), {rows} строк server_metrics, "
+        f"отметка {watermark} -> {high_water}, {seconds:.2f} с"
+    )
+    return {'vm_days': vm_days, 'rows': rows, 'watermark': high_water, 'seconds': round(seconds, 3)}
+
+
+def rewind_watermark(cursor, first_timestamp: Optional[Any], name: str = WATERMARK_NAME) -> None:
+    """
+    Сдвиг отметки назад перед first_timestamp в транзакции загрузки
+
+    Args:
+        cursor: psycopg2 курсор транзакции, в которой загружены сэмплы
+        first_timestamp: Самый ранний загруженный timestamp
+        name: Имя отметки
+    """
+    if first_timestamp is None:
+        return
+    cursor.execute(REWIND_WATERMARK_SQL, {'before': first_timestamp - timedelta(microseconds=1), 'name': name})
+
+
+if __name__ == "__main__":
+    print(rollup_vm_metrics())
@@ -0,0 +1,109 @@
+"""
+Кэш исходных файлов (Excel/CSV) в колоночном формате Arrow/Feather
+Первое чтение файла разбирает его pandas (openpyxl для Excel) и сохраняет результат
+в несжатый Feather-файл, имя которого содержит хэш содержимого и mtime источника.
+Последующие чтения того же файла отображают кэш в память (memory_map) вместо разбора Excel.
+Без pyarrow файл читается напрямую
+"""
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+import pandas as pd
+
+from base_logger import logger
+
+try:
+    import pyarrow.feather as feather
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    logger.warning("pyarrow не установлен, кэш исходных файлов отключен")
+
+# Каталог кэша (по умолчанию data/.cache в корне проекта)
+CACHE_DIR = Path(os.getenv("SOURCE_CACHE_DIR", Path(__file__).resolve().parent.parent / "data" / ".cache"))
+
+CACHE_SUFFIX = '.feather'
+HASH_BLOCK_SIZE = 1 << 20
+
+# Хэш содержимого по (путь, mtime_ns, размер): неизмененный файл не хэшируется повторно в процессе
+_digests: Dict[Tuple[str, int, int], str] = {}
+
+
+def read_source(file_path: Union[str, Path], use_cache: bool = True) -> pd.DataFrame:
+    """
+    Чтение Excel/CSV/TSV файла через кэш Feather
+
+    Args:
+        file_path: Путь к .xlsx/.xls, .csv или .tsv/.txt файлу
+        use_cache: Использовать кэш (False для одноразовых файлов, например загруженных через интерфейс)
+
+    Returns:
+        DataFrame с содержимым первого листа (для Excel) или файла
+
+    Raises:
+        FileNotFoundError: Если файл не найден
+    """
+    file_path = Path(file_path)
+    if not PYARROW_AVAILABLE or not use_cache:
+        return _read_raw(file_path)
+
+    cache_path = _cache_path(file_path)
+    if cache_path.exists():
+        logger.debug(f"Чтение {file_path} из кэша {cache_path.name}")
+        return feather.read_table(cache_path, memory_map=True).to_pandas()
+
+    df = _read_raw(file_path)
+    _write_cache(df, file_path, cache_path)
+    return df
+
+
+def file_digest(file_path: Union[str, Path]) -> str:
+    """SHA-256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_path(file_path: Path) -> Path:
+    """Путь к кэшу: <имя>-<хэш содержимого>-<mtime_ns>.feather"""
+    stat = file_path.stat()
+    key = (str(file_path.resolve()), stat.st_mtime_ns, stat.st_size)
+    if key not in _digests:
+        _digests[key] = file_digest(file_path)
+    return CACHE_DIR / f"{file_path.stem}-{_digests[key][:16]}-{stat.st_mtime_ns}{CACHE_SUFFIX}"
+
+
+def _read_raw(file_path: Path) -> pd.DataFrame:
+    """Разбор исходного файла pandas по расширению"""
+    suffix = file_path.suffix.lower()
+    if suffix in ('.xlsx', '.xls'):
+        return pd.read_excel(file_path)
+    if suffix in ('.tsv', '.txt'):
+        return pd.read_csv(file_path, sep='\t')
+    return pd.read_csv(file_path)
+
+
+def _write_cache(df: pd.DataFrame, file_path: Path, cache_path: Path) -> None:
+    """
+    Запись кэша без сжатия (иначе memory_map не избавляет от копирования) и удаление
+    устаревших кэшей того же файла. Ошибка записи не мешает вернуть прочитанные данные
+    """
+    tmp_path = cache_path.with_suffix(f'.{os.getpid()}.tmp')
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        feather.write_feather(df, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        tmp_path.unlink(missing_ok=True)
+        logger.warning(f"Не удалось сохранить кэш {file_path}: {e}")
+        return
+
+    for stale in CACHE_DIR.glob(f"{file_path.stem}-*{CACHE_SUFFIX}"):
+        if stale != cache_path and stale.stem.count('-') == file_path.stem.count('-') + 2:
+            stale.unlink(missing_ok=True)
+    logger.info(f"Кэш {file_path} сохранен в {cache_path}")
@@ -0,0 +1,381 @@
+"""
+Потоковая загрузка сырых выгрузок vCenter в vm_metrics через COPY
+Выгрузка - TSV в широком формате (см. notebooks/metrics_small.txt): VM_Name, vCenter,
+Timestamp в формате dd.mm.yy HH:MM:SS и по одной колонке на счетчик vCenter.
+Файл читается блоками, блок - порциями с фиксированными типами; порции копируются
+в staging-таблицу и одной командой добавляются в vm_metrics; строки, уже загруженные ранее
+(тот же vm_name, vcenter, timestamp), пропускаются. Каждый блок коммитится вместе
+с контрольной точкой в import_batches (см. database/import_batches.py)
+"""
+import io
+import struct
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Union
+
+import numpy as np
+import pandas as pd
+
+from base_logger import logger
+from database import import_batches
+from database.connection import get_engine
+from database.partitions import ensure_partitions
+
+# Отдельный пул загрузчиков: загрузка не занимает соединения дашборда
+engine = get_engine('bulk')
+
+# Размер порции по умолчанию: в памяти одновременно находится только одна порция
+DEFAULT_CHUNK_ROWS = 200_000
+
+# Формат Timestamp в выгрузке vCenter (04.12.25 15:00:00)
+TIMESTAMP_FORMAT = '%d.%m.%y %H:%M:%S'
+
+# Колонки выгрузки -> колонки vm_metrics
+KEY_COLUMNS = {
+    'VM_Name': 'vm_name',
+    'vCenter': 'vcenter',
+    'Timestamp': 'timestamp',
+}
+COUNTER_COLUMNS = {
+    'cpu.usage.average': 'cpu_usage_average',
+    'cpu.ready.summation': 'cpu_ready_summation',
+    'cpu.usagemhz.average': 'cpu_usagemhz_average',
+    'mem.usage.average': 'mem_usage_average',
+    'mem.consumed.average': 'mem_consumed_average',
+    'mem.vmmemctl.average': 'mem_vmmemctl_average',
+    'disk.usage.average': 'disk_usage_average',
+    'disk.maxtotallatency.latest': 'disk_maxtotallatency_latest',
+    'net.usage.average': 'net_usage_average',
+}
+
+# Типы задаются заранее, чтобы read_csv не угадывал их по каждой порции
+SOURCE_DTYPES = {
+    'VM_Name': str,
+    'vCenter': str,
+    'Timestamp': str,
+    **{counter: 'float64' for counter in COUNTER_COLUMNS},
+}
+
+STAGE_TABLE = 'vm_metrics_stage'
+NAMES_TABLE = 'vm_metrics_stage_names'
+COUNTERS = list(COUNTER_COLUMNS.values())
+STAGE_COLUMNS = ['vm_code', 'vcenter_code', 'timestamp'] + COUNTERS
+TARGET_COLUMNS = list(KEY_COLUMNS.values()) + COUNTERS
+
+# Порции передаются в COPY в бинарном формате: строка фиксированной ширины собирается
+# NumPy без форматирования чисел в текст. Имена VM и vCenter заменяются целыми кодами,
+# пропуски счетчиков передаются как NaN и превращаются в NULL при слиянии.
+# Шаблоны принимают имена staging-таблиц: {stage} и {names}
+CREATE_STAGE_SQL = f"""
+CREATE {{table_kind}} TABLE {{stage}} (
+    seq BIGSERIAL,
+    vm_code INTEGER,
+    vcenter_code INTEGER,
+    timestamp TIMESTAMP WITHOUT TIME ZONE,
+    {', '.join(f'{column} DOUBLE PRECISION' for column in COUNTERS)}
+) {{on_commit}};
+
+CREATE {{table_kind}} TABLE {{names}} (
+    code INTEGER,
+    name TEXT
+) {{on_commit}};
+"""
+
+# Временные таблицы одной транзакции (загрузка одного файла)
+TEMP_STAGE = {'table_kind': 'TEMP', 'on_commit': 'ON COMMIT DROP'}
+# Таблицы, видимые другим соединениям (параллельная загрузка, см. database/parallel_ingest.py)
+SHARED_STAGE = {'table_kind': 'UNLOGGED', 'on_commit': ''}
+
+DROP_STAGE_SQL = "DROP TABLE IF EXISTS {stage}, {names}"
+
+COPY_STAGE_SQL = f"COPY {{stage}} ({', '.join(STAGE_COLUMNS)}) FROM STDIN WITH (FORMAT binary)"
+COPY_NAMES_SQL = "COPY {names} (code, name) FROM STDIN WITH (FORMAT csv)"
+
+# Дубликаты внутри файла схлопываются DISTINCT ON, уже загруженные строки пропускает ON CONFLICT.
+# timestamp без часового пояса приводится к timestamptz в часовом поясе сессии
+MERGE_STAGE_SQL = f"""
+INSERT INTO vm_metrics (id, {', '.join(TARGET_COLUMNS)})
+SELECT gen_random_uuid(), vm.name, vc.name, staged.timestamp,
+       {', '.join(f"NULLIF(staged.{column}, 'NaN')" for column in COUNTERS)}
+FROM (
+    SELECT DISTINCT ON (vm_code, vcenter_code, timestamp) *
+    FROM {{stage}}
+    ORDER BY vm_code, vcenter_code, timestamp, seq DESC
+) staged
+JOIN {{names}} vm ON vm.code = staged.vm_code
+JOIN {{names}} vc ON vc.code = staged.vcenter_code
+ON CONFLICT ON CONSTRAINT uq_vm_metrics_vm_vcenter_timestamp DO NOTHING
+"""
+
+# Бинарный формат COPY: сигнатура, флаги, длина расширения заголовка; признак конца данных
+COPY_BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+COPY_BINARY_TRAILER = struct.pack('>h', -1)
+
+# Начало отсчета timestamp в PostgreSQL (микросекунды)
+PG_EPOCH = np.datetime64('2000-01-01T00:00:00', 'us')
+
+# Строка staging-таблицы: количество полей, затем для каждого поля длина и значение (big-endian)
+ROW_DTYPE = np.dtype(
+    [('fields', '>i2')]
+    + [item for column, kind in (('vm_code', '>i4'), ('vcenter_code', '>i4'), ('timestamp', '>i8'))
+       for item in ((f'{column}_len', '>i4'), (column, kind))]
+    + [item for column in COUNTERS for item in ((f'{column}_len', '>i4'), (column, '>f8'))]
+)
+
+
+def ingest_vcenter_file(
+        file_path: Union[str, Path],
+        conn=None,
+        chunk_rows: int = DEFAULT_CHUNK_ROWS,
+        rollup: bool = True,
+        checkpoint_bytes: int = import_batches.DEFAULT_CHECKPOINT_BYTES,
+        force: bool = False
+) -> Dict[str, Any]:
+    """
+    Потоковая загрузка TSV выгрузки vCenter в vm_metrics через COPY
+
+    Файл загружается блоками по checkpoint_bytes; каждый блок коммитится вместе с контрольной
+    точкой в import_batches, поэтому уже загруженный файл пропускается, а прерванная загрузка
+    продолжается с первого незакоммиченного блока
+
+    Args:
+        file_path: Путь к выгрузке (TSV с колонками VM_Name, vCenter, Timestamp и счетчиками)
+        conn: psycopg2 соединение. Если не указано, берется из пула engine
+        chunk_rows: Количество строк в одной порции
+        rollup: После загрузки пересчитать дневные метрики server_metrics (database/rollup.py)
+        checkpoint_bytes: Размер блока между контрольными точками
+        force: Загрузить заново, даже если файл уже загружен
+
+    Returns:
+        Словарь со статистикой загрузки (success, duplicates, errors, seconds, rows_per_sec, skipped)
+    """
+    # database.rollup импортирует COUNTER_COLUMNS из этого модуля
+    from database import rollup as vm_rollup
+
+    file_path = Path(file_path)
+    usecols = _source_columns(file_path)
+    source = str(file_path)
+
+    own_connection = conn is None
+    if own_connection:
+        conn = engine.raw_connection()
+
+    started = time.perf_counter()
+    try:
+        batch = import_batches.open_file_batch(conn, file_path, target='vm_metrics', source_type='vcenter', force=force)
+        if batch is None:
+            return {'success': 0, 'duplicates': 0, 'errors': 0, 'seconds': 0.0, 'rows_per_sec': 0.0, 'skipped': True}
+
+        blocks = (
+            (_read_block(header + block, usecols, chunk_rows), offset)
+            for header, block, offset in import_batches.iter_line_blocks(
+                file_path, batch['bytes_committed'], checkpoint_bytes)
+        )
+        totals = import_batches.run_batch(
+            conn,
+            batch,
+            blocks,
+            lambda cursor, chunks: _load_block(cursor, chunks, source=source),
+            source=source
+        )
+    finally:
+        if own_connection:
+            conn.close()
+
+    seconds = time.perf_counter() - started
+    rows_per_sec = totals['staged'] / seconds if seconds > 0 else 0.0
+
+    if rollup and totals['success']:
+        vm_rollup.rollup_vm_metrics()
+
+    duplicates = totals['staged'] - totals['success']
+    logger.info(
+        f"Загружено {totals['success']} строк vm_metrics из {source}, дубликатов: {duplicates}, "
+        f"отброшено: {totals['errors']}, {seconds:.2f} с ({rows_per_sec:,.0f} строк/с)"
+    )
+    return {
+        'success': totals['success'],
+        'duplicates': duplicates,
+        'errors': totals['errors'],
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(rows_per_sec, 1),
+        'skipped': False,
+    }
+
+
+def read_vcenter_chunks(file_path: Union[str, Path], chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Чтение выгрузки vCenter порциями с фиксированными типами колонок
+
+    Raises:
+        ValueError: Если в выгрузке нет колонок VM_Name, vCenter или Timestamp
+    """
+    return _read_block(file_path, _source_columns(file_path), chunk_rows)
+
+
+def _source_columns(file_path: Union[str, Path]) -> List[str]:
+    """
+    Проверка заголовка выгрузки и список загружаемых колонок
+
+    Raises:
+        ValueError: Если в выгрузке нет колонок VM_Name, vCenter или Timestamp
+    """
+    header = pd.read_csv(file_path, sep='\t', nrows=0)
+    missing = [col for col in KEY_COLUMNS if col not in header.columns]
+    if missing:
+        raise ValueError(f"Отсутствуют обязательные колонки: {missing}")
+    return [col for col in header.columns if col in SOURCE_DTYPES]
+
+
+def _read_block(source: Union[str, Path, bytes], usecols: List[str], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Порции файла или блока строк с заголовком (bytes)"""
+    return pd.read_csv(
+        io.BytesIO(source) if isinstance(source, bytes) else source,
+        sep='\t',
+        usecols=usecols,
+        dtype={col: SOURCE_DTYPES[col] for col in usecols},
+        chunksize=chunk_rows,
+        engine='c'
+    )
+
+
+def _prepare_chunk(chunk: pd.DataFrame):
+    """
+    Переименование колонок, разбор Timestamp и отбрасывание строк без ключевых полей
+
+    Returns:
+        Кортеж (порция с колонками vm_name, vcenter, timestamp и счетчиками, количество отброшенных строк)
+    """
+    data = chunk.rename(columns={**KEY_COLUMNS, **COUNTER_COLUMNS})
+    # Явный формат и кэш повторяющихся значений: одна метка времени встречается у всех VM
+    data['timestamp'] = pd.to_datetime(data['timestamp'], format=TIMESTAMP_FORMAT, errors='coerce', cache=True)
+    data = data.reindex(columns=TARGET_COLUMNS)
+
+    valid = data['vm_name'].notna() & data['vcenter'].notna() & data['timestamp'].notna()
+    return data[valid], int((~valid).sum())
+
+
+def _encode_names(values: pd.Series, names: Dict[str, int]) -> np.ndarray:
+    """
+    Коды имен для порции; новые имена получают следующий свободный код в names
+    """
+    local_codes, uniques = pd.factorize(values)
+    for name in uniques:
+        names.setdefault(name, len(names))
+    return np.array([names[name] for name in uniques], dtype=np.int32)[local_codes]
+
+
+def _binary_chunk(chunk: pd.DataFrame, names: Dict[str, int]) -> bytes:
+    """
+    Порция в бинарном формате COPY для staging-таблицы (без заголовка и признака конца)
+    """
+    rows = np.empty(len(chunk), dtype=ROW_DTYPE)
+    rows['fields'] = len(STAGE_COLUMNS)
+    rows['vm_code_len'] = 4
+    rows['vm_code'] = _encode_names(chunk['vm_name'], names)
+    rows['vcenter_code_len'] = 4
+    rows['vcenter_code'] = _encode_names(chunk['vcenter'], names)
+    rows['timestamp_len'] = 8
+    rows['timestamp'] = (chunk['timestamp'].to_numpy().astype('datetime64[us]') - PG_EPOCH).astype(np.int64)
+    for column in COUNTERS:
+        rows[f'{column}_len'] = 8
+        rows[column] = chunk[column].to_numpy(dtype=np.float64, na_value=np.nan)
+    return rows.tobytes()
+
+
+def _copy_chunk(cursor, chunk: pd.DataFrame, names: Dict[str, int], stage: str = STAGE_TABLE) -> None:
+    """Копирование одной порции в staging-таблицу"""
+    payload = COPY_BINARY_HEADER + _binary_chunk(chunk, names) + COPY_BINARY_TRAILER
+    cursor.copy_expert(COPY_STAGE_SQL.format(stage=stage), io.BytesIO(payload))
+
+
+def _copy_names(cursor, names: Dict[str, int], names_table: str = NAMES_TABLE) -> None:
+    """Копирование справочника кодов VM и vCenter, накопленного за загрузку"""
+    buffer = io.StringIO()
+    pd.DataFrame({'code': list(names.values()), 'name': list(names.keys())}).to_csv(
+        buffer, index=False, header=False
+    )
+    buffer.seek(0)
+    cursor.copy_expert(COPY_NAMES_SQL.format(names=names_table), buffer)
+
+
+def stage_chunks(
+        cursor,
+        chunks: Iterable[pd.DataFrame],
+        stage: str = STAGE_TABLE,
+        names_table: str = NAMES_TABLE,
+        table_options: Dict[str, str] = TEMP_STAGE,
+        source: str = ''
+) -> Dict[str, Any]:
+    """
+    Создание staging-таблиц и COPY в них всех порций выгрузки
+
+    Args:
+        cursor: psycopg2 курсор
+        chunks: Порции выгрузки (read_vcenter_chunks)
+        stage: Имя staging-таблицы сэмплов
+        names_table: Имя staging-таблицы кодов VM и vCenter
+        table_options: TEMP_STAGE или SHARED_STAGE
+        source: Источник для логов
+
+    Returns:
+        Словарь (staged, errors, first_timestamp, last_timestamp)
+    """
+    cursor.execute(CREATE_STAGE_SQL.format(stage=stage, names=names_table, **table_options))
+
+    result = {'staged': 0, 'errors': 0, 'first_timestamp': None, 'last_timestamp': None}
+    names: Dict[str, int] = {}
+    for chunk in chunks:
+        prepared, rejected = _prepare_chunk(chunk)
+        result['errors'] += rejected
+        if prepared.empty:
+            continue
+        _copy_chunk(cursor, prepared, names, stage=stage)
+        result['staged'] += len(prepared)
+        chunk_first, chunk_last = prepared['timestamp'].min(), prepared['timestamp'].max()
+        if result['first_timestamp'] is None or chunk_first < result['first_timestamp']:
+            result['first_timestamp'] = chunk_first
+        if result['last_timestamp'] is None or chunk_last > result['last_timestamp']:
+            result['last_timestamp'] = chunk_last
+        logger.debug(f"COPY порции: {len(prepared)} строк ({source})")
+
+    _copy_names(cursor, names, names_table=names_table)
+    return result
+
+
+def merge_stage(cursor, stage: str = STAGE_TABLE, names_table: str = NAMES_TABLE) -> int:
+    """
+    Добавление строк staging-таблицы в vm_metrics (партиции должны уже существовать)
+
+    Returns:
+        Количество добавленных строк (без пропущенных дубликатов)
+    """
+    cursor.execute(MERGE_STAGE_SQL.format(stage=stage, names=names_table))
+    return cursor.rowcount
+
+
+def _load_block(cursor, chunks: Iterable[pd.DataFrame], source: str = '') -> Dict[str, Any]:
+    """
+    Загрузка блока в staging-таблицу и добавление новых строк в vm_metrics (без коммита)
+
+    Returns:
+        Словарь (staged, success, errors, first_timestamp, last_timestamp)
+    """
+    # database.rollup импортирует COUNTER_COLUMNS из этого модуля
+    from database import rollup as vm_rollup
+
+    result = stage_chunks(cursor, chunks, source=source)
+    result['success'] = 0
+
+    if result['staged']:
+        # Партиции создаются отдельным соединением до слияния, как в database/ingest.py
+        with engine.begin() as ddl_conn:
+            ensure_partitions(ddl_conn, 'vm_metrics', result['first_timestamp'], result['last_timestamp'])
+
+        result['success'] = merge_stage(cursor)
+        if result['success']:
+            # Сэмплы старше отметки агрегации будут учтены следующим запуском
+            vm_rollup.rewind_watermark(cursor, result['first_timestamp'].to_pydatetime())
+
+    # Staging-таблицы удаляются при коммите блока (ON COMMIT DROP)
+    return result
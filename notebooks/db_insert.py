@@ -3,10 +3,10 @@ import pandas as pd
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 import logging
-from datetime import datetime
-import uuid
-from tqdm import tqdm
 from base_logger import logger
+from database.ingest import ingest_dataframe
+from database.normalize import METRIC_COLUMNS, check_columns, normalize_metrics, reject_counts
+from database.source_cache import read_source
 
 
 # Конфигурация базы данных
@@ -23,14 +23,10 @@ def read_excel_file(file_path):
     """Чтение данных из Excel файла"""
     try:
         # Читаем Excel файл
-        df = pd.read_excel(file_path, sheet_name=0)  # sheet_name=0 для первого листа
+        df = read_source(file_path)  # первый лист, повторные чтения из кэша Feather
 
         # Проверяем наличие необходимых колонок
-        required_columns = ['vm', 'date', 'metric', 'max_value', 'min_value', 'avg_value']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-
-        if missing_columns:
-            raise ValueError(f"Отсутствуют необходимые колонки: {missing_columns}")
+        check_columns(df.columns, required=METRIC_COLUMNS)
 
         logger.info(f"Успешно прочитан файл: {file_path}")
         logger.info(f"Количество строк: {len(df)}")
@@ -44,41 +40,12 @@ def read_excel_file(file_path):
 
 
 def prepare_data(df):
-    """Подготовка данных для вставки"""
+    """Подготовка данных для вставки (id и created_at заполняет БД)"""
     try:
-        # Создаем копию данных
-        data = df.copy()
-
-        # Преобразуем дату в формат datetime
-        data['date'] = pd.to_datetime(data['date'], errors='coerce')
-
-        # Проверяем корректность преобразования дат
-        invalid_dates = data['date'].isna().sum()
-        if invalid_dates > 0:
-            logger.warning(f"Найдено {invalid_dates} некорректных дат")
-
-        # Преобразуем числовые колонки
-        numeric_columns = ['max_value', 'min_value', 'avg_value']
-        for col in numeric_columns:
-            data[col] = pd.to_numeric(data[col], errors='coerce')
-
-        # Генерируем UUID для каждой строки
-        data['id'] = [str(uuid.uuid4()) for _ in range(len(data))]
-
-        # Добавляем created_at
-        data['created_at'] = datetime.now()
+        data, rejects = normalize_metrics(df)
 
-        # Выбираем только необходимые колонки в правильном порядке
-        final_columns = ['id', 'vm', 'date', 'metric', 'max_value', 'min_value', 'avg_value', 'created_at']
-        data = data[final_columns]
-
-        # Удаляем строки с NaN значениями в ключевых полях
-        original_count = len(data)
-        data = data.dropna(subset=['vm', 'date', 'metric'])
-        removed_count = original_count - len(data)
-
-        if removed_count > 0:
-            logger.warning(f"Удалено {removed_count} строк с отсутствующими ключевыми значениями")
+        if len(rejects):
+            logger.warning(f"Отклонено {len(rejects)} строк: {reject_counts(rejects)}")
 
         logger.info(f"Подготовлено {len(data)} строк для вставки")
 
@@ -97,22 +64,11 @@ def insert_data(df: pd.DataFrame):
         port=DB_CONFIG['port'],
         password=DB_CONFIG['password']
     )
-    cur = connection.cursor()
-    for i in tqdm(range(len(df))):
-        row = list(df.iloc[i])
-        # date and created_date
-        row[2] = str(row[2])
-        row[-1] = str(row[-1])
-        row = tuple(row)
-        query = f"INSERT INTO server_metrics (id, vm, date, metric, max_value, min_value, avg_value, created_at) \n" \
-                f"VALUES {row}"
-        try:
-            cur.execute(query)
-            connection.commit()
-        except Exception as e:
-            logger.info(f"Ошибка в ставке данных: {row}, {e}")
-
-    cur.close()
+    try:
+        ingest_dataframe(df, conn=connection)
+    except Exception as e:
+        logger.error(f"Ошибка вставки данных: {e}")
+
     connection.close()
     return
 
@@ -1,6 +1,5 @@
 from uuid import UUID
 from datetime import datetime
-from decimal import Decimal
 from pydantic import BaseModel, Field
 
 
@@ -13,9 +12,9 @@ class ServerMetrics(BaseModel):
     date: datetime
     vm: str = Field(..., min_length=1, max_length=100)
     metric: str = Field(..., min_length=1, max_length=100)
-    max_value: Decimal = Field(..., ge=0, max_digits=10, decimal_places=5)
-    min_value: Decimal = Field(..., ge=0, max_digits=10, decimal_places=5)
-    avg_value: Decimal = Field(..., ge=0, max_digits=10, decimal_places=5)
+    max_value: float = Field(..., ge=0)
+    min_value: float = Field(..., ge=0)
+    avg_value: float = Field(..., ge=0)
     created_at: datetime
 
     class Config:
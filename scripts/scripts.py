@@ -10,12 +10,6 @@ INSERT_SQL = """
         updated_at = CURRENT_TIMESTAMP
     """
 
-# SQL для логирования импорта
-LOG_SQL = """
-    INSERT INTO data_import_log (source_type, records_count, status)
-    VALUES (%s, %s, %s)
-"""
-
 # Базовый SQL запрос
 BASE_SQL = """
 SELECT 
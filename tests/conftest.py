@@ -0,0 +1,44 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import partitions
+from database.models import Base
+
+# Тесты репозитория проверяют ON CONFLICT, партиции и INCLUDE индексы, поэтому идут на PostgreSQL.
+# База пересоздается на каждый тест: не указывайте здесь рабочую базу
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.fixture(scope="session")
+def pg_engine():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL не задан")
+
+    engine = create_engine(TEST_DATABASE_URL)
+    try:
+        engine.connect().close()
+    except OperationalError as e:
+        pytest.skip(f"PostgreSQL недоступен: {e}")
+
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def pg_session(pg_engine, monkeypatch):
+    # Кэш партиций процесса относится к прошлой схеме
+    monkeypatch.setattr(partitions, "_known_partitions", set())
+    monkeypatch.setattr(partitions, "_partitioned_tables", {})
+
+    Base.metadata.drop_all(pg_engine)
+    Base.metadata.create_all(pg_engine)
+    session = sessionmaker(bind=pg_engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(pg_engine)
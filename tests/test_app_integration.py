@@ -28,6 +28,11 @@ def sample_metrics() -> pd.DataFrame:
 def stub_external_dependencies(monkeypatch, sample_metrics):
     """Stub auth and data loading so the app renders in tests."""
     monkeypatch.setattr("database.repository.get_metrics_from_db", lambda **_: sample_metrics.copy())
+    monkeypatch.setattr(
+        "database.repository.get_date_range_from_db",
+        lambda: {"min_date": sample_metrics["date"].min(), "max_date": sample_metrics["date"].max()},
+    )
+    monkeypatch.setattr("database.repository.get_servers_from_db", lambda: sorted(sample_metrics["vm"].unique()))
     monkeypatch.setattr("app.auth.check_auth", lambda: True)
     monkeypatch.setattr("app.auth.has_role", lambda roles: True)
     monkeypatch.setattr(
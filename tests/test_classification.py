@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from app.classification import classify_metrics, metric_group
+
+
+def test_metric_group_requires_usage_in_name():
+    assert metric_group("CPU.Usage.Average") == "CPU"
+    assert metric_group("mem.usage.max") == "Память"
+    assert metric_group("disk.usage.average") == "Диск"
+    assert metric_group("net.usage.average") == "Сеть"
+    assert metric_group("cpu.ready.summation") == "Другое"
+    assert metric_group(None) == "Другое"
+
+
+def test_classify_metrics_uses_thresholds_per_group():
+    df = pd.DataFrame({
+        "metric": ["cpu.usage.average"] * 4 + ["mem.usage.average"] * 3 + ["disk.usage.average", None],
+        "avg_value": [19.9, 20.0, 70.0, np.nan, 29.0, 79.0, 80.0, 99.0, 5.0],
+    })
+
+    result = classify_metrics(df)
+
+    assert result["load_category"].tolist() == [
+        "Низкая", "Нормальная", "Высокая", "Нет данных",
+        "Низкая", "Нормальная", "Высокая",
+        "Нормальная", "Нормальная",
+    ]
+    assert result["metric_group"].tolist() == ["CPU"] * 4 + ["Память"] * 3 + ["Диск", "Другое"]
+
+
+def test_classify_metrics_accepts_categorical_metric_and_nullable_values():
+    df = pd.DataFrame({
+        "metric": pd.Categorical(["cpu.usage.average", "mem.usage.average"]),
+        "avg_value": pd.array([None, 85.0], dtype="Float64"),
+    })
+
+    assert classify_metrics(df)["load_category"].tolist() == ["Нет данных", "Высокая"]
@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from database import connection
+from database.connection import InstrumentedQueuePool, get_engine
+
+
+def make_pool(pool_size=1, max_overflow=1):
+    return InstrumentedQueuePool(
+        lambda: sqlite3.connect(":memory:", check_same_thread=False),
+        pool_size=pool_size, max_overflow=max_overflow, timeout=5
+    )
+
+
+def test_stats_count_checkouts_and_capacity():
+    pool = make_pool(pool_size=1, max_overflow=2)
+    first, second = pool.connect(), pool.connect()
+
+    stats = pool.stats()
+    assert stats["max_size"] == 3
+    assert stats["checked_out"] == 2
+    assert stats["checkouts"] == 2
+    assert stats["waits"] == 0
+
+    first.close()
+    second.close()
+    assert pool.stats()["checked_out"] == 0
+
+
+def test_stats_record_wait_when_pool_exhausted():
+    pool = make_pool(pool_size=1, max_overflow=0)
+    held = pool.connect()
+
+    def release():
+        time.sleep(0.2)
+        held.close()
+
+    threading.Thread(target=release).start()
+    pool.connect().close()
+
+    stats = pool.stats()
+    assert stats["waits"] == 1
+    assert stats["wait_seconds"] >= 0.1
+
+
+def test_recreate_keeps_counters():
+    pool = make_pool()
+    pool.connect().close()
+
+    assert pool.recreate().stats()["checkouts"] == 1
+
+
+def test_query_timing_logs_slow_queries(monkeypatch, caplog):
+    monkeypatch.setattr(connection, "SLOW_QUERY_MS", 0)
+    engine = create_engine("sqlite://")
+    connection._add_query_timing(engine, "bulk")
+
+    with caplog.at_level("WARNING", logger="server_analysis"), engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        try:
+            conn.execute(text("SELECT * FROM missing_table"))
+        except Exception:
+            pass
+        assert conn.info["query_started"] == []
+
+    assert "[bulk] Медленный запрос" in caplog.text
+    assert "SELECT 1" in caplog.text
+
+
+def test_get_engine_rejects_unknown_profile():
+    with pytest.raises(ValueError):
+        get_engine("reporting")
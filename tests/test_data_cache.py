@@ -0,0 +1,96 @@
+import pandas as pd
+
+from app.data_cache import DataCache, VersionToken
+
+
+def frame(rows=3):
+    return pd.DataFrame({"vm": ["srv-1"] * rows, "avg_value": range(rows)})
+
+
+class Loader:
+    def __init__(self, df):
+        self.df = df
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.df
+
+
+def test_hit_until_version_changes():
+    cache = DataCache()
+    loader = Loader(frame())
+
+    first = cache.get_or_load(("db", None), 1, loader)
+    second = cache.get_or_load(("db", None), 1, loader)
+    assert loader.calls == 1
+    assert second.equals(first)
+
+    cache.get_or_load(("db", None), 2, loader)
+    assert loader.calls == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_returned_frame_does_not_change_cache():
+    cache = DataCache()
+    loader = Loader(frame())
+
+    df = cache.get_or_load("key", 1, loader)
+    df["extra"] = 1
+
+    assert "extra" not in cache.get_or_load("key", 1, loader).columns
+
+
+def test_unknown_version_and_empty_frames_are_not_cached():
+    cache = DataCache()
+    loader = Loader(frame())
+    empty = Loader(pd.DataFrame())
+
+    cache.get_or_load("key", None, loader)
+    cache.get_or_load("key", None, loader)
+    cache.get_or_load("empty", 1, empty)
+    cache.get_or_load("empty", 1, empty)
+
+    assert loader.calls == 2
+    assert empty.calls == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = DataCache(max_entries=2)
+    for key in ("a", "b"):
+        cache.get_or_load(key, 1, Loader(frame()))
+    cache.get_or_load("a", 1, Loader(frame()))
+    cache.get_or_load("c", 1, Loader(frame()))
+
+    assert list(cache._entries) == ["a", "c"]
+    assert cache.stats()["evictions"] == 1
+
+    size = int(frame().memory_usage(deep=True).sum())
+    cache = DataCache(max_entries=10, max_bytes=size * 2)
+    for key in ("a", "b", "c"):
+        cache.get_or_load(key, 1, Loader(frame()))
+    assert list(cache._entries) == ["b", "c"]
+
+    cache.get_or_load("big", 1, Loader(frame(1000)))
+    assert "big" not in cache._entries
+
+
+def test_version_token_throttles_and_hides_errors():
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        if len(calls) > 1:
+            raise RuntimeError("БД недоступна")
+        return "v1"
+
+    token = VersionToken(fetch, ttl=60)
+    assert token() == "v1"
+    assert token() == "v1"
+    assert len(calls) == 1
+
+    token.ttl = 0
+    assert token() is None
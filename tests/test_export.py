@@ -0,0 +1,167 @@
+import gzip
+import io
+import re
+from datetime import date, datetime, timezone
+
+import pytest
+
+from database import export
+from database.models import ServerMetrics
+
+
+class FakeCursor:
+    """psycopg2-like cursor: COPY writes prepared CSV lines in small pieces, fetchmany pages rows."""
+
+    def __init__(self, rows, summary=()):
+        self.rows = rows
+        self.summary = list(summary)
+        self.executed = []
+        self.rowcount = -1
+
+    def mogrify(self, sql, params):
+        return (sql.replace("%s", "{!r}").format(*params)).encode()
+
+    def copy_expert(self, sql, file):
+        self.executed.append(sql)
+        file.write(b"vm,date\n")
+        for vm, day, *_ in self.rows:
+            file.write(f"{vm},{day.isoformat()}\n".encode())
+        self.rowcount = len(self.rows)
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+        self.position = 0
+
+    def fetchmany(self, size):
+        chunk = self.rows[self.position:self.position + size]
+        self.position += size
+        return chunk
+
+    def __iter__(self):
+        return iter(self.summary)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows, summary=()):
+        self.cursor_obj = FakeCursor(rows, summary)
+        self.log = []
+
+    def cursor(self, name=None):
+        self.log.append(("cursor", name))
+        return self.cursor_obj
+
+    def commit(self):
+        self.log.append("commit")
+
+    def rollback(self):
+        self.log.append("rollback")
+
+    def close(self):
+        self.log.append("close")
+
+
+class FakeEngine:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def raw_connection(self):
+        return self.conn
+
+
+ROWS = [
+    ("srv-1", datetime(2025, 1, i, tzinfo=timezone.utc), "cpu.usage.average", 3.0, 1.0, 2.0,
+     datetime(2025, 2, 1, tzinfo=timezone.utc))
+    for i in range(1, 6)
+]
+
+
+def test_export_selects_only_model_columns():
+    # Выгрузка должна работать и на схеме create_all, и на схеме миграций
+    for sql in (export.EXPORT_SELECT_SQL, export.EXCEL_SELECT_SQL):
+        assert set(re.findall(r"\bsm\.(\w+)", sql)) <= set(ServerMetrics.__table__.c.keys())
+
+
+def test_build_filters_makes_end_date_inclusive():
+    where, params = export.build_filters({"vm": "srv-1", "end_date": date(2025, 1, 31), "metric": "cpu"})
+
+    assert where == " WHERE TRUE AND v.name = %s AND sm.date < %s::date + 1 AND m.name LIKE %s"
+    assert params == ["srv-1", date(2025, 1, 31), "%cpu%"]
+    assert export.build_filters(None) == (" WHERE TRUE", [])
+
+
+def test_build_filters_accepts_server_list():
+    where, params = export.build_filters({"vm": ("srv-1", "srv-2"), "start_date": date(2025, 1, 1)})
+
+    assert where == " WHERE TRUE AND v.name = ANY(%s) AND sm.date >= %s"
+    assert params == [["srv-1", "srv-2"], date(2025, 1, 1)]
+    assert export.build_filters({"vm": []}) == (" WHERE TRUE", [])
+
+
+def test_csv_export_streams_copy_into_gzip_spool(monkeypatch):
+    conn = FakeConnection(ROWS)
+    monkeypatch.setattr(export, "engine", FakeEngine(conn))
+
+    result = export.export_metrics({"vm": "srv-1"}, fmt="csv.gz")
+
+    with result["file"] as f:
+        lines = gzip.decompress(f.read()).decode().splitlines()
+    assert lines[0] == "vm,date" and len(lines) == 6
+    assert result["rows"] == 5
+    assert result["file_name"].endswith(".csv.gz")
+    assert conn.cursor_obj.executed[0].startswith("COPY (")
+    assert "v.name = 'srv-1'" in conn.cursor_obj.executed[0]
+    assert conn.log[-2:] == ["commit", "close"]
+
+
+@pytest.mark.skipif(not export.PYARROW_AVAILABLE, reason="pyarrow не установлен")
+def test_parquet_export_writes_row_group_per_chunk(monkeypatch):
+    import pyarrow.parquet as pq
+
+    conn = FakeConnection(ROWS)
+    monkeypatch.setattr(export, "engine", FakeEngine(conn))
+    monkeypatch.setattr(export, "PARQUET_CHUNK_ROWS", 2)
+
+    result = export.export_metrics(fmt="parquet")
+
+    with result["file"] as f:
+        parquet = pq.ParquetFile(io.BytesIO(f.read()))
+    assert parquet.metadata.num_rows == 5
+    assert parquet.metadata.num_row_groups == 3
+    assert parquet.schema_arrow.names == export.EXPORT_COLUMNS
+    assert conn.log[0] == ("cursor", "export_metrics")
+
+
+@pytest.mark.skipif(not export.OPENPYXL_AVAILABLE, reason="openpyxl не установлен")
+def test_excel_export_splits_sheets_and_adds_sql_summary(monkeypatch):
+    from openpyxl import load_workbook
+
+    naive = [(vm, day.replace(tzinfo=None), metric, *values, updated.replace(tzinfo=None))
+             for vm, day, metric, *values, updated in ROWS]
+    summary = [("srv-1", 2.0, 2.0, 2.0, 5, None, None, None, 0, "Низкая", "Нормальная")]
+    conn = FakeConnection(naive, summary)
+    monkeypatch.setattr(export, "engine", FakeEngine(conn))
+    monkeypatch.setattr(export, "EXCEL_MAX_ROWS", 3)
+    monkeypatch.setattr(export, "EXCEL_CHUNK_ROWS", 2)
+
+    result = export.export_metrics(fmt="xlsx")
+
+    with result["file"] as f:
+        workbook = load_workbook(f, read_only=True)
+        assert workbook.sheetnames == ["Metrics", "Metrics_2", "Metrics_3", "Summary"]
+        metrics = [row for name in workbook.sheetnames[:3] for row in workbook[name].iter_rows(values_only=True)]
+        summary_rows = list(workbook["Summary"].iter_rows(values_only=True))
+
+    assert [row for row in metrics if row[0] != "vm"][0][:2] == ("srv-1", datetime(2025, 1, 1))
+    assert len(metrics) == 5 + 3
+    assert summary_rows[0] == tuple(export.SUMMARY_COLUMNS)
+    assert summary_rows[1][-2:] == ("Низкая", "Нормальная")
+    assert result["rows"] == 5
+    assert "GROUP BY v.name" in conn.cursor_obj.executed[-1]
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        export.export_metrics(fmt="xml")
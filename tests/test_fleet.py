@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Модули дашборда импортируют друг друга по имени, как при запуске streamlit из app/
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from classification import classify_metrics
+from fleet import fleet_summary
+
+
+@pytest.fixture
+def metrics():
+    df = pd.DataFrame({
+        "vm": ["srv-2", "srv-2", "srv-2", "srv-1", "srv-1", "srv-1", "srv-3"],
+        "date": pd.to_datetime(["2025-01-01", "2025-01-02", "2025-01-01", "2025-01-01", "2025-01-01", "2025-01-02",
+                                "2025-01-01"]),
+        "metric": ["cpu.usage.average", "cpu.usage.average", "mem.usage.average", "cpu.usage.average",
+                   "mem.usage.average", "cpu.usage.max", "disk.usage.average"],
+        "avg_value": [10.0, 15.0, 20.0, 75.0, 85.0, np.nan, 5.0],
+    }).astype({"vm": "category", "metric": "category"})
+    return classify_metrics(df)
+
+
+def test_fleet_summary_has_one_row_per_server(metrics):
+    fleet = fleet_summary(metrics)
+
+    assert fleet.index.tolist() == ["srv-1", "srv-2", "srv-3"]
+    assert fleet.loc["srv-2", "cpu_avg"] == 12.5
+    assert fleet.loc["srv-2", "cpu_max"] == 15.0
+    assert fleet.loc["srv-2", "cpu_count"] == 2
+    assert fleet.loc["srv-3", "disk_avg"] == 5.0
+    assert fleet.loc["srv-3", "cpu_count"] == 0
+    assert np.isnan(fleet.loc["srv-3", "cpu_avg"])
+
+
+def test_fleet_summary_categories_and_recommendation(metrics):
+    fleet = fleet_summary(metrics)
+
+    assert fleet["cpu_category"].astype(str).tolist() == ["Высокая", "Низкая", "Нет данных"]
+    assert fleet["recommendation"].tolist() == [
+        "Требуется масштабирование", "Возможна консолидация", "Нормальная работа",
+    ]
+    # cpu.usage.max без значения попадает в группу CPU как 'Нет данных' и не считается
+    assert fleet.loc["srv-1", ["cpu_low_rows", "cpu_normal_rows", "cpu_high_rows"]].tolist() == [0, 0, 1]
+
+
+def test_fleet_summary_classifies_raw_frame_and_handles_empty(metrics):
+    raw = metrics.drop(columns=["metric_group", "load_category"])
+
+    pd.testing.assert_frame_equal(fleet_summary(raw), fleet_summary(metrics))
+    assert fleet_summary(metrics.iloc[:0]).empty
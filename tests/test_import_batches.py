@@ -0,0 +1,113 @@
+import pandas as pd
+import pytest
+
+from database import import_batches
+
+
+class FakeConnection:
+    """Records executed statements and transaction boundaries."""
+
+    def __init__(self):
+        self.log = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        self.log.append((sql, params))
+
+    def commit(self):
+        self.log.append("commit")
+
+    def rollback(self):
+        self.log.append("rollback")
+
+    def close(self):
+        pass
+
+    def statements(self):
+        return [entry if entry in ("commit", "rollback") else entry[0] for entry in self.log]
+
+
+class FailingStartConnection(FakeConnection):
+    """Takes the advisory lock, then fails on START_BATCH_SQL."""
+
+    results = {import_batches.OPEN_BATCH_SQL: (7,), import_batches.LOCK_BATCH_SQL: (True,),
+               import_batches.BATCH_STATE_SQL: ("failed", 0, 0)}
+
+    def execute(self, sql, params=None):
+        super().execute(sql, params)
+        self.last = sql
+        if sql == import_batches.START_BATCH_SQL:
+            raise RuntimeError("statement timeout")
+
+    def fetchone(self):
+        return self.results[self.last]
+
+
+def test_begin_batch_releases_lock_when_start_fails():
+    conn = FailingStartConnection()
+
+    with pytest.raises(RuntimeError, match="statement timeout"):
+        import_batches.begin_batch(conn, "a.txt", "hash", target="vm_metrics", source_type="vcenter")
+
+    assert conn.statements()[-3:] == ["rollback", import_batches.UNLOCK_BATCH_SQL, "commit"]
+    assert conn.log[-2][1] == {"id": 7}
+
+
+def test_iter_line_blocks_yields_whole_lines_and_resumes_from_offset(tmp_path):
+    path = tmp_path / "export.tsv"
+    path.write_bytes(b"a\tb\n" + b"".join(f"{i}\t{i * 2}\n".encode() for i in range(100)))
+
+    blocks = list(import_batches.iter_line_blocks(path, block_bytes=64))
+
+    assert all(header == b"a\tb\n" and block.endswith(b"\n") for header, block, _ in blocks)
+    assert b"".join(block for _, block, _ in blocks) == path.read_bytes()[4:]
+    assert blocks[-1][2] == path.stat().st_size
+
+    resumed = list(import_batches.iter_line_blocks(path, start_offset=blocks[1][2], block_bytes=64))
+    assert [block for _, block, _ in resumed] == [block for _, block, _ in blocks[2:]]
+
+
+def test_dataframe_digest_depends_on_values_not_index():
+    df = pd.DataFrame({"vm": ["srv-1", "srv-2"], "avg_value": [1.0, 2.0]})
+
+    assert import_batches.dataframe_digest(df) == import_batches.dataframe_digest(df.set_axis([5, 6]))
+    assert import_batches.dataframe_digest(df) != import_batches.dataframe_digest(df.assign(avg_value=[1.0, 3.0]))
+
+
+def test_run_batch_checkpoints_each_block_in_its_transaction():
+    conn = FakeConnection()
+
+    def load_block(cursor, rows):
+        cursor.execute("LOAD", rows)
+        return {"staged": len(rows), "success": len(rows) - 1, "errors": 1}
+
+    totals = import_batches.run_batch(conn, {"id": 7}, [([1, 2], 10), ([3, 4, 5], 20)], load_block)
+
+    assert totals == {"staged": 5, "success": 3, "errors": 2, "reject_reasons": {}}
+    assert conn.statements() == [
+        "LOAD", import_batches.CHECKPOINT_SQL, "commit",
+        "LOAD", import_batches.CHECKPOINT_SQL, "commit",
+        import_batches.FINISH_BATCH_SQL, import_batches.UNLOCK_BATCH_SQL, "commit",
+    ]
+    checkpoint = conn.log[4][1]
+    assert checkpoint["bytes_committed"] == 20
+    assert checkpoint["rows_read"] == 4 and checkpoint["rows_loaded"] == 2 and checkpoint["rows_rejected"] == 1
+
+
+def test_run_batch_keeps_committed_blocks_and_marks_failure():
+    conn = FakeConnection()
+
+    def load_block(cursor, rows):
+        if rows == "bad":
+            raise ValueError("broken block")
+        return {"staged": 1, "success": 1, "errors": 0}
+
+    with pytest.raises(ValueError):
+        import_batches.run_batch(conn, {"id": 7}, [("ok", 10), ("bad", 20)], load_block)
+
+    assert conn.statements()[-5:] == [
+        "commit", "rollback", import_batches.FINISH_BATCH_SQL, import_batches.UNLOCK_BATCH_SQL, "commit",
+    ]
+    assert conn.log[-3][1] == {"id": 7, "status": "failed", "error": "broken block"}
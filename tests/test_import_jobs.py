@@ -0,0 +1,63 @@
+import pandas as pd
+
+from database import import_jobs, ingest
+
+
+class FakeEngine:
+    def __init__(self):
+        self.executed = []
+
+    def begin(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        self.executed.append((str(statement), params))
+
+
+def statuses(engine):
+    return [params.get("status") for _, params in engine.executed if params and "status" in params]
+
+
+def test_run_job_reports_progress_and_removes_upload(tmp_path, monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(import_jobs, "engine", engine)
+
+    path = tmp_path / "job.csv"
+    pd.DataFrame({
+        "vm": ["vm-1", "vm-1"], "date": ["2025-01-01", "2025-01-02"], "metric": ["cpu", "cpu"],
+        "max_value": [2.0, 3.0], "min_value": [1.0, 1.0], "avg_value": [1.5, 2.0],
+    }).to_csv(path, index=False)
+
+    def fake_ingest(df, source, source_type, source_hash, on_block):
+        on_block({"staged": 2, "success": 2, "errors": 0})
+        return {"skipped": False, "batch_id": 7}
+
+    monkeypatch.setattr(ingest, "ingest_dataframe", fake_ingest)
+
+    import_jobs._run_job("job-1", path, "metrics.csv", "csv")
+
+    progress = [params for _, params in engine.executed if params and "rows_done" in params]
+    assert progress == [{"id": "job-1", "rows_done": 2, "rows_loaded": 2, "rows_rejected": 0}]
+    assert engine.executed[0][1] == {"id": "job-1", "rows_total": 2}
+    assert engine.executed[-1][1] == {"id": "job-1", "status": "completed", "batch_id": 7, "error": None}
+    assert not path.exists()
+
+
+def test_run_job_marks_failure_on_missing_columns(tmp_path, monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(import_jobs, "engine", engine)
+
+    path = tmp_path / "job.csv"
+    pd.DataFrame({"vm": ["vm-1"], "date": ["2025-01-01"]}).to_csv(path, index=False)
+
+    import_jobs._run_job("job-2", path, "broken.csv", "csv")
+
+    assert statuses(engine) == ["failed"]
+    assert "Отсутствуют обязательные колонки" in engine.executed[-1][1]["error"]
+    assert not path.exists()
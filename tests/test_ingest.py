@@ -0,0 +1,54 @@
+import pandas as pd
+
+from database import ingest
+from database.models import ServerMetrics
+
+
+class RecordingCursor:
+    """Collects COPY payloads instead of sending them to PostgreSQL."""
+
+    def __init__(self):
+        self.copied = []
+
+    def copy_expert(self, sql, buffer):
+        self.copied.append((sql, buffer.read()))
+
+
+def test_prepare_chunk_coerces_types_and_drops_rows_without_keys():
+    chunk = pd.DataFrame(
+        [
+            {"vm": "srv-1", "date": "2025-01-01", "metric": "cpu.usage.average", "avg_value": "12.5"},
+            {"vm": "srv-1", "date": "bad", "metric": "cpu.usage.average", "avg_value": 1},
+            {"vm": None, "date": "2025-01-01", "metric": "cpu.usage.average", "avg_value": 1},
+        ]
+    )
+
+    prepared, rejects = ingest._prepare_chunk(chunk)
+
+    assert rejects["reject_reason"].tolist() == ["invalid date", "vm is empty"]
+    assert list(prepared.columns) == ingest.STAGE_COLUMNS
+    assert prepared.iloc[0]["avg_value"] == 12.5
+    assert pd.isna(prepared.iloc[0]["max_value"])
+
+
+def test_copy_chunk_writes_csv_with_nulls_for_missing_values():
+    prepared, _ = ingest._prepare_chunk(
+        pd.DataFrame([{"vm": "srv,1", "date": "2025-01-01", "metric": "mem.usage.average", "avg_value": 3}])
+    )
+    cursor = RecordingCursor()
+
+    ingest._copy_chunk(cursor, prepared)
+
+    sql, payload = cursor.copied[0]
+    assert sql == ingest.COPY_STAGE_SQL
+    assert payload == '"srv,1",2025-01-01 00:00:00,mem.usage.average,,,3\n'
+
+
+def test_merge_keys_rows_by_day_and_marks_updates():
+    sql = " ".join(ingest.MERGE_STAGE_SQL.split())
+
+    assert "date_trunc('day', date) AS day" in sql
+    assert "DISTINCT ON (vm, day, metric)" in sql
+    assert sql.endswith("updated_at = now()")
+    # create_all и миграции должны давать одну схему: колонка объявлена в модели
+    assert "updated_at" in ServerMetrics.__table__.c
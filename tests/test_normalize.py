@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from database import normalize
+
+
+def test_normalize_metrics_coerces_columns_and_reports_every_reason():
+    df = pd.DataFrame(
+        [
+            {"vm": " srv-1 ", "date": "2025-01-01", "metric": "cpu.usage.average", "avg_value": "12.5"},
+            {"vm": "srv-1", "date": "2025-01-02", "metric": "cpu.usage.average", "avg_value": 3},
+            {"vm": "  ", "date": "bad", "metric": "cpu.usage.average", "avg_value": 1},
+            {"vm": "srv-2", "date": "2025-01-01", "metric": None, "avg_value": "n/a"},
+        ]
+    )
+
+    valid, rejects = normalize.normalize_metrics(df)
+
+    assert list(valid.columns) == normalize.METRIC_COLUMNS
+    assert valid["vm"].tolist() == ["srv-1", "srv-1"]
+    assert valid["avg_value"].tolist() == [12.5, 3.0]
+    assert valid["max_value"].isna().all()
+    assert rejects.index.tolist() == [2, 3]
+    assert rejects["reject_reason"].tolist() == [
+        "vm is empty; invalid date",
+        "metric is empty; avg_value is not numeric",
+    ]
+    assert normalize.reject_counts(rejects) == {
+        "vm is empty": 1, "invalid date": 1, "metric is empty": 1, "avg_value is not numeric": 1,
+    }
+
+
+def test_normalize_metrics_keeps_missing_values_and_datetime_columns():
+    df = pd.DataFrame({
+        "vm": ["a", "b"],
+        "date": pd.to_datetime(["2025-01-01", "2025-01-02"]),
+        "metric": ["m", "m"],
+        "avg_value": [np.nan, 2.0],
+    })
+
+    valid, rejects = normalize.normalize_metrics(df)
+
+    assert rejects.empty and "reject_reason" in rejects.columns
+    assert len(valid) == 2
+    assert valid["date"].dtype == df["date"].dtype
+
+
+def test_normalize_metrics_parses_mixed_date_formats():
+    df = pd.DataFrame({
+        "vm": ["a", "a", "a"],
+        "date": ["2025-01-01 10:00", "2025-01-02", "bad"],
+        "metric": ["m", "m", "m"],
+        "avg_value": [1, 2, 3],
+    })
+
+    valid, rejects = normalize.normalize_metrics(df)
+
+    assert valid["date"].tolist() == [pd.Timestamp("2025-01-01 10:00"), pd.Timestamp("2025-01-02")]
+    assert rejects["reject_reason"].tolist() == ["invalid date"]
+
+
+def test_check_columns_raises_with_missing_names():
+    with pytest.raises(ValueError, match="avg_value"):
+        normalize.check_columns(["vm", "date", "metric"])
@@ -0,0 +1,70 @@
+from database import import_batches, parallel_ingest
+
+
+def test_resolve_files_accepts_directory_and_glob(tmp_path):
+    for name in ("b.txt", "a.txt", "notes.md"):
+        (tmp_path / name).write_text("")
+    (tmp_path / "nested.txt").mkdir()
+
+    assert parallel_ingest.resolve_files(str(tmp_path)) == [tmp_path / "a.txt", tmp_path / "b.txt"]
+    assert parallel_ingest.resolve_files(str(tmp_path), pattern="*.md") == [tmp_path / "notes.md"]
+    assert parallel_ingest.resolve_files(str(tmp_path / "b*")) == [tmp_path / "b.txt"]
+
+
+def test_main_fails_when_no_files_match(tmp_path):
+    assert parallel_ingest.main([str(tmp_path / "*.txt")]) == 1
+
+
+def test_main_reports_files_and_fails_when_merge_raises(tmp_path, monkeypatch, capsys):
+    (tmp_path / "a.txt").write_text("")
+
+    def failing_merge(reports, *args):
+        for report in reports:
+            report.update(status="failed", message="merge aborted")
+        raise RuntimeError("merge aborted")
+
+    monkeypatch.setattr(parallel_ingest, "_ingest_reports", failing_merge)
+
+    assert parallel_ingest.main([str(tmp_path), "--workers", "1"]) == 1
+    output = capsys.readouterr().out
+    assert "a.txt" in output and "merge aborted" in output
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+def test_merge_fails_file_whose_rows_were_all_rejected(monkeypatch):
+    finished = []
+    monkeypatch.setattr(import_batches, "finish_batch", lambda cursor, batch_id, status, *args: finished.append(status))
+    report = {"file": "/data/a.txt", "stage": "s", "names_table": "n", "batch_id": 1, "status": "staged",
+              "staged": 0, "success": 0, "duplicates": 0, "errors": 600, "seconds": 0.1, "message": ""}
+    conn = RecordingConnection()
+
+    parallel_ingest._merge_staged(conn, cursor=None, reports=[report], vm_rollup=None)
+
+    assert report["status"] == "failed"
+    assert "600" in report["message"]
+    assert import_batches.STATUS_COMPLETED not in finished
+    assert conn.commits == 1
+
+
+def test_format_report_lists_every_file_with_failure_message():
+    report = parallel_ingest.format_report([
+        {"file": "/data/a.txt", "status": "ok", "staged": 10, "success": 8, "duplicates": 2,
+         "errors": 1, "seconds": 0.5, "message": ""},
+        {"file": "/data/b.txt", "status": "failed", "staged": 0, "success": 0, "duplicates": 0,
+         "errors": 0, "seconds": 0.0, "message": "Отсутствуют обязательные колонки: ['vCenter']"},
+    ])
+
+    lines = report.splitlines()
+    assert lines[2].split() == ["a.txt", "ok", "10", "8", "2", "1", "0.50"]
+    assert lines[3].split()[:2] == ["b.txt", "failed"]
+    assert "vCenter" in lines[4]
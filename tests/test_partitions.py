@@ -0,0 +1,46 @@
+from datetime import date, datetime
+
+from database import partitions
+
+
+def test_iter_months_spans_year_boundary():
+    months = list(partitions.iter_months(datetime(2024, 11, 15, 10), date(2025, 2, 3)))
+
+    assert months == [date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1)]
+
+
+def test_create_partition_sql_uses_month_bounds():
+    sql = partitions.create_partition_sql("server_metrics", date(2025, 12, 1))
+
+    assert sql == (
+        "CREATE TABLE IF NOT EXISTS server_metrics_p2025_12 PARTITION OF server_metrics "
+        "FOR VALUES FROM ('2025-12-01') TO ('2026-01-01')"
+    )
+
+
+class RecordingConnection:
+    """Connection-like object: records DDL instead of sending it to PostgreSQL."""
+
+    class dialect:
+        name = "postgresql"
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, statement, params=None):
+        self.executed.append(str(statement))
+
+
+def test_partitions_are_cached_only_after_commit(monkeypatch):
+    monkeypatch.setattr(partitions, "_known_partitions", set())
+    monkeypatch.setattr(partitions, "_partitioned_tables", {"server_metrics": True})
+    conn = RecordingConnection()
+
+    # Транзакция откатилась: партиция не запомнена и создается повторно
+    partitions.ensure_partitions(conn, "server_metrics", date(2025, 3, 5), ahead_months=0, remember=False)
+    partitions.ensure_partitions(conn, "server_metrics", date(2025, 3, 5), ahead_months=0, remember=False)
+    assert len(conn.executed) == 2
+
+    partitions.remember_partitions("server_metrics", date(2025, 3, 5), ahead_months=0)
+    assert partitions.ensure_partitions(conn, "server_metrics", date(2025, 3, 20), ahead_months=0) == []
+    assert len(conn.executed) == 2
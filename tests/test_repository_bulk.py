@@ -0,0 +1,85 @@
+from datetime import date
+
+import pandas as pd
+
+from database import repository
+from database.models import ServerMetrics
+
+
+def test_bulk_insert_from_dataframe(pg_session):
+    repo = repository.MetricsRepository(pg_session)
+
+    df = pd.DataFrame(
+        [
+            {"vm": "a", "date": date(2025, 1, 1), "metric": "cpu.usage.average", "avg_value": 10},
+            {"vm": "b", "date": date(2025, 1, 2), "metric": "mem.usage.average", "avg_value": 20},
+        ]
+    )
+
+    result = repo.insert_from_dataframe(df, bulk=True)
+    assert result == {"success": 2, "errors": 0}
+    assert repo.last_rejects.empty
+
+    all_df = repo.get_all_metrics()
+    assert len(all_df) == 2
+
+
+def test_bulk_insert_upserts_and_collects_rejects(pg_session):
+    repo = repository.MetricsRepository(pg_session)
+    first = pd.DataFrame(
+        [{"vm": "a", "date": "2025-01-01", "metric": "cpu.usage.average", "avg_value": 10}]
+    )
+    repo.insert_from_dataframe(first, bulk=True)
+
+    second = pd.DataFrame(
+        [
+            {"vm": "a", "date": "2025-01-01", "metric": "cpu.usage.average", "avg_value": 55},
+            {"vm": "a", "date": "not a date", "metric": "cpu.usage.average", "avg_value": 1},
+            {"vm": None, "date": "2025-01-02", "metric": "cpu.usage.average", "avg_value": 2},
+            {"vm": "b", "date": "2025-01-02", "metric": "cpu.usage.average", "avg_value": "n/a"},
+        ]
+    )
+    result = repo.insert_from_dataframe(second, bulk=True)
+
+    assert result == {"success": 1, "errors": 3}
+    assert len(repo.last_rejects) == 3
+    reasons = repo.last_rejects["reject_reason"].tolist()
+    assert reasons == ["invalid date", "vm is empty", "avg_value is not numeric"]
+
+    all_df = repo.get_all_metrics()
+    assert len(all_df) == 1
+    assert all_df.iloc[0]["avg_value"] == 55
+
+
+def test_bulk_upsert_refreshes_updated_at(pg_session):
+    repo = repository.MetricsRepository(pg_session)
+    df = pd.DataFrame([{"vm": "a", "date": "2025-01-01", "metric": "cpu.usage.average", "avg_value": 10}])
+    repo.insert_from_dataframe(df, bulk=True)
+    first = pg_session.query(ServerMetrics.created_at, ServerMetrics.updated_at).one()
+
+    repo.insert_from_dataframe(df.assign(avg_value=20), bulk=True)
+    second = pg_session.query(ServerMetrics.created_at, ServerMetrics.updated_at).one()
+
+    assert second.created_at == first.created_at
+    assert second.updated_at > first.updated_at
+
+
+class FakeSession:
+    def __init__(self, opened, profile):
+        opened.append(profile)
+
+    def close(self):
+        pass
+
+
+def test_bulk_repository_opens_bulk_profile_session(monkeypatch):
+    opened = []
+    monkeypatch.setattr(repository, "BulkSessionLocal", lambda: FakeSession(opened, "bulk"))
+    monkeypatch.setattr(repository, "SessionLocal", lambda: FakeSession(opened, "interactive"))
+
+    with repository.MetricsRepository.bulk():
+        pass
+    with repository.MetricsRepository():
+        pass
+
+    assert opened == ["bulk", "interactive"]
@@ -0,0 +1,141 @@
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+from database import repository
+
+
+@pytest.fixture
+def repo(pg_session):
+    repo = repository.MetricsRepository(pg_session)
+    df = pd.DataFrame(
+        [
+            {"vm": "a", "date": date(2025, 1, 1), "metric": "cpu.usage.average", "avg_value": 10, "max_value": 30},
+            {"vm": "a", "date": date(2025, 1, 2), "metric": "cpu.usage.average", "avg_value": 20},
+            {"vm": "a", "date": date(2025, 1, 1), "metric": "mem.usage.average", "avg_value": 50},
+            {"vm": "b", "date": date(2025, 1, 1), "metric": "cpu.usage.average", "avg_value": 80},
+        ]
+    )
+    repo.insert_from_dataframe(df, bulk=True)
+    return repo
+
+
+def test_get_all_metrics_returns_native_dtypes(repo):
+    df = repo.get_all_metrics()
+
+    assert list(df.columns) == repository.METRIC_FRAME_COLUMNS
+    assert len(df) == 4
+    assert df["avg_value"].dtype == "float64"
+    assert df["max_value"].isna().sum() == 3
+    assert pd.api.types.is_datetime64_any_dtype(df["date"])
+    assert df["vm"].tolist() == ["a", "a", "a", "b"]
+
+
+def test_get_all_metrics_filters(repo):
+    df = repo.get_all_metrics(vm="a", metric="cpu", start_date=date(2025, 1, 2))
+
+    assert len(df) == 1
+    assert df.iloc[0]["avg_value"] == 20
+
+
+def test_get_all_metrics_filters_server_list_and_whole_end_day(repo):
+    df = repo.get_all_metrics(vm=["a", "b"], metric="cpu", end_date=date(2025, 1, 1))
+
+    assert sorted(df["vm"].tolist()) == ["a", "b"]
+    assert repo.get_all_metrics(vm=("b",))["avg_value"].tolist() == [80.0]
+    assert len(repo.get_daily_metrics(vm=["a"], end_date=date(2025, 1, 1))) == 2
+
+
+def test_iter_metrics_yields_bounded_chunks(repo):
+    chunks = list(repo.iter_metrics(chunk_rows=3))
+
+    assert [len(chunk) for chunk in chunks] == [3, 1]
+    combined = pd.concat(chunks, ignore_index=True)
+    pd.testing.assert_frame_equal(combined, repo.get_all_metrics())
+
+
+def test_servers_summary_aggregates_in_one_query(repo):
+    summaries = repo.get_servers_summary()
+
+    assert set(summaries) == {"a", "b"}
+    assert summaries["a"] == {
+        "vm": "a",
+        "cpu_avg": 15.0,
+        "cpu_max": 20.0,
+        "mem_avg": 50.0,
+        "mem_max": 50.0,
+        "total_metrics": 3,
+    }
+    assert summaries["b"]["mem_avg"] == 0
+
+
+def test_server_summary_for_unknown_vm(repo):
+    summary = repo.get_server_summary("missing")
+
+    assert summary["total_metrics"] == 0
+    assert summary["cpu_avg"] == 0
+
+
+def test_bulk_insert_refreshes_daily_rollup(repo):
+    daily = repo.get_daily_metrics(vm="a", metric="cpu")
+
+    assert daily["avg_value"].tolist() == [10.0, 20.0]
+    assert daily["samples"].tolist() == [1, 1]
+    assert repo.daily_rollup_covers(start_date=date(2025, 1, 1), end_date=date(2025, 1, 2))
+    assert not repo.daily_rollup_covers(start_date=date(2024, 12, 1), end_date=date(2025, 1, 2))
+
+
+def test_row_inserts_refresh_daily_rollup(repo):
+    assert repo.insert_metric(vm="a", date=date(2025, 1, 1), metric="cpu.usage.average", avg_value=99)
+    assert repo.get_daily_metrics(vm="a", metric="cpu", end_date=date(2025, 1, 1))["avg_value"].tolist() == [99.0]
+
+    df = pd.DataFrame([{"vm": "a", "date": date(2025, 1, 2), "metric": "cpu.usage.average", "avg_value": 7}])
+    assert repo.insert_from_dataframe(df) == {"success": 1, "errors": 0}
+    assert repo.get_daily_metrics(vm="a", metric="cpu")["avg_value"].tolist() == [99.0, 7.0]
+
+
+def test_refresh_daily_rollup_aggregates_within_day(repo):
+    repo.insert_metric(
+        vm="b",
+        date=datetime(2025, 1, 1, 12),
+        metric="cpu.usage.average",
+        max_value=90,
+        avg_value=40,
+    )
+    repo.refresh_daily_rollup(start_date=date(2025, 1, 1), end_date=date(2025, 1, 1))
+
+    daily = repo.get_daily_metrics(vm="b")
+
+    assert len(daily) == 1
+    assert daily.iloc[0]["avg_value"] == 60.0
+    assert daily.iloc[0]["max_value"] == 90.0
+    assert daily.iloc[0]["samples"] == 2
+
+
+def test_vm_and_metric_are_categorical(repo):
+    df = repo.get_all_metrics()
+
+    assert isinstance(df["vm"].dtype, pd.CategoricalDtype)
+    assert list(df["metric"].cat.categories) == ["cpu.usage.average", "mem.usage.average"]
+    assert (df["metric"] == "mem.usage.average").sum() == 1
+    assert isinstance(repo.get_daily_metrics()["vm"].dtype, pd.CategoricalDtype)
+
+
+def test_dimension_tables_store_each_name_once(repo):
+    repo.insert_metric(vm="c", date=date(2025, 1, 3), metric="cpu.usage.average", avg_value=5)
+
+    assert repo.get_unique_servers() == ["a", "b", "c"]
+    assert repo.get_unique_metrics() == ["cpu.usage.average", "mem.usage.average"]
+    assert repo.get_all_metrics(vm="c")["vm"].tolist() == ["c"]
+
+
+def test_data_version_moves_on_repository_writes_and_retention(repo):
+    before = repo.data_version()
+
+    assert repo.insert_metric("c", date(2025, 1, 3), "cpu.usage.average", avg_value=1.0)
+    after_insert = repo.data_version()
+    assert after_insert != before
+
+    assert repo.delete_old_metrics(days=1) == 5
+    assert repo.data_version() != after_insert
@@ -0,0 +1,17 @@
+from database import rollup
+from database.models import ServerMetrics, VMMetrics
+from database.vcenter_ingest import COUNTER_COLUMNS
+
+
+def test_rollup_unpivots_every_vm_metrics_counter():
+    key_columns = {"id", "vm_name", "vcenter", "timestamp", "created_at"}
+    counters = {column.name for column in VMMetrics.__table__.columns} - key_columns
+
+    assert counters == set(COUNTER_COLUMNS.values())
+    for metric, column in COUNTER_COLUMNS.items():
+        assert f"('{metric}', s.{column})" in rollup.AGGREGATE_SQL
+
+
+def test_rollup_upsert_marks_updated_rows():
+    assert " ".join(rollup.UPSERT_SQL.split()).endswith("updated_at = now()")
+    assert "updated_at" in ServerMetrics.__table__.c
@@ -0,0 +1,52 @@
+import os
+
+import pandas as pd
+import pytest
+
+from database import source_cache
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.setattr(source_cache, "CACHE_DIR", tmp_path / "cache")
+    path = tmp_path / "metrics.csv"
+    path.write_text("vm,metric,avg_value\nsrv-1,cpu.usage.average,7.5\n")
+    return path
+
+
+def test_cache_path_changes_with_content_and_mtime(source):
+    first = source_cache._cache_path(source)
+    assert first.name.startswith(f"metrics-{source_cache.file_digest(source)[:16]}-")
+
+    os.utime(source, ns=(0, 10**9))
+    assert source_cache._cache_path(source) != first
+
+    source.write_text("vm,metric,avg_value\nsrv-2,cpu.usage.average,1.0\n")
+    os.utime(source, ns=(0, 2 * 10**9))
+    assert source_cache._cache_path(source).name.split("-")[1] != first.name.split("-")[1]
+
+
+def test_read_source_without_pyarrow_reads_file_directly(source, monkeypatch):
+    monkeypatch.setattr(source_cache, "PYARROW_AVAILABLE", False)
+
+    df = source_cache.read_source(source)
+
+    assert df.to_dict("records") == [{"vm": "srv-1", "metric": "cpu.usage.average", "avg_value": 7.5}]
+    assert not source_cache.CACHE_DIR.exists()
+
+
+def test_read_source_reuses_and_replaces_cache(source, monkeypatch):
+    pytest.importorskip("pyarrow")
+    first = source_cache.read_source(source)
+    cached = list(source_cache.CACHE_DIR.glob("*.feather"))
+    assert len(cached) == 1
+
+    monkeypatch.setattr(source_cache, "_read_raw", lambda path: pytest.fail("source parsed again"))
+    pd.testing.assert_frame_equal(source_cache.read_source(source), first)
+
+    monkeypatch.undo()
+    monkeypatch.setattr(source_cache, "CACHE_DIR", cached[0].parent)
+    source.write_text("vm,metric,avg_value\nsrv-2,cpu.usage.average,1.0\n")
+    assert source_cache.read_source(source)["vm"].tolist() == ["srv-2"]
+    assert [path.name for path in source_cache.CACHE_DIR.glob("*.feather")] != [cached[0].name]
+    assert len(list(source_cache.CACHE_DIR.glob("*.feather"))) == 1
@@ -0,0 +1,65 @@
+import io
+import struct
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from database import vcenter_ingest
+
+EXPORT = (
+    "VM_Name\tvCenter\tTimestamp\tcpu.usage.average\tmem.usage.average\n"
+    "srv-1\tvc1\t04.12.25 15:00:00\t7.37\t1.07\n"
+    "srv-1\tvc1\tbad\t1\t1\n"
+    "\tvc1\t04.12.25 15:30:00\t1\t1\n"
+    "srv-2\tvc1\t04.12.25 15:30:00\t2.5\t\n"
+)
+
+
+class RecordingCursor:
+    """Collects COPY payloads instead of sending them to PostgreSQL."""
+
+    def __init__(self):
+        self.copied = []
+
+    def copy_expert(self, sql, buffer):
+        self.copied.append((sql, buffer.read()))
+
+
+def read_export():
+    return pd.read_csv(io.StringIO(EXPORT), sep="\t", dtype=vcenter_ingest.SOURCE_DTYPES)
+
+
+def test_prepare_chunk_parses_timestamps_and_drops_rows_without_keys():
+    prepared, rejected = vcenter_ingest._prepare_chunk(read_export())
+
+    assert rejected == 2
+    assert list(prepared.columns) == vcenter_ingest.TARGET_COLUMNS
+    assert prepared["timestamp"].tolist() == [datetime(2025, 12, 4, 15), datetime(2025, 12, 4, 15, 30)]
+    assert prepared["cpu_usage_average"].tolist() == [7.37, 2.5]
+    assert prepared["net_usage_average"].isna().all()
+
+
+def test_copy_chunk_writes_fixed_width_binary_rows():
+    prepared, _ = vcenter_ingest._prepare_chunk(read_export())
+    names = {}
+    cursor = RecordingCursor()
+
+    vcenter_ingest._copy_chunk(cursor, prepared, names)
+
+    sql, payload = cursor.copied[0]
+    assert sql == vcenter_ingest.COPY_STAGE_SQL.format(stage=vcenter_ingest.STAGE_TABLE)
+    assert names == {"srv-1": 0, "srv-2": 1, "vc1": 2}
+    assert payload.startswith(vcenter_ingest.COPY_BINARY_HEADER)
+    assert payload.endswith(vcenter_ingest.COPY_BINARY_TRAILER)
+
+    body = payload[len(vcenter_ingest.COPY_BINARY_HEADER):-len(vcenter_ingest.COPY_BINARY_TRAILER)]
+    assert len(body) == 2 * vcenter_ingest.ROW_DTYPE.itemsize
+
+    fields, _, vm_code, _, vcenter_code, _, micros, _, cpu = struct.unpack(">hiiiiiqid", body[:42])
+    assert (fields, vm_code, vcenter_code) == (len(vcenter_ingest.STAGE_COLUMNS), 0, 2)
+    assert datetime(2000, 1, 1) + timedelta(microseconds=micros) == datetime(2025, 12, 4, 15)
+    assert cpu == 7.37
+
+    rows = np.frombuffer(body, dtype=vcenter_ingest.ROW_DTYPE)
+    assert np.isnan(rows["mem_usage_average"][1])